@@ -0,0 +1,334 @@
+"""
+Benchmarks the wall time, subprocess count and critical path of gh-tt commands.
+
+Each scenario runs `python -m gh_tt` from the working tree in a sandbox with a local bare
+remote, with the `gh` and `git` stand-ins from standin.py on the PATH. The stand-ins add
+a configurable latency to every call and log when it started and ended, which excludes
+the time it took to spawn them. From that log, the critical path is the longest chain of
+calls that did not overlap, i.e. the calls the command had to wait for one after the other.
+
+Results are compared against baseline.json. A scenario regresses if it spawns more
+subprocesses than the baseline, or if its wall time or critical path exceeds the baseline
+by more than the tolerance and `MIN_REGRESSION_MS`. Update the baseline with
+`--update-baseline` when a change is expected.
+
+    uv run --frozen -- python benchmarks/run.py [-v] [--repeat N] [--update-baseline]
+"""
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter
+from collections.abc import Callable
+from dataclasses import asdict, dataclass, field
+from pathlib import Path
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+SRC_DIR = BENCHMARKS_DIR.parent / 'src'
+BASELINE_PATH = BENCHMARKS_DIR / 'baseline.json'
+
+DEFAULT_GH_LATENCY_MS = 100
+DEFAULT_GIT_LATENCY_MS = 0
+DEFAULT_TOLERANCE = 0.25
+# Differences below this are noise, whatever the tolerance
+MIN_REGRESSION_MS = 50
+
+ISSUE_NUMBER = 7
+ISSUE_BRANCH = f'{ISSUE_NUMBER}-Benchmark_issue'
+
+
+@dataclass
+class Span:
+    binary: str
+    argv: list[str]
+    start: float
+    end: float
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end - self.start) * 1000
+
+    def __str__(self) -> str:
+        command = ' '.join([self.binary, *self.argv]).replace('\n', ' ')
+        return f'{self.duration_ms:7.1f} ms  {command[:100]}'
+
+
+@dataclass
+class Measurement:
+    wall_ms: float
+    subprocesses: int
+    critical_path_ms: float
+    calls: dict[str, int] = field(default_factory=dict)
+    critical_path: list[Span] = field(default_factory=list)
+
+
+def critical_path(spans: list[Span]) -> list[Span]:
+    """Returns the chain of non-overlapping spans with the longest total duration."""
+    spans = sorted(spans, key=lambda s: s.end)
+    # best[i] is the longest chain ending with spans[i], previous[i] the span before it
+    best: list[float] = []
+    previous: list[int | None] = []
+    for i, span in enumerate(spans):
+        candidates = [j for j in range(i) if spans[j].end <= span.start]
+        before = max(candidates, key=lambda j: best[j], default=None)
+        best.append(span.duration_ms + (best[before] if before is not None else 0))
+        previous.append(before)
+
+    if not spans:
+        return []
+
+    chain = []
+    index = max(range(len(spans)), key=lambda i: best[i])
+    while index is not None:
+        chain.append(spans[index])
+        index = previous[index]
+    return chain[::-1]
+
+
+class Sandbox:
+    """A local bare remote with a clone to run gh-tt in, and the stand-ins on the PATH."""
+
+    def __init__(self, root: Path, real_git: str):
+        self.root = root
+        self.real_git = real_git
+        self.remote = root / 'remote.git'
+        self.work = root / 'work'
+        self.home = root / 'home'
+        self.log = root / 'calls.jsonl'
+
+    def git(self, *args: str, cwd: Path | None = None):
+        subprocess.run(
+            [self.real_git, *args],
+            cwd=cwd or self.work,
+            env=self.env(),
+            check=True,
+            capture_output=True,
+        )
+
+    def env(self, bin_dir: Path | None = None, cache_dir: Path | None = None) -> dict[str, str]:
+        env = {
+            **os.environ,
+            'HOME': str(self.home),
+            'GIT_CONFIG_NOSYSTEM': '1',
+            'XDG_CONFIG_HOME': str(self.home / '.config'),
+            'XDG_RUNTIME_DIR': str(self.root),
+            'GH_TT_BENCH_LOG': str(self.log),
+            'GH_TT_BENCH_REAL_GIT': self.real_git,
+        }
+        env.pop('GITHUB_ACTIONS', None)
+        if bin_dir is not None:
+            env['PATH'] = f'{bin_dir}{os.pathsep}{env["PATH"]}'
+        if cache_dir is not None:
+            env['XDG_CACHE_HOME'] = str(cache_dir)
+        return env
+
+    def create(self):
+        self.home.mkdir(parents=True)
+        (self.home / '.gitconfig').write_text(
+            '[user]\n\tname = Benchmark\n\temail = benchmark@example.com\n'
+            '[init]\n\tdefaultBranch = main\n'
+        )
+        self.git('init', '-q', '--bare', str(self.remote), cwd=self.root)
+        self.git('clone', '-q', str(self.remote), str(self.work), cwd=self.root)
+        self.git('commit', '-q', '--allow-empty', '-m', 'Initial commit')
+        self.git('tag', '1.0.0')
+        self.git('push', '-q', '-u', 'origin', 'main', '--tags')
+
+
+def _on_issue_branch(sandbox: Sandbox):
+    sandbox.git('switch', '-q', '-c', ISSUE_BRANCH)
+    sandbox.git('commit', '-q', '--allow-empty', '-m', 'Benchmark change')
+    sandbox.git('push', '-q', '-u', 'origin', ISSUE_BRANCH)
+
+
+def _on_main(_sandbox: Sandbox):
+    pass
+
+
+# Name, gh tt arguments and the setup of the sandbox before running them
+SCENARIOS: list[tuple[str, list[str], Callable[[Sandbox], None]]] = [
+    ('startup', ['--help'], _on_main),
+    ('semver', ['semver'], _on_main),
+    ('semver-list', ['semver', 'list'], _on_main),
+    ('semver-bump', ['semver', 'bump', '--patch', '--no-run'], _on_main),
+    ('workon', ['workon', '--pr-workflow', '-i', str(ISSUE_NUMBER)], _on_main),
+    ('deliver', ['deliver', '--pr-workflow', '--no-poll'], _on_issue_branch),
+]
+
+
+def install_standins(bin_dir: Path):
+    bin_dir.mkdir(parents=True)
+    for binary in ('gh', 'git'):
+        wrapper = bin_dir / binary
+        wrapper.write_text(
+            f'#!/bin/sh\nexec "{sys.executable}" -I -S "{BENCHMARKS_DIR / "standin.py"}" {binary} "$@"\n'
+        )
+        wrapper.chmod(0o755)
+
+
+def run_once(
+    args: list[str],
+    setup: Callable[[Sandbox], None],
+    *,
+    root: Path,
+    bin_dir: Path,
+    cache_dir: Path,
+    real_git: str,
+    latency: dict[str, int],
+) -> Measurement:
+    sandbox = Sandbox(root, real_git)
+    sandbox.create()
+    setup(sandbox)
+
+    env = sandbox.env(bin_dir=bin_dir, cache_dir=cache_dir)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [str(SRC_DIR), env.get('PYTHONPATH')]))
+    for binary, latency_ms in latency.items():
+        env[f'GH_TT_BENCH_{binary.upper()}_LATENCY_MS'] = str(latency_ms)
+
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-m', 'gh_tt', *args],
+        cwd=sandbox.work,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=False,
+    )
+    wall_ms = (time.perf_counter() - start) * 1000
+    if result.returncode != 0:
+        raise RuntimeError(f'gh tt {" ".join(args)} failed:\n{result.stdout}{result.stderr}')
+
+    spans = []
+    if sandbox.log.exists():
+        for line in sandbox.log.read_text().splitlines():
+            span = json.loads(line)
+            spans.append(Span(span['bin'], span['argv'], span['start'], span['end']))
+
+    path = critical_path(spans)
+    return Measurement(
+        wall_ms=wall_ms,
+        subprocesses=len(spans),
+        critical_path_ms=sum(span.duration_ms for span in path),
+        calls=dict(Counter(span.binary for span in spans)),
+        critical_path=path,
+    )
+
+
+def run_scenario(
+    args: list[str], setup: Callable[[Sandbox], None], *, repeat: int, **kwargs
+) -> Measurement:
+    """Runs a scenario `repeat` times in fresh sandboxes and returns the median run."""
+    with tempfile.TemporaryDirectory(prefix='gh-tt-bench-') as tmp:
+        runs = [run_once(args, setup, root=Path(tmp) / str(i), **kwargs) for i in range(repeat)]
+
+    median = statistics.median_low(run.wall_ms for run in runs)
+    return next(run for run in runs if run.wall_ms == median)
+
+
+def compare(
+    name: str, measurement: Measurement, baseline: dict | None, tolerance: float
+) -> list[str]:
+    """Returns the regressions of a measurement against its baseline."""
+    if baseline is None:
+        return []
+
+    regressions = []
+    if measurement.subprocesses > baseline['subprocesses']:
+        regressions.append(
+            f'{name}: {measurement.subprocesses} subprocesses, baseline {baseline["subprocesses"]}'
+        )
+    for metric in ('wall_ms', 'critical_path_ms'):
+        value, allowed = getattr(measurement, metric), baseline[metric] * (1 + tolerance)
+        if value > allowed and value - baseline[metric] > MIN_REGRESSION_MS:
+            regressions.append(f'{name}: {metric} {value:.0f}, baseline {baseline[metric]:.0f}')
+    return regressions
+
+
+def _delta(value: float, baseline: dict | None, metric: str) -> str:
+    if baseline is None or not baseline[metric]:
+        return ''
+    return f' ({(value - baseline[metric]) / baseline[metric]:+.0%})'
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('scenarios', nargs='*', help='Scenarios to run, all by default')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per scenario, 3 by default')
+    parser.add_argument('--gh-latency-ms', type=int, default=DEFAULT_GH_LATENCY_MS)
+    parser.add_argument('--git-latency-ms', type=int, default=DEFAULT_GIT_LATENCY_MS)
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE)
+    parser.add_argument('--update-baseline', action='store_true')
+    parser.add_argument('-v', '--verbose', action='store_true', help='Print the critical paths')
+    args = parser.parse_args()
+
+    real_git = shutil.which('git')
+    assert real_git is not None, 'git is required to run the benchmarks'
+    latency = {'gh': args.gh_latency_ms, 'git': args.git_latency_ms}
+
+    baseline = json.loads(BASELINE_PATH.read_text()) if BASELINE_PATH.exists() else {}
+    if baseline.get('latency', latency) != latency and not args.update_baseline:
+        print(f'Latency differs from the baseline {baseline["latency"]}, not comparing')
+        baseline = {}
+
+    scenarios = [s for s in SCENARIOS if not args.scenarios or s[0] in args.scenarios]
+    results: dict[str, Measurement] = {}
+    regressions: list[str] = []
+    with tempfile.TemporaryDirectory(prefix='gh-tt-bench-') as tmp:
+        bin_dir, cache_dir = Path(tmp) / 'bin', Path(tmp) / 'cache'
+        install_standins(bin_dir)
+        kwargs = {
+            'bin_dir': bin_dir,
+            'cache_dir': cache_dir,
+            'real_git': real_git,
+            'latency': latency,
+        }
+
+        # Fill the preflight cache, so every scenario runs with a warm cache like most invocations
+        run_scenario(['semver'], _on_main, repeat=1, **kwargs)
+
+        for name, gh_tt_args, setup in scenarios:
+            measurement = run_scenario(gh_tt_args, setup, repeat=args.repeat, **kwargs)
+            results[name] = measurement
+            scenario_baseline = baseline.get('scenarios', {}).get(name)
+            calls = ', '.join(
+                f'{binary} {count}' for binary, count in sorted(measurement.calls.items())
+            )
+            print(
+                f'{name:<12} {measurement.wall_ms:7.0f} ms{_delta(measurement.wall_ms, scenario_baseline, "wall_ms"):<8}'
+                f' {measurement.subprocesses:3} subprocesses ({calls or "none"})'
+                f'  critical path {measurement.critical_path_ms:6.0f} ms over {len(measurement.critical_path)} calls'
+            )
+            if args.verbose:
+                for span in measurement.critical_path:
+                    print(f'    {span}')
+            regressions += compare(name, measurement, scenario_baseline, args.tolerance)
+
+    if args.update_baseline:
+        scenarios_baseline = (
+            baseline.get('scenarios', {}) if baseline.get('latency') == latency else {}
+        )
+        for name, measurement in results.items():
+            scenarios_baseline[name] = {
+                key: round(value, 1) if isinstance(value, float) else value
+                for key, value in asdict(measurement).items()
+                if key in {'wall_ms', 'subprocesses', 'critical_path_ms'}
+            }
+        BASELINE_PATH.write_text(
+            json.dumps({'latency': latency, 'scenarios': scenarios_baseline}, indent=2) + '\n'
+        )
+        print(f'Updated {BASELINE_PATH.name}')
+        return 0
+
+    for regression in regressions:
+        print(f'Regression: {regression}', file=sys.stderr)
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
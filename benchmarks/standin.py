@@ -0,0 +1,140 @@
+"""
+Offline stand-in for `gh` and `git`, used by the benchmarks in run.py.
+
+run.py puts wrapper scripts named `gh` and `git` on the PATH, which run this file with the
+name of the binary followed by its arguments. Every invocation sleeps for the latency
+configured for its binary and appends a span to the JSON lines file in `GH_TT_BENCH_LOG`.
+
+`git` runs the real git binary in `GH_TT_BENCH_REAL_GIT` against the local sandbox
+repositories. `gh` answers with canned responses for the calls gh-tt makes.
+
+Runs with `python -I -S`, so it only uses the standard library.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import time
+
+REPO = 'bench/repo'
+REPO_URL = f'https://github.com/{REPO}'
+ISSUE_TITLE = 'Benchmark issue'
+
+
+def _issue(number: int) -> dict:
+    return {
+        'url': f'{REPO_URL}/issues/{number}',
+        'title': ISSUE_TITLE,
+        'number': number,
+        'labels': [],
+        'assignees': [],
+        'closed': False,
+    }
+
+
+def _pull_request() -> dict:
+    return {
+        'url': f'{REPO_URL}/pull/1',
+        'state': 'OPEN',
+        'body': 'Closes #7',
+        'commits': [{'messageHeadline': 'Benchmark change', 'messageBody': ''}],
+    }
+
+
+def _jq(value, expression: str):
+    """Supports the `.a.b` paths gh-tt passes to `--jq`."""
+    for key in filter(None, expression.split('.')):
+        value = value[key]
+    return value
+
+
+def _print_json(value, argv: list[str]):
+    if '--jq' in argv:
+        value = _jq(value, argv[argv.index('--jq') + 1])
+        if isinstance(value, str):
+            print(value)
+            return
+    print(json.dumps(value))
+
+
+def gh(argv: list[str]) -> int:  # noqa: C901
+    match argv:
+        case ['--version']:
+            print('gh version 2.80.0 (2025-09-23)\nhttps://github.com/cli/cli/releases/tag/v2.80.0')
+        case ['auth', 'status', *_]:
+            hosts = {'github.com': [{'active': True, 'scopes': 'gist, project, read:org, repo'}]}
+            print(json.dumps({'hosts': hosts}))
+        case ['repo', 'view', *_]:
+            _print_json({'nameWithOwner': REPO, 'defaultBranchRef': {'name': 'main'}}, argv)
+        case ['issue', 'view', number, *_]:
+            _print_json(_issue(int(number)), argv)
+        case ['issue', 'create', *_]:
+            print(f'{REPO_URL}/issues/8')
+        case ['issue', 'develop', _, '--base', base, '--name', name, *_]:
+            return subprocess.run(
+                [
+                    os.environ['GH_TT_BENCH_REAL_GIT'],
+                    'checkout',
+                    '-q',
+                    '-b',
+                    name,
+                    f'origin/{base}',
+                ],
+                check=False,
+            ).returncode
+        case ['pr', 'create', *_]:
+            print(f'{REPO_URL}/pull/1')
+        case ['pr', 'view', *_]:
+            _print_json(_pull_request(), argv)
+        case ['pr', 'checks', *_]:
+            link = f'{REPO_URL}/actions/runs/1'
+            checks = [
+                {
+                    'name': 'test',
+                    'state': 'SUCCESS',
+                    'bucket': 'pass',
+                    'workflow': 'CI',
+                    'link': link,
+                }
+            ]
+            print(json.dumps(checks))
+        case ['issue' | 'pr', 'edit' | 'ready' | 'merge', *_]:
+            pass
+        case ['ext' | 'extension', 'list']:
+            print('gh tt\tthetechcollective/gh-tt\tstable')
+        case _:
+            print(f'gh stand-in: unsupported command {argv}', file=sys.stderr)
+            return 1
+    return 0
+
+
+def git(argv: list[str]) -> int:
+    return subprocess.run([os.environ['GH_TT_BENCH_REAL_GIT'], *argv], check=False).returncode
+
+
+def _is_batch_process(binary: str, argv: list[str]) -> bool:
+    return binary == 'git' and argv[:1] == ['cat-file'] and argv[1].startswith('--batch')
+
+
+def main() -> int:
+    binary, argv = sys.argv[1], sys.argv[2:]
+    start = time.time()
+
+    time.sleep(float(os.environ.get(f'GH_TT_BENCH_{binary.upper()}_LATENCY_MS', '0')) / 1000)
+    started = time.time()
+    return_code = gh(argv) if binary == 'gh' else git(argv)
+    sys.stdout.flush()
+
+    # A batch process answers requests for as long as gh-tt runs, which it does not wait for.
+    # Only its latency is on the path of the command.
+    end = started if _is_batch_process(binary, argv) else time.time()
+    span = {'bin': binary, 'argv': argv, 'start': start, 'end': end}
+    with open(os.environ['GH_TT_BENCH_LOG'], 'a') as log:  # noqa: PTH123
+        log.write(json.dumps(span) + '\n')
+
+    return return_code
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,14 +1,22 @@
 #!/usr/bin/env python3
+from __future__ import annotations
+
 import asyncio
 import logging
 import os
 import sys
+from collections.abc import Awaitable
+from typing import TYPE_CHECKING
 
 import gh_tt.cli.tt_handlers
-from gh_tt import configuration
+from gh_tt import cassette, preflight, trace
 from gh_tt.cli.tt_handlers import COMMAND_HANDLERS
 from gh_tt.cli.tt_parser import tt_parse
-from gh_tt.commands import gh, git, shell
+from gh_tt.commands import git, shell
+from gh_tt.importtime import ImportTimer
+
+if TYPE_CHECKING:
+    from gh_tt import configuration
 
 logger = logging.getLogger(__package__ or 'gh_tt')
 
@@ -42,67 +50,199 @@ def setup_logging(verbose: int):
     logging.getLogger().setLevel(level=level)
 
 
-def main():
-    args = tt_parse(sys.argv[1:])
+REQUIRED_GH_VERSION = '2.55.0'
 
-    setup_logging(args.verbose)
-    logger.debug('parsed args: %s', args)
 
-    gh_version = asyncio.run(gh.get_gh_cli_version())
-    required_gh_version = '2.55.0'
-    if not is_version_sufficient(gh_version, required_gh_version):
-        print(
-            f'gh version {gh_version} is not supported. Please upgrade to version {required_gh_version} or higher',
-            file=sys.stderr,
+def check_gh_version(gh_version: str):
+    if not is_version_sufficient(gh_version, REQUIRED_GH_VERSION):
+        raise preflight.PreflightError(
+            f'gh version {gh_version} is not supported. Please upgrade to version {REQUIRED_GH_VERSION} or higher'
         )
+
+
+async def load_config() -> configuration.TtConfig:
+    # Imported here, because pydantic is not needed for --version and self commands
+    from gh_tt import configuration
+
+    with trace.span('load config', 'step'):
+        return configuration.load_config(await git.get_root())
+
+
+async def preflight_checks(
+    config: Awaitable[configuration.TtConfig], *, use_cache: bool, check_scopes: bool
+):
+    """Verifies the gh version and, if a project is configured, the 'project' token scope."""
+    with trace.span('preflight checks', 'step'):
+        gh_version, gh_scopes, config = await asyncio.gather(
+            preflight.get_gh_cli_version(use_cache=use_cache),
+            preflight.get_gh_auth_scopes(use_cache=use_cache) if check_scopes else _no_scopes(),
+            config,
+        )
+        check_gh_version(gh_version)
+
+        if (
+            gh_scopes is not None
+            and config.project.owner is not None
+            and config.project.number is not None
+            and 'project' not in gh_scopes
+        ):
+            raise preflight.PreflightError(
+                "gh token does not have the required scope 'project'\nfix it by running:\n   gh auth refresh --scopes 'project'"
+            )
+
+
+async def _no_scopes() -> None:
+    return None
+
+
+async def version_context() -> str:
+    cmds = [
+        ['pwd'],
+        ['python3', '--version'],
+        ['git', '--version'],
+        ['gh', '--version'],
+        ['gh', 'extension', 'list'],
+    ]
+    results = await asyncio.gather(*(shell.run(cmd) for cmd in cmds))
+    return '\n'.join(r.stdout for r in results)
+
+
+async def dispatch(args, config: configuration.TtConfig, checks: asyncio.Task[None]):
+    """Runs the command handler while the preflight checks are still in flight.
+
+    The handler gets a gate that its mutating steps wait on, so only the read-only
+    phase of the command overlaps with the checks.
+    """
+    handler = asyncio.create_task(
+        _exit_as_result(
+            COMMAND_HANDLERS[args.command](args, config, gate=preflight.Gate(checks)),
+            step=args.command,
+        )
+    )
+
+    try:
+        await checks
+    except preflight.PreflightError as e:
+        handler.cancel()
+        await asyncio.gather(handler, return_exceptions=True)
+        print(e, file=sys.stderr)
         sys.exit(1)
 
+    try:
+        exit_ = await handler
+    except shell.ShellError as e:
+        # The cached scopes are stale if gh rejects the token, so the next run checks again
+        if preflight.is_scope_error(e.stderr):
+            preflight.invalidate()
+        raise
+
+    if exit_ is not None:
+        raise exit_
+
+
+async def _exit_as_result(handler: Awaitable[None], step: str) -> SystemExit | None:
+    """Returns the `SystemExit` of a handler running in a task, so the caller can re-raise it.
+
+    A `SystemExit` escaping a task stops the event loop, which would stop the daemon too.
+    """
+    try:
+        with trace.span(step, 'step'):
+            await handler
+    except SystemExit as e:
+        return e
+    return None
+
+
+async def run(args):
+    """Runs the preflight checks, loads the configuration and dispatches the command.
+
+    Everything runs on a single event loop, so independent steps overlap and the
+    `alru_cache`-d lookups are shared for the whole invocation.
+    """
+    use_preflight_cache = not args.no_preflight_cache
+
+    if args.version or args.command == 'self':
+        try:
+            check_gh_version(await preflight.get_gh_cli_version(use_cache=use_preflight_cache))
+        except preflight.PreflightError as e:
+            print(e, file=sys.stderr)
+            sys.exit(1)
+
     if args.version:
         logger.debug('printing version and exiting')
-
-        async def version_context() -> str:
-            cmds = [
-                ['pwd'],
-                ['python3', '--version'],
-                ['git', '--version'],
-                ['gh', '--version'],
-                ['gh', 'extension', 'list'],
-            ]
-            results = await asyncio.gather(*(shell.run(cmd) for cmd in cmds))
-            return '\n'.join(r.stdout for r in results)
-
-        print(asyncio.run(version_context()))
+        print(await version_context())
         sys.exit(0)
 
     # Upgrading should happen regardless of configuration, so dispatch the command from here
     # instead of the COMMAND_HANDLER.
     if args.command == 'self':
-        gh_tt.cli.tt_handlers.handle_self(args)
+        await gh_tt.cli.tt_handlers.handle_self(args)
         print('gh-tt successfully upgraded.')
         sys.exit(0)
 
+    if args.command == 'daemon':
+        await gh_tt.cli.tt_handlers.handle_daemon(args)
+        sys.exit(0)
+
+    config_task = asyncio.create_task(load_config())
+
     # Needed for end to end testing in GH workflows. When running in a GitHub action,
     # we use a GitHub App which is authorized in the workflow and does not have auth tokens.
-    if not os.getenv('GITHUB_ACTIONS'):
-        gh_scopes = asyncio.run(gh.get_gh_auth_scopes())
-        config = configuration.load_config(asyncio.run(git.get_root()))
+    checks = asyncio.create_task(
+        preflight_checks(
+            asyncio.shield(config_task),
+            use_cache=use_preflight_cache,
+            check_scopes=not os.getenv('GITHUB_ACTIONS'),
+        )
+    )
+    try:
+        config = await config_task
+    except BaseException:
+        checks.cancel()
+        raise
+
+    try:
+        if args.command in COMMAND_HANDLERS:
+            logger.debug('dispatching command: %s', args.command)
+            await dispatch(args, config, checks)
+        else:
+            logger.debug('no command handler found for: %s', args.command)
+            try:
+                await checks
+            except preflight.PreflightError as e:
+                print(e, file=sys.stderr)
+                sys.exit(1)
+    finally:
+        git.forget_fetches()
+        await git.close_batch_checks()
 
-        if (
-            config.project.owner is not None
-            and config.project.number is not None
-            and 'project' not in gh_scopes
-        ):
-            print(
-                "gh token does not have the required scope 'project'\nfix it by running:\n   gh auth refresh --scopes 'project'",
-                file=sys.stderr,
-            )
-            sys.exit(1)
 
-    if args.command in COMMAND_HANDLERS:
-        logger.debug('dispatching command: %s', args.command)
-        COMMAND_HANDLERS[args.command](args)
-    else:
-        logger.debug('no command handler found for: %s', args.command)
+def main():
+    args = tt_parse(sys.argv[1:])
+
+    setup_logging(args.verbose)
+    logger.debug('parsed args: %s', args)
+
+    import_timer = None
+    if args.import_time:
+        import_timer = ImportTimer()
+        if not import_timer.install():
+            logger.warning('cannot time imports here, set PYTHONPROFILEIMPORTTIME=1 instead')
+            import_timer = None
+
+    try:
+        command = ' '.join(['gh tt', *sys.argv[1:]])
+        with (
+            trace.recording(args.trace, name=command),
+            cassette.recording(args.record, args.replay, args.replay_speed),
+            trace.span(command, 'step'),
+        ):
+            asyncio.run(run(args))
+    finally:
+        logger.debug('subprocess queues: %s', shell.scheduler.summary())
+        if import_timer is not None:
+            import_timer.uninstall()
+            print(import_timer.report(), file=sys.stderr)
 
     sys.exit(0)
 
@@ -0,0 +1,159 @@
+"""
+Records the external commands of an invocation to a cassette and replays them, for
+`--record FILE` and `--replay FILE`.
+
+A cassette is a JSON lines file with an entry for every command that ran: the command, its
+working directory and input, its output and exit code, and how long it took. Replaying
+serves every command from the cassette instead of running it, after waiting for the
+recorded latency divided by the replay speed. That reproduces a slow session offline, e.g.
+a `workon` against a busy GitHub, to measure optimizations against.
+
+Commands are matched on the command and its input, in the order they were recorded. A
+command that runs more often than it was recorded, like a poll that needs more attempts,
+gets its last recording again.
+"""
+
+import asyncio
+import contextlib
+import json
+import logging
+from collections import deque
+from collections.abc import Iterator
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import TextIO
+
+logger = logging.getLogger(__name__)
+
+
+class CassetteError(Exception):
+    pass
+
+
+@dataclass
+class Entry:
+    # A list of arguments, or a string for commands run through the shell
+    cmd: list[str] | str
+    cwd: str
+    stdout: str
+    stderr: str
+    exit_code: int | None
+    latency_ms: float
+    input: str | None = None
+
+
+def _key(cmd: list[str] | str, input_: str | None) -> str:
+    return json.dumps([cmd, input_])
+
+
+class Recorder:
+    def __init__(self, path: Path):
+        self.path = path
+        self.entries = 0
+        self._file: TextIO = path.open('w')
+
+    def add(self, entry: Entry):
+        # Written as the commands finish, so an interrupted session keeps what it recorded
+        self._file.write(json.dumps(asdict(entry)) + '\n')
+        self._file.flush()
+        self.entries += 1
+
+    def close(self):
+        self._file.close()
+        logger.info('recorded %d commands to %s', self.entries, self.path)
+
+
+class Player:
+    def __init__(self, path: Path, speed: float = 1.0):
+        self.path = path
+        self.speed = speed
+        self._entries: dict[str, deque[Entry]] = {}
+        self._last: dict[str, Entry] = {}
+
+        for line in path.read_text().splitlines():
+            entry = Entry(**json.loads(line))
+            self._entries.setdefault(_key(entry.cmd, entry.input), deque()).append(entry)
+
+    async def play(self, cmd: list[str] | str, input_: str | None = None) -> Entry:
+        """Returns the next recording of the command, after waiting for its scaled latency."""
+        key = _key(cmd, input_)
+        if self._entries.get(key):
+            entry = self._entries[key].popleft()
+            self._last[key] = entry
+        elif key in self._last:
+            entry = self._last[key]
+        else:
+            raise CassetteError(f'{cmd} was not recorded in {self.path}')
+
+        if self.speed > 0:
+            await asyncio.sleep(entry.latency_ms / 1000 / self.speed)
+        return entry
+
+    def unplayed(self) -> int:
+        return sum(len(entries) for entries in self._entries.values())
+
+
+_recorder: Recorder | None = None
+_player: Player | None = None
+
+
+def player() -> Player | None:
+    """Returns the player while replaying a cassette, in which case commands must not run."""
+    return _player
+
+
+def is_recording() -> bool:
+    return _recorder is not None
+
+
+def record(
+    cmd: list[str] | str,
+    *,
+    cwd: Path | str | None,
+    stdout: str,
+    stderr: str,
+    exit_code: int | None,
+    seconds: float,
+    input_: str | None = None,
+):
+    """Adds a command that ran to the cassette. Does nothing unless recording."""
+    if _recorder is None:
+        return
+
+    _recorder.add(
+        Entry(
+            cmd=cmd,
+            cwd=str(cwd or Path.cwd()),
+            stdout=stdout,
+            stderr=stderr,
+            exit_code=exit_code,
+            latency_ms=round(seconds * 1000, 3),
+            input=input_,
+        )
+    )
+
+
+@contextlib.contextmanager
+def recording(record: Path | None, replay: Path | None, speed: float = 1.0) -> Iterator[None]:
+    """Records commands to `record`, or replays them from `replay`, while the block runs."""
+    global _recorder, _player
+
+    if record is None and replay is None:
+        yield
+        return
+
+    assert record is None or replay is None, 'Cannot record and replay at the same time'
+    if record is not None:
+        _recorder = Recorder(record)
+    else:
+        assert replay is not None
+        _player = Player(replay, speed)
+
+    try:
+        yield
+    finally:
+        if _recorder is not None:
+            _recorder.close()
+        if _player is not None and (unplayed := _player.unplayed()):
+            logger.info('%d recorded commands were not replayed', unplayed)
+        _recorder = _player = None
@@ -1,21 +1,17 @@
 #!/usr/bin/env python3
 
-import asyncio
+# Command modules are imported inside their handler, so an invocation only pays for
+# importing what the chosen subcommand needs (e.g. rich is only loaded by deliver).
+from __future__ import annotations
+
 import logging
 import sys
+from typing import TYPE_CHECKING
+
+from gh_tt import preflight
 
-from gh_tt import configuration
-from gh_tt.commands import git
-from gh_tt.deliver import DeliverError, deliver
-from gh_tt.legacy.semver import (
-    BumpError,
-    ReleaseType,
-    Semver,
-    handle_semver_bump,
-    validate_bump_context,
-)
-from gh_tt.self_commands import upgrade
-from gh_tt.workon import WorkonError, workon_issue, workon_title
+if TYPE_CHECKING:
+    from gh_tt import configuration
 
 logger = logging.getLogger(__name__)
 
@@ -29,31 +25,72 @@ def _abort_on_legacy_path(args):
     sys.exit(1)
 
 
-def handle_self(args):
+async def handle_self(args):
+    # Imported before upgrade() replaces the files of the extension
+    from gh_tt import daemon
+    from gh_tt.self_commands import upgrade
+
     if args.self_command == 'upgrade':
-        asyncio.run(upgrade(pin=args.pin))
+        # A running daemon still has the previous version loaded
+        stopped = daemon.stop()
+        await upgrade(pin=args.pin)
+        if stopped:
+            print('Stopped the gh-tt daemon. Run `gh tt daemon start` to start the new version.')
+
+
+async def handle_daemon(args):
+    from gh_tt import daemon
+
+    try:
+        match args.daemon_command:
+            case 'start' if args.foreground:
+                await daemon.serve(idle_timeout=args.idle_timeout)
+            case 'start':
+                path = await daemon.start(idle_timeout=args.idle_timeout)
+                print(f'gh-tt daemon listening on {path}')
+            case 'stop':
+                print('gh-tt daemon stopped' if daemon.stop() else 'gh-tt daemon is not running')
+            case 'status':
+                status = daemon.status()
+                if status is None:
+                    print('gh-tt daemon is not running')
+                    sys.exit(1)
+                print(
+                    f'gh-tt daemon is running (pid {status["pid"]}, up {status["uptime_seconds"]}s, '
+                    f'{status["requests_served"]} commands served)'
+                )
+    except daemon.DaemonError as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
 
 
-def handle_workon(args):
+async def handle_workon(
+    args, config: configuration.TtConfig, gate: preflight.Gate = preflight.OPEN
+):
     """Handle the workon command"""
     if args.pr_workflow:
-        git_root = asyncio.run(git.get_root())
-        config = configuration.load_config(git_root)
+        from gh_tt.workon import WorkonError, workon_issue, workon_title
 
         try:
             if args.title:
                 logger.debug('handle_workon: pr_workflow with title=%s', args.title)
-                asyncio.run(
-                    workon_title(
-                        issue_title=args.title,
-                        issue_body=args.body,
-                        assign=args.assignee,
-                        config=config,
-                    )
+                await workon_title(
+                    issue_title=args.title,
+                    issue_body=args.body,
+                    assign=args.assignee,
+                    config=config,
+                    gate=gate,
+                    worktree=args.worktree,
                 )
             else:
                 logger.debug('handle_workon: pr_workflow with issue=%s', args.issue)
-                asyncio.run(workon_issue(args.issue, assign=args.assignee, config=config))
+                await workon_issue(
+                    args.issue,
+                    assign=args.assignee,
+                    config=config,
+                    gate=gate,
+                    worktree=args.worktree,
+                )
         except WorkonError as e:
             print(e, file=sys.stderr)
             sys.exit(1)
@@ -63,25 +100,32 @@ def handle_workon(args):
     _abort_on_legacy_path(args)
 
 
-def _resolve_poll_flag(args) -> bool:
+def _resolve_poll_flag(args, config: configuration.TtConfig) -> bool:
     """Resolve the poll flag: CLI > config > False."""
     if args.poll is not None:
         return args.poll
 
-    git_root = asyncio.run(git.get_root())
-    config = configuration.load_config(git_root)
     return config.deliver.policies.poll
 
 
-def handle_deliver(args):
+async def handle_deliver(
+    args, config: configuration.TtConfig, gate: preflight.Gate = preflight.OPEN
+):
     """Handle the deliver command"""
     if args.pr_workflow:
-        poll = _resolve_poll_flag(args)
+        from gh_tt.deliver import DeliverError, deliver
+
+        poll = _resolve_poll_flag(args, config)
         logger.debug(
             'handle_deliver: pr_workflow with delete_branch=%s, poll=%s', args.delete_branch, poll
         )
         try:
-            asyncio.run(deliver(delete_branch=args.delete_branch, poll=poll))
+            await deliver(
+                delete_branch=args.delete_branch,
+                poll=poll,
+                gate=gate,
+                fetch_freshness_seconds=config.fetch.freshness_seconds,
+            )
         except DeliverError as e:
             print(e, file=sys.stderr)
             sys.exit(1)
@@ -90,9 +134,18 @@ def handle_deliver(args):
     _abort_on_legacy_path(args)
 
 
-def handle_semver(args):
+async def handle_semver(
+    args, config: configuration.TtConfig, gate: preflight.Gate = preflight.OPEN
+):
     """Handle the semver command"""
-    semver = Semver.with_tags_loaded()
+    from gh_tt.legacy.semver import (
+        BumpError,
+        ReleaseType,
+        Semver,
+        handle_semver_bump,
+        validate_bump_context,
+    )
+
     # Use the level to determine if this is a prerelease operation
     release_type = (
         ReleaseType.PRERELEASE
@@ -101,14 +154,21 @@ def handle_semver(args):
     )
 
     if args.semver_command == 'bump':
+        # Validating fetches the tags along with the default branch, so loading the tags
+        # does not fetch again
         try:
-            asyncio.run(validate_bump_context())
+            await validate_bump_context(config)
+            semver = await Semver.with_tags_loaded(config)
         except BumpError as e:
             print(e, file=sys.stderr)
             sys.exit(1)
 
-        handle_semver_bump(args, semver, release_type)
-    elif args.semver_command == 'list':
+        await handle_semver_bump(args, semver, release_type, gate=gate)
+        return
+
+    semver = await Semver.with_tags_loaded(config)
+
+    if args.semver_command == 'list':
         filter_type = getattr(args, 'filter_type', 'release')
         semver.list(release_type=release_type, filter_type=filter_type, show_sha=args.sha)
     elif args.semver_command is None:
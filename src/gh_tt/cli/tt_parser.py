@@ -1,4 +1,5 @@
 import argparse
+from pathlib import Path
 
 
 def tt_parse(args=None):
@@ -18,6 +19,53 @@ def tt_parse(args=None):
         default=False,
         dest='pr_workflow',
     )
+    parent_parser.add_argument(
+        '--no-preflight-cache',
+        action='store_true',
+        help='Always check the gh version and token scopes instead of using cached results',
+        default=False,
+        dest='no_preflight_cache',
+    )
+    parent_parser.add_argument(
+        '--import-time',
+        action='store_true',
+        help='Print a `python -X importtime` style report of the modules the command imported',
+        default=False,
+        dest='import_time',
+    )
+    parent_parser.add_argument(
+        '--trace',
+        type=Path,
+        metavar='FILE',
+        help='Write a Chrome trace (chrome://tracing, ui.perfetto.dev) of the external commands run to FILE',
+        default=None,
+        dest='trace',
+    )
+    cassette_group = parent_parser.add_mutually_exclusive_group()
+    cassette_group.add_argument(
+        '--record',
+        type=Path,
+        metavar='FILE',
+        help='Record the external commands run, with their output and latency, to the cassette FILE',
+        default=None,
+        dest='record',
+    )
+    cassette_group.add_argument(
+        '--replay',
+        type=Path,
+        metavar='FILE',
+        help='Serve the external commands from the cassette FILE instead of running them',
+        default=None,
+        dest='replay',
+    )
+    parent_parser.add_argument(
+        '--replay-speed',
+        type=float,
+        metavar='FACTOR',
+        help='Divide the recorded latencies by FACTOR when replaying, 0 to replay without delays (default: 1)',
+        default=1.0,
+        dest='replay_speed',
+    )
 
     version_parser = argparse.ArgumentParser(add_help=False)
     version_parser.add_argument(
@@ -72,6 +120,34 @@ def tt_parse(args=None):
         default='stable',
     )
 
+    # Add daemon subcommand
+    daemon_parser = subparsers.add_parser(
+        'daemon',
+        help='Manage a background gh-tt process that makes commands start faster',
+        description="""
+            Keeps gh-tt loaded in a background process for the current user. While it runs,
+            `gh tt` forwards commands to it, which skips starting and importing gh-tt on
+            every invocation.
+            """,
+    )
+    daemon_sub_parser = daemon_parser.add_subparsers(dest='daemon_command', required=True)
+    daemon_start_parser = daemon_sub_parser.add_parser('start', help='Start the daemon')
+    daemon_start_parser.add_argument(
+        '--foreground',
+        action='store_true',
+        help='Run the daemon in the foreground instead of in the background',
+        default=False,
+    )
+    daemon_start_parser.add_argument(
+        '--idle-timeout',
+        type=float,
+        help='Stop the daemon after this many seconds without commands. 3600 by default.',
+        default=3600,
+        dest='idle_timeout',
+    )
+    daemon_sub_parser.add_parser('stop', help='Stop the daemon')
+    daemon_sub_parser.add_parser('status', help='Show whether the daemon is running')
+
     # Add workon subcommand
     workon_parser = subparsers.add_parser(
         'workon', parents=[parent_parser], help='Set the issue number context to work on'
@@ -87,6 +163,13 @@ def tt_parse(args=None):
         help='Optional body (issue comment) for the new issue',
     )
 
+    workon_parser.add_argument(
+        '--worktree',
+        action='store_true',
+        help='Check out the branch of the issue in a worktree of its own, rather than '
+        'switching branches, and print its path',
+    )
+
     assign_group = workon_parser.add_mutually_exclusive_group()
     assign_group.add_argument(
         '--assign', dest='assignee', action='store_true', help='Assign @me to the issue (default)'
@@ -268,4 +351,7 @@ def tt_parse(args=None):
             '🛑 The --delete-branch flag can only be used with the --pr-workflow flag'
         )
 
+    if args.command == 'workon' and (not args.pr_workflow and args.worktree):
+        workon_parser.error('🛑 The --worktree flag can only be used with the --pr-workflow flag')
+
     return args
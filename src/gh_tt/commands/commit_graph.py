@@ -0,0 +1,350 @@
+"""
+Answers ancestry questions about commits from the files in the git directory, without
+starting git.
+
+Reads the commit-graph (`objects/info/commit-graph`, or the layers of a split
+commit-graph chain), which git writes on gc and maintenance, and holds the parents and
+generation numbers of the commits. Commits made or fetched since are usually loose
+objects, which are read as well. For anything else, like a commit only in a pack, a
+shallow clone or replaced commits, `UnsupportedCommitError` is raised and callers ask
+git instead.
+"""
+
+import heapq
+import itertools
+import mmap
+import struct
+import zlib
+from dataclasses import dataclass, field
+from pathlib import Path
+
+SIGNATURE = b'CGPH'
+HASH_LENGTHS = {1: 20, 2: 32}
+NO_PARENT = 0x70000000
+# Set on the second parent when the commit has more than two, and on the last edge
+EXTRA_EDGES = 0x80000000
+CHUNK_ENTRY = struct.Struct('>4sQ')
+
+
+class UnsupportedCommitError(Exception):
+    """Raised for commits and repositories the reader does not understand. Ask git instead."""
+
+
+@dataclass
+class _Layer:
+    """One commit-graph file, the whole graph or a layer of a chain."""
+
+    data: mmap.mmap
+    hash_length: int
+    commits: int
+    # The number of commits in the layers below, which positions in this layer start at
+    offset: int
+    chunks: dict[bytes, int]
+
+    @classmethod
+    def open(cls, path: Path, offset: int) -> '_Layer':
+        with path.open('rb') as f:
+            try:
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except ValueError as e:
+                # mmap refuses empty files
+                raise UnsupportedCommitError(f'cannot map commit-graph file {path}: {e}') from e
+
+        try:
+            return cls._parse(data, path, offset)
+        except BaseException:
+            data.close()
+            raise
+
+    @classmethod
+    def _parse(cls, data: mmap.mmap, path: Path, offset: int) -> '_Layer':
+        signature, version, hash_version, chunk_count = struct.unpack_from('>4sBBB', data)
+        if signature != SIGNATURE or version != 1 or hash_version not in HASH_LENGTHS:
+            raise UnsupportedCommitError(f'unsupported commit-graph file {path}')
+        hash_length = HASH_LENGTHS[hash_version]
+
+        # The table ends with an entry for the end of the last chunk, so every chunk has an end
+        entries = [
+            CHUNK_ENTRY.unpack_from(data, 8 + i * CHUNK_ENTRY.size) for i in range(chunk_count + 1)
+        ]
+        chunks = dict(entries[:-1])
+        ends = {
+            chunk_id: next_offset for (chunk_id, _), (_, next_offset) in itertools.pairwise(entries)
+        }
+        if not {b'OIDF', b'OIDL', b'CDAT'} <= chunks.keys():
+            raise UnsupportedCommitError(f'commit-graph file {path} lacks required chunks')
+
+        commits = struct.unpack_from('>I', data, chunks[b'OIDF'] + 255 * 4)[0]
+        sizes = {
+            b'OIDF': 256 * 4,
+            b'OIDL': commits * hash_length,
+            b'CDAT': commits * (hash_length + 16),
+        }
+        # The file ends with a checksum after the last chunk
+        _, end = entries[-1]
+        if end + hash_length > len(data) or any(
+            chunks[chunk_id] + size > ends[chunk_id] for chunk_id, size in sizes.items()
+        ):
+            raise UnsupportedCommitError(f'commit-graph file {path} is truncated')
+        return cls(data, hash_length, commits, offset, chunks)
+
+    def find(self, oid: bytes) -> int | None:
+        """Returns the position of the commit in this layer, by a binary search in OIDL."""
+        fanout = self.chunks[b'OIDF']
+        low = struct.unpack_from('>I', self.data, fanout + (oid[0] - 1) * 4)[0] if oid[0] else 0
+        high = struct.unpack_from('>I', self.data, fanout + oid[0] * 4)[0]
+        lookup = self.chunks[b'OIDL']
+        while low < high:
+            middle = (low + high) // 2
+            start = lookup + middle * self.hash_length
+            candidate = self.data[start : start + self.hash_length]
+            if candidate < oid:
+                low = middle + 1
+            elif candidate > oid:
+                high = middle
+            else:
+                return middle
+        return None
+
+    def oid(self, position: int) -> bytes:
+        start = self.chunks[b'OIDL'] + position * self.hash_length
+        return self.data[start : start + self.hash_length]
+
+    def commit_data(self, position: int) -> tuple[list[int], int]:
+        """Returns the global positions of the parents and the generation of a commit."""
+        start = self.chunks[b'CDAT'] + position * (self.hash_length + 16) + self.hash_length
+        first, second, generation_and_time = struct.unpack_from('>IIQ', self.data, start)
+
+        parents = [] if first == NO_PARENT else [first]
+        if second & EXTRA_EDGES:
+            edges = self.chunks.get(b'EDGE')
+            if edges is None:
+                raise UnsupportedCommitError('commit-graph lacks the EDGE chunk')
+            index = second & ~EXTRA_EDGES
+            while True:
+                try:
+                    (edge,) = struct.unpack_from('>I', self.data, edges + index * 4)
+                except struct.error as e:
+                    raise UnsupportedCommitError('commit-graph EDGE chunk is truncated') from e
+                parents.append(edge & ~EXTRA_EDGES)
+                if edge & EXTRA_EDGES:
+                    break
+                index += 1
+        elif second != NO_PARENT:
+            parents.append(second)
+
+        # The topological level, in the upper 30 bits
+        return parents, generation_and_time >> 34
+
+
+@dataclass
+class CommitGraph:
+    layers: list[_Layer]
+
+    @property
+    def hash_length(self) -> int:
+        return self.layers[0].hash_length
+
+    def find(self, oid: bytes) -> int | None:
+        """Returns the global position of a commit, or None if it is not in the graph."""
+        for layer in self.layers:
+            position = layer.find(oid)
+            if position is not None:
+                return layer.offset + position
+        return None
+
+    def _layer(self, position: int) -> _Layer:
+        for layer in reversed(self.layers):
+            if position >= layer.offset:
+                return layer
+        raise UnsupportedCommitError(f'position {position} is not in the commit-graph')
+
+    def oid(self, position: int) -> bytes:
+        layer = self._layer(position)
+        return layer.oid(position - layer.offset)
+
+    def commit_data(self, position: int) -> tuple[list[int], int]:
+        layer = self._layer(position)
+        return layer.commit_data(position - layer.offset)
+
+    def close(self):
+        for layer in self.layers:
+            layer.data.close()
+
+
+def load_graph(objects_dir: Path) -> CommitGraph | None:
+    """Opens the commit-graph, or the commit-graph chain, of a repository."""
+    info = objects_dir / 'info'
+    chain = info / 'commit-graphs' / 'commit-graph-chain'
+    if chain.exists():
+        paths = [
+            info / 'commit-graphs' / f'graph-{graph_hash}.graph'
+            for graph_hash in chain.read_text().split()
+        ]
+    elif (info / 'commit-graph').exists():
+        paths = [info / 'commit-graph']
+    else:
+        return None
+
+    layers = []
+    offset = 0
+    try:
+        for path in paths:
+            layer = _Layer.open(path, offset)
+            layers.append(layer)
+            offset += layer.commits
+    except BaseException as e:
+        for layer in layers:
+            layer.data.close()
+        if isinstance(e, (OSError, struct.error)):
+            raise UnsupportedCommitError(f'cannot read the commit-graph: {e}') from e
+        raise
+    return CommitGraph(layers)
+
+
+@dataclass
+class Commits:
+    """The parents and generation numbers of commits, from the commit-graph and loose objects.
+
+    Generation numbers grow from parent to child, so a walk in order of generation visits
+    a commit after all the commits it was reached from.
+    """
+
+    objects_dir: Path
+    graph: CommitGraph | None
+    # Commits read from loose objects, object name to parents and generation
+    _loose: dict[str, tuple[list[str], int]] = field(default_factory=dict)
+
+    def _read_loose(self, oid: str) -> list[str]:
+        path = self.objects_dir / oid[:2] / oid[2:]
+        try:
+            content = zlib.decompress(path.read_bytes())
+        except FileNotFoundError:
+            raise UnsupportedCommitError(
+                f'{oid} is neither in the commit-graph nor loose'
+            ) from None
+
+        header, _, body = content.partition(b'\0')
+        if not header.startswith(b'commit '):
+            raise UnsupportedCommitError(f'{oid} is not a commit')
+        parents = []
+        for line in body.split(b'\n'):
+            if line.startswith(b'parent '):
+                parents.append(line.removeprefix(b'parent ').decode())
+            elif line.startswith(b'author ') or not line:
+                # The parents come before the author
+                break
+        return parents
+
+    def node(self, oid: str) -> tuple[list[str], int]:
+        """Returns the parents and the generation number of a commit."""
+        if oid in self._loose:
+            return self._loose[oid]
+
+        if self.graph is not None and len(oid) == self.graph.hash_length * 2:
+            position = self.graph.find(bytes.fromhex(oid))
+            if position is not None:
+                parents, generation = self.graph.commit_data(position)
+                return [self.graph.oid(parent).hex() for parent in parents], generation
+
+        # A loose commit is one more than its highest parent, computed without recursion as
+        # loose commits can be many in a row
+        stack = [oid]
+        while stack:
+            current = stack[-1]
+            if current in self._loose:
+                stack.pop()
+                continue
+            parents = self._read_loose(current)
+            pending = [p for p in parents if p not in self._loose and not self._in_graph(p)]
+            if pending:
+                stack.extend(pending)
+                continue
+            generation = 1 + max((self.node(parent)[1] for parent in parents), default=0)
+            self._loose[current] = (parents, generation)
+            stack.pop()
+        return self._loose[oid]
+
+    def _in_graph(self, oid: str) -> bool:
+        return (
+            self.graph is not None
+            and len(oid) == self.graph.hash_length * 2
+            and self.graph.find(bytes.fromhex(oid)) is not None
+        )
+
+    def generation(self, oid: str) -> int:
+        return self.node(oid)[1]
+
+    def is_ancestor(self, ancestor: str, descendant: str) -> bool:
+        """Whether `ancestor` is reachable from `descendant`, or the same commit."""
+        floor = self.generation(ancestor)
+        seen = {descendant}
+        stack = [descendant]
+        while stack:
+            oid = stack.pop()
+            if oid == ancestor:
+                return True
+            parents, _ = self.node(oid)
+            for parent in parents:
+                # Commits below the generation of the ancestor cannot lead to it
+                if parent not in seen and self.generation(parent) >= floor:
+                    seen.add(parent)
+                    stack.append(parent)
+        return False
+
+    def ahead_behind(self, commit: str, base: str) -> tuple[int, int]:
+        """Counts the commits reachable from `commit` but not `base`, and the other way around.
+
+        Walks both histories at once, highest generation first, so a commit is counted once
+        it is known which of the two reach it. Stops when every commit left to walk is
+        reachable from both.
+        """
+        if commit == base:
+            return 0, 0
+
+        # Bit 1 for reachable from the commit, 2 from the base
+        flags = {commit: 1, base: 2}
+        queue = [(-self.generation(oid), oid) for oid in flags]
+        heapq.heapify(queue)
+        # The commits in the queue not yet reachable from both
+        unshared = 2
+        counts = {1: 0, 2: 0}
+
+        while queue and unshared:
+            _, oid = heapq.heappop(queue)
+            flag = flags[oid]
+            if flag != 3:
+                unshared -= 1
+                counts[flag] += 1
+
+            parents, _ = self.node(oid)
+            for parent in parents:
+                previous = flags.get(parent)
+                if previous is None:
+                    flags[parent] = flag
+                    heapq.heappush(queue, (-self.generation(parent), parent))
+                    unshared += flag != 3
+                elif previous | flag != previous:
+                    flags[parent] = previous | flag
+                    unshared -= flags[parent] == 3
+
+        return counts[1], counts[2]
+
+    def close(self):
+        if self.graph is not None:
+            self.graph.close()
+
+
+def open_commits(common_dir: Path) -> Commits:
+    """Opens the commits of the repository with the given common git directory.
+
+    Raises UnsupportedCommitError for repositories whose history git rewrites on reading.
+    Replaced commits (refs/replace/) are for the caller to rule out, they are refs.
+    """
+    if (common_dir / 'shallow').exists() or (common_dir / 'info' / 'grafts').exists():
+        raise UnsupportedCommitError('shallow clones and grafts are left to git')
+    if (common_dir / 'objects' / 'info' / 'alternates').exists():
+        raise UnsupportedCommitError('alternate object directories are left to git')
+
+    objects_dir = common_dir / 'objects'
+    return Commits(objects_dir, load_graph(objects_dir))
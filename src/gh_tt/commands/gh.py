@@ -2,6 +2,7 @@
 Contains functions that execute command-line GitHub commands
 """
 
+import contextlib
 import json
 import logging
 import re
@@ -11,18 +12,28 @@ from typing import Literal
 from async_lru import alru_cache
 from pydantic import AliasPath, BaseModel, Field, HttpUrl, PositiveInt
 
-from gh_tt.commands import shell
+from gh_tt.commands import git, git_refs, shell
 
 logger = logging.getLogger(__name__)
 
 
-@alru_cache
 async def get_default_branch() -> str:
-    result = await shell.run(
-        ['gh', 'repo', 'view', '--json', 'defaultBranchRef', '--jq', '.defaultBranchRef.name']
-    )
-
-    return result.stdout
+    # The clone records the default branch in refs/remotes/<remote>/HEAD. It is not updated
+    # when the default branch is renamed, so it only counts while its target exists
+    if (reader := git_refs.reader()) is not None:
+        with contextlib.suppress(git_refs.UnsupportedRepositoryError):
+            remote = await git.get_remote()
+            target = reader.symbolic_target(f'refs/remotes/{remote}/HEAD')
+            if (
+                target is not None
+                and target.startswith(f'refs/remotes/{remote}/')
+                and reader.resolve_ref(target) is not None
+            ):
+                return target.removeprefix(f'refs/remotes/{remote}/')
+
+    # Answered by the same `gh repo view` as get_repo
+    repo = await get_repo()
+    return repo.default_branch
 
 
 class PullRequestState(Enum):
@@ -49,7 +60,9 @@ async def get_pr() -> PullRequest:
     return PullRequest(**json.loads(result.stdout))
 
 
-async def create_draft_pr(issue_number: int, issue_title: str, default_branch: str):
+async def create_draft_pr(
+    issue_number: int, issue_title: str, default_branch: str, head: str | None = None
+):
     logger.debug('creating draft PR for issue #%d on base %s', issue_number, default_branch)
     # The PR would close the issue even without this reference, but mentioning the issue
     # is nice for quick access
@@ -68,12 +81,17 @@ async def create_draft_pr(issue_number: int, issue_title: str, default_branch: s
             title,
             '--body',
             body,
-        ]
+            # The checked out branch, unless given
+            *(['--head', head] if head else []),
+        ],
+        single_flight=False,
     )
 
 
 async def assign_pr(dev_branch: str, assignee: str):
-    await shell.run(['gh', 'pr', 'edit', dev_branch, '--add-assignee', assignee])
+    await shell.run(
+        ['gh', 'pr', 'edit', dev_branch, '--add-assignee', assignee], single_flight=False
+    )
 
 
 class CheckBucket(Enum):
@@ -98,6 +116,8 @@ async def get_pr_checks(branch: str) -> list[Check]:
     result = await shell.run(
         ['gh', 'pr', 'checks', branch, '--json', 'name,state,bucket,workflow,link'],
         die_on_error=False,
+        # Polled while the checks run, other gh commands should not wait for it
+        priority=shell.Priority.BACKGROUND,
     )
 
     if result.return_code != 0:
@@ -122,11 +142,11 @@ async def merge_pr(dev_branch: str, *, delete_branch: bool, body: str):
     if delete_branch:
         cmd.append('--delete-branch')
 
-    await shell.run(cmd)
+    await shell.run(cmd, single_flight=False)
 
 
 async def mark_pr_ready(dev_branch: str):
-    await shell.run(['gh', 'pr', 'ready', dev_branch])
+    await shell.run(['gh', 'pr', 'ready', dev_branch], single_flight=False)
 
 
 async def is_pr_open(dev_branch: str) -> bool:
@@ -165,10 +185,15 @@ class Issue(BaseModel):
 
 
 async def assign_issue(issue_number: int, assignee: str):
-    await shell.run(cmd=['gh', 'issue', 'edit', str(issue_number), '--add-assignee', assignee])
+    await shell.run(
+        cmd=['gh', 'issue', 'edit', str(issue_number), '--add-assignee', assignee],
+        single_flight=False,
+    )
 
 
-async def develop_issue(issue_title: str, issue_number: int, default_branch: str) -> str:
+async def develop_issue(
+    issue_title: str, issue_number: int, default_branch: str, *, checkout: bool = True
+) -> str:
     sanitized_title = re.sub(r'[^a-zA-Z0-9]+', '_', issue_title)
     branch_name = f'{issue_number}-{sanitized_title}'
     logger.debug('developing issue #%d with branch %s', issue_number, branch_name)
@@ -183,8 +208,9 @@ async def develop_issue(issue_title: str, issue_number: int, default_branch: str
             default_branch,
             '--name',
             branch_name,
-            '--checkout',
-        ]
+            *(['--checkout'] if checkout else []),
+        ],
+        single_flight=False,
     )
 
     return branch_name
@@ -206,10 +232,18 @@ async def get_issue(issue_number: int) -> Issue:
     return Issue(**json.loads(result.stdout))
 
 
+# New issues are usually visible right away, so probe quickly before backing off to
+# 0.5, 1, 2, 4 seconds (with jitter) while GitHub catches up
+ISSUE_VISIBLE_BACKOFF = shell.Backoff(
+    fast_probes=2, fast_interval=0.2, initial=0.5, factor=2, cap=4, jitter=True
+)
+
+
 async def create_issue(title: str, body: str | None = None) -> Issue:
     logger.debug('creating issue: %s', title)
     result = await shell.run(
-        cmd=['gh', 'issue', 'create', '--title', title, '--body', body if body is not None else '']
+        cmd=['gh', 'issue', 'create', '--title', title, '--body', body if body is not None else ''],
+        single_flight=False,
     )
 
     # Command above outputs the issue URL, e.g.
@@ -230,7 +264,7 @@ async def create_issue(title: str, body: str | None = None) -> Issue:
         cmd=issue_view_cmd,
         predicate=lambda r: bool(r.stdout),
         timeout_seconds=15,
-        interval=1,
+        backoff=ISSUE_VISIBLE_BACKOFF,
     )
 
     if issue_result is None:
@@ -241,6 +275,7 @@ async def create_issue(title: str, body: str | None = None) -> Issue:
             return_code=1,
         )
 
+    logger.debug('issue #%d is visible after %d attempts', issue_number, issue_result.attempts)
     return Issue(**json.loads(issue_result.stdout))
 
 
@@ -292,7 +327,8 @@ async def add_item_to_project(
             item_url,
             '--format',
             'json',
-        ]
+        ],
+        single_flight=False,
     )
 
     return ProjectItem(**json.loads(result.stdout))
@@ -310,10 +346,8 @@ class ProjectStatusField(BaseModel):
     options: list[StatusFieldOption]
 
 
-async def update_project_item_status(
-    project_id: str, project_number: int, project_owner: str, item_id: str, status_value: str
-):
-    logger.debug('updating project item status: item=%s, status=%s', item_id, status_value)
+@alru_cache
+async def get_project_status_field(project_number: int, project_owner: str) -> ProjectStatusField:
     status_field_name = 'Status'
 
     result = await shell.run(
@@ -331,7 +365,16 @@ async def update_project_item_status(
         ]
     )
 
-    project_status_field = ProjectStatusField(**json.loads(result.stdout))
+    return ProjectStatusField(**json.loads(result.stdout))
+
+
+async def update_project_item_status(
+    project_id: str, project_number: int, project_owner: str, item_id: str, status_value: str
+):
+    logger.debug('updating project item status: item=%s, status=%s', item_id, status_value)
+    project_status_field = await get_project_status_field(
+        project_number=project_number, project_owner=project_owner
+    )
 
     status_option_id = next(
         option.option_id for option in project_status_field.options if option.name == status_value
@@ -353,7 +396,8 @@ async def update_project_item_status(
             item_id,
             '--single-select-option-id',
             status_option_id,
-        ]
+        ],
+        single_flight=False,
     )
 
 
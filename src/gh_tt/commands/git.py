@@ -3,75 +3,667 @@ Contains functions that execute command-line git commands
 """
 
 import asyncio
+import contextlib
+import fcntl
+import json
 import logging
+import re
+import time
+from collections.abc import Awaitable, Callable, Iterable
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Literal
 
 from async_lru import alru_cache
 
-from gh_tt.commands import shell
+from gh_tt import cassette, trace
+from gh_tt.commands import commit_graph, git_refs, shell
 
 logger = logging.getLogger(__name__)
 
+# The functions below read refs with git_refs where they can, and ask git where git_refs
+# does not support the repository or the ref
+
 
 async def get_root() -> Path:
+    if (reader := git_refs.reader()) is not None:
+        return reader.root
+
     result = await shell.run(['git', 'rev-parse', '--show-toplevel'])
     return Path(result.stdout)
 
 
+# Tells git to skip the locks it only takes for side effects, like `git status` writing
+# back the refreshed index, so read-only commands do not make a concurrent git command fail
+READ_ONLY_ENV = {'GIT_OPTIONAL_LOCKS': '0'}
+
+
 async def has_changes_to_tracked_files() -> bool:
-    result = await shell.run(['git', 'status', '--porcelain'])
-    return any(not line.startswith('??') for line in result.stdout.splitlines())
+    """Whether the index or the working tree differ from HEAD in any tracked file.
+
+    Unlike `git status`, the diffs never look at untracked files, and stop at the first
+    change. Changes to the working tree are found through the index, with the file system
+    monitor if `core.fsmonitor` is set. Files that only had their timestamps changed do not
+    count, as for `git status`.
+    """
+
+    async def differs(*args: str) -> bool:
+        cmd = ['git', 'diff', '--quiet', '--no-ext-diff', *args]
+        result = await shell.run(cmd, die_on_error=False, env=READ_ONLY_ENV)
+        if result.return_code not in (0, 1):
+            raise shell.ShellError(
+                cmd=cmd,
+                stdout=result.stdout,
+                stderr=result.stderr,
+                return_code=result.return_code,
+            )
+        return result.return_code == 1
+
+    # The index against HEAD, and the working tree against the index
+    return any(await asyncio.gather(differs('--cached'), differs()))
 
 
 async def stash():
-    await shell.run(['git', 'stash', '--include-untracked'])
+    await shell.run(['git', 'stash', '--include-untracked'], single_flight=False)
 
 
 async def stash_pop() -> shell.ShellResult:
-    return await shell.run(['git', 'stash', 'pop'], die_on_error=False)
-
+    return await shell.run(['git', 'stash', 'pop'], die_on_error=False, single_flight=False)
+
+
+TAGS_REFSPEC = '+refs/tags/*:refs/tags/*'
+
+MISSING_REMOTE_REF_PATTERN = re.compile(r"couldn't find remote ref (\S+)")
+
+
+class FetchCoordinator:
+    """Fetches the refs the commands of an invocation need, instead of everything.
+
+    The refspecs asked for in the same step of the event loop, e.g. by the branches of an
+    `asyncio.gather`, are fetched by one `git fetch`, and a refspec is fetched at most once
+    per invocation. Fetches run one at a time, as git fetches in the same repository do
+    not go well together.
+    """
+
+    def __init__(self, cwd: Path):
+        self.cwd = cwd
+        # The fetch of every refspec asked for so far
+        self._fetches: dict[str, asyncio.Task[None]] = {}
+        self._pending: set[str] = set()
+        self._batch: asyncio.Task[None] | None = None
+        self._lock = asyncio.Lock()
+
+    async def fetch(self, refspecs: set[str]):
+        for refspec in refspecs:
+            task = self._fetches.get(refspec)
+            # A fetch that failed or was cancelled is tried again
+            if task is not None and not (
+                task.done() and (task.cancelled() or task.exception() is not None)
+            ):
+                continue
+            if self._batch is None:
+                self._batch = asyncio.create_task(self._fetch_pending())
+            self._pending.add(refspec)
+            self._fetches[refspec] = self._batch
+
+        tasks = {self._fetches[refspec] for refspec in refspecs}
+        # Shielded, so a caller that is cancelled does not cancel the fetch for the others
+        await asyncio.gather(*(asyncio.shield(task) for task in tasks))
+
+    async def _fetch_pending(self):
+        # Lets the other requests of this step join the batch
+        await asyncio.sleep(0)
+        refspecs, self._pending, self._batch = self._pending, set(), None
+
+        remote = await get_remote()
+        async with self._lock:
+            await fetch_exclusively(remote, refspecs, lambda: self._run(remote, refspecs))
+
+    async def _run(self, remote: str, refspecs: set[str]):
+        while refspecs:
+            cmd = ['git', 'fetch', '--no-tags', remote, *sorted(refspecs)]
+            result = await shell.run(cmd, cwd=self.cwd, die_on_error=False)
+            if result.return_code == 0:
+                return
+
+            # A branch that is not on the remote (yet) fails the whole fetch, so it
+            # is fetched again without that branch
+            missing = MISSING_REMOTE_REF_PATTERN.search(result.stderr)
+            remaining = {
+                refspec
+                for refspec in refspecs
+                if missing is None or refspec.lstrip('+').split(':')[0] != missing[1]
+            }
+            if missing is None or remaining == refspecs:
+                raise shell.ShellError(
+                    cmd=cmd,
+                    stdout=result.stdout,
+                    stderr=result.stderr,
+                    return_code=result.return_code,
+                )
+            logger.debug('%s is not on %s, fetching without it', missing[1], remote)
+            refspecs = remaining
+
+
+_fetch_coordinators: dict[tuple[asyncio.AbstractEventLoop, Path], FetchCoordinator] = {}
+
+
+def _fetch_coordinator() -> FetchCoordinator:
+    key = (asyncio.get_running_loop(), Path.cwd())
+    if key not in _fetch_coordinators:
+        _fetch_coordinators[key] = FetchCoordinator(cwd=key[1])
+    return _fetch_coordinators[key]
+
+
+def forget_fetches():
+    """Forgets what was fetched on the running event loop, so the next invocation fetches again."""
+    loop = asyncio.get_running_loop()
+    for key in [key for key in _fetch_coordinators if key[0] is loop]:
+        del _fetch_coordinators[key]
+
+
+async def _git_path(name: str, *, common: bool = False) -> Path:
+    """Returns the path of a file in the git directory, e.g. FETCH_HEAD.
+
+    With `common`, in the directory linked worktrees share, rather than the one of the worktree.
+    """
+    if (reader := git_refs.reader()) is not None:
+        return (reader.common_dir if common else reader.git_dir) / name
+    if common:
+        result = await shell.run(['git', 'rev-parse', '--git-common-dir'])
+        return Path(result.stdout) / name
+    result = await shell.run(['git', 'rev-parse', '--git-path', name])
+    return Path(result.stdout)
 
-async def fetch():
-    await shell.run(['git', 'fetch', '--tags', '--all'])
 
+# The remote and refspecs of a fetch of everything, see Gitter.fetch
+ALL_REMOTES = '*'
+ALL_REFSPECS = frozenset({'*'})
+FETCH_LOCK_POLL_SECONDS = 0.05
+# Fetches older than this are dropped from the record in the lock file
+FETCH_RECORD_MAX_AGE_SECONDS = 24 * 60 * 60
 
-@alru_cache
-async def get_remote() -> str:
-    result = await shell.run(['git', 'remote'])
-    assert '\n' not in result.stdout, f'Multiple remotes are not supported, found: {result.stdout}'
-    return result.stdout
 
+def _try_lock(f) -> bool:
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        return False
+    return True
+
+
+async def fetch_exclusively(
+    remote: str, refspecs: Iterable[str], fetch: Callable[[], Awaitable[object]]
+):
+    """Runs `fetch` under a lock file in the git directory, shared by all gh-tt processes.
+
+    Concurrent invocations in the same clone, e.g. from an editor and a git hook, then do
+    not contend on the ref locks of git. An invocation that waited for another one to fetch
+    the same refspecs, or everything, uses that fetch instead of fetching again. The lock
+    file records when each refspec was fetched, for the freshness window of `fetch`.
+    """
+    if cassette.player() is not None:
+        await fetch()
+        return
+
+    path = await _git_path('gh-tt-fetch.lock', common=True)
+    refspecs = frozenset(refspecs)
+    started = time.time()
+    # Opened without truncating, the holder of the lock may be writing its record
+    with path.open('a+') as f:
+        waited = not _try_lock(f)
+        if waited:
+            logger.debug('waiting for the fetch of another gh-tt process')
+            with trace.span('wait for fetch', 'fetch', lock=str(path)):
+                # Polled, as the other process cannot signal this one, and a thread blocked
+                # in flock could not be cancelled
+                while not _try_lock(f):  # noqa: ASYNC110
+                    await asyncio.sleep(FETCH_LOCK_POLL_SECONDS)
+
+        try:
+            fetches = _read_fetches(f)
+            if waited and all(_fetched_at(fetches, remote, r) >= started for r in refspecs):
+                logger.debug('reusing the fetch of another gh-tt process')
+                return
+
+            await fetch()
+            finished = time.time()
+            fetches.setdefault(remote, {}).update(dict.fromkeys(refspecs, finished))
+            fetches = {
+                name: kept
+                for name, times in fetches.items()
+                if (
+                    kept := {
+                        refspec: at
+                        for refspec, at in times.items()
+                        if finished - at < FETCH_RECORD_MAX_AGE_SECONDS
+                    }
+                )
+            }
+            f.seek(0)
+            f.truncate()
+            f.write(json.dumps({'fetches': fetches}))
+            f.flush()
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _read_fetches(f) -> dict[str, dict[str, float]]:
+    """Reads when each refspec was last fetched, by remote, from the lock file."""
+    f.seek(0)
+    try:
+        record = json.loads(f.read())
+    except ValueError:
+        return {}
+    fetches = record.get('fetches') if isinstance(record, dict) else None
+    return fetches if isinstance(fetches, dict) else {}
+
+
+def _fetched_at(fetches: dict[str, dict[str, float]], remote: str, refspec: str) -> float:
+    """Returns when the refspec was last fetched, by itself or with everything, or 0 if never."""
+    (everything,) = ALL_REFSPECS
+    return max(
+        fetches.get(remote, {}).get(refspec, 0),
+        fetches.get(remote, {}).get(everything, 0),
+        fetches.get(ALL_REMOTES, {}).get(everything, 0),
+    )
 
-@alru_cache
-async def get_local_branches() -> list[str]:
-    result = await shell.run(['git', 'branch', '--format=%(refname:short)'])
 
-    return result.stdout.splitlines()
+async def _fresh_refspecs(remote: str, refspecs: set[str], freshness_seconds: float) -> set[str]:
+    """Returns the refspecs a gh-tt process fetched less than `freshness_seconds` ago."""
+    path = await _git_path('gh-tt-fetch.lock', common=True)
+    try:
+        # Read without the lock, a record torn by a concurrent write only means fetching again
+        with path.open() as f:
+            fetches = _read_fetches(f)
+    except FileNotFoundError:
+        return set()
+
+    now = time.time()
+    return {r for r in refspecs if now - _fetched_at(fetches, remote, r) < freshness_seconds}
+
+
+async def fetch(*, branches: Iterable[str] = (), tags: bool = False, freshness_seconds: float = 0):
+    """Fetches the branches, which may be patterns like 7-*, and the tags from the remote.
+
+    Skips the branches and tags fetched less than `freshness_seconds` ago.
+    """
+    remote = await get_remote()
+    refspecs = {f'+refs/heads/{branch}:refs/remotes/{remote}/{branch}' for branch in branches}
+    if tags:
+        refspecs.add(TAGS_REFSPEC)
+    if refspecs and freshness_seconds > 0:
+        fresh = await _fresh_refspecs(remote, refspecs, freshness_seconds)
+        if fresh:
+            logger.debug('skipping the fetch of %s, fetched recently', sorted(fresh))
+        refspecs -= fresh
+    if refspecs:
+        await _fetch_coordinator().fetch(refspecs)
 
 
 @alru_cache
-async def get_remote_branches() -> list[str]:
-    result = await shell.run(['git', 'branch', '-r', '--format=%(refname:short)'])
+async def get_remote() -> str:
+    remotes = None
+    if (reader := git_refs.reader()) is not None:
+        with contextlib.suppress(git_refs.UnsupportedRepositoryError):
+            remotes = '\n'.join(reader.remotes())
+    if remotes is None:
+        remotes = (await shell.run(['git', 'remote'])).stdout
 
-    return result.stdout.splitlines()
+    assert '\n' not in remotes, f'Multiple remotes are not supported, found: {remotes}'
+    return remotes
 
 
 async def get_current_branch_name() -> str:
+    if (reader := git_refs.reader()) is not None:
+        with contextlib.suppress(git_refs.UnsupportedRepositoryError):
+            target = reader.symbolic_target('HEAD')
+            if target is None and reader.resolve_ref('HEAD') is not None:
+                # Detached
+                return 'HEAD'
+            # A branch without commits yet does not resolve, git reports that
+            if target is not None and reader.exists(target):
+                return reader.short_name(target)
+
     result = await shell.run(['git', 'rev-parse', '--abbrev-ref', 'HEAD'])
     return result.stdout
 
 
+class BatchCheck:
+    """A `git cat-file --batch-check` process that resolves revisions over a pipe.
+
+    Starting git for every lookup costs a fork and exec, while a round trip over the pipe
+    of a running process costs next to nothing. One process runs per repository for the
+    rest of the invocation, see `close_batch_checks`.
+    """
+
+    CMD = ('git', 'cat-file', '--batch-check=%(objectname)')
+
+    def __init__(self, cwd: Path):
+        self.cwd = cwd
+        self._process: asyncio.subprocess.Process | None = None
+        self._lock = asyncio.Lock()
+
+    async def _start(self) -> asyncio.subprocess.Process:
+        if self._process is None or self._process.returncode is not None:
+            logger.debug('starting %s in %s', self.CMD, self.cwd)
+            with trace.span('git cat-file', 'shell', argv=list(self.CMD), cwd=str(self.cwd)):
+                self._process = await asyncio.create_subprocess_exec(
+                    *self.CMD,
+                    stdin=asyncio.subprocess.PIPE,
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.DEVNULL,
+                    cwd=self.cwd,
+                )
+        return self._process
+
+    async def resolve(self, revs: list[str]) -> list[str | None]:
+        """Returns the object name of every revision, or None where it did not resolve."""
+        if any('\n' in rev for rev in revs):
+            return [None] * len(revs)
+
+        request = ''.join(f'{rev}\n' for rev in revs)
+        async with self._lock:
+            if (player := cassette.player()) is not None:
+                entry = await player.play(list(self.CMD), input_=request)
+                lines = entry.stdout.splitlines(keepends=True)
+            else:
+                lines = await self._round_trip(request, len(revs))
+
+        if len(lines) < len(revs) or not all(lines):
+            logger.debug('%s exited, resolving %s without it', self.CMD, revs)
+            return [None] * len(revs)
+
+        # A revision that does not resolve is echoed back followed by 'missing' or 'ambiguous'
+        return [
+            object_name if not rest else None
+            for object_name, _, rest in (line.rstrip('\n').partition(' ') for line in lines)
+        ]
+
+    async def _round_trip(self, request: str, count: int) -> list[str]:
+        process = await self._start()
+        assert process.stdin is not None
+        assert process.stdout is not None
+        started = time.perf_counter()
+        with trace.span('resolve', 'batch', request=request):
+            try:
+                process.stdin.write(request.encode())
+                await process.stdin.drain()
+                lines = [(await process.stdout.readline()).decode() for _ in range(count)]
+            except (BrokenPipeError, ConnectionResetError):
+                return []
+
+        cassette.record(
+            list(self.CMD),
+            cwd=self.cwd,
+            stdout=''.join(lines),
+            stderr='',
+            exit_code=0,
+            seconds=time.perf_counter() - started,
+            input_=request,
+        )
+        return lines
+
+    async def close(self):
+        if self._process is None or self._process.returncode is not None:
+            return
+        assert self._process.stdin is not None
+        # The process exits once its input ends
+        self._process.stdin.close()
+        await self._process.wait()
+
+
+_batch_checks: dict[tuple[asyncio.AbstractEventLoop, Path], BatchCheck] = {}
+
+
+def _batch_check() -> BatchCheck:
+    key = (asyncio.get_running_loop(), Path.cwd())
+    if key not in _batch_checks:
+        _batch_checks[key] = BatchCheck(cwd=key[1])
+    return _batch_checks[key]
+
+
+async def close_batch_checks():
+    """Stops the `BatchCheck` processes started on the running event loop."""
+    loop = asyncio.get_running_loop()
+    batch_checks = [_batch_checks.pop(key) for key in list(_batch_checks) if key[0] is loop]
+    await asyncio.gather(*(batch_check.close() for batch_check in batch_checks))
+
+
 async def get_branch_tip_hash(branch: str, remote: str | None = None) -> str:
     ref = f'{remote}/{branch}' if remote else branch
+    object_name = None
+    native = False
+    if (reader := git_refs.reader()) is not None:
+        with contextlib.suppress(git_refs.UnsupportedRepositoryError):
+            object_name = reader.resolve(ref)
+            native = True
+
+    if not native:
+        batch_check = _batch_check()
+        [object_name], _ = await shell.coalesce(
+            ('resolve', ref, str(batch_check.cwd)), lambda: batch_check.resolve([ref])
+        )
+    if object_name is not None:
+        return object_name
+
+    # Reports why the ref does not resolve the way git does
     result = await shell.run(['git', 'rev-parse', ref])
     return result.stdout
 
 
-async def get_merge_base(branch: str, remote: str, default_branch: str) -> str:
-    result = await shell.run(['git', 'merge-base', branch, f'{remote}/{default_branch}'])
-    return result.stdout
+@dataclass(frozen=True)
+class RefStatus:
+    object_name: str
+    # Commits reachable from the ref but not from the base, and the other way around
+    ahead: int
+    behind: int
+
+
+# Whether git knows the %(ahead-behind:) atom of for-each-ref (git 2.41 and later)
+_ahead_behind_supported: bool | None = None
+
+
+async def resolve_refs(refs: list[str]) -> dict[str, str]:
+    """Resolves the refs to object names without starting git.
+
+    Reads them with git_refs, or over the `BatchCheck` pipe where it cannot. Refs that do
+    not exist are left out of the result.
+    """
+    if (reader := git_refs.reader()) is not None:
+        with contextlib.suppress(git_refs.UnsupportedRepositoryError):
+            resolved = {ref: reader.resolve(ref) for ref in refs}
+            return {ref: name for ref, name in resolved.items() if name is not None}
+
+    object_names = await _batch_check().resolve(refs)
+    return {ref: name for ref, name in zip(refs, object_names, strict=True) if name is not None}
+
+
+def _open_commits() -> commit_graph.Commits | None:
+    """Opens the commit-graph and loose commits, or returns None to ask git."""
+    if (reader := git_refs.reader()) is None:
+        return None
+    try:
+        if reader.list_refs('refs/replace/'):
+            # git reads replaced commits in place of the originals
+            logger.debug('reading commits with git, there are replace refs')
+            return None
+        return commit_graph.open_commits(reader.common_dir)
+    except (git_refs.UnsupportedRepositoryError, commit_graph.UnsupportedCommitError) as e:
+        logger.debug('reading commits with git: %s', e)
+        return None
+
+
+async def is_ancestor(ancestor: str, descendant: str) -> bool:
+    """Whether the commit `ancestor` is reachable from `descendant`, e.g. refs/remotes/origin/main
+    from HEAD.
+
+    Answered from the commit-graph and loose commits where possible, see commit_graph, and by
+    `git merge-base --is-ancestor` otherwise.
+    """
+    object_names = await resolve_refs([ancestor, descendant])
+    if len(object_names) == 2 and (commits := _open_commits()) is not None:
+        with contextlib.closing(commits):
+            try:
+                return commits.is_ancestor(object_names[ancestor], object_names[descendant])
+            except commit_graph.UnsupportedCommitError as e:
+                logger.debug('checking ancestry with git: %s', e)
+
+    result = await shell.run(
+        ['git', 'merge-base', '--is-ancestor', ancestor, descendant], die_on_error=False
+    )
+    if result.return_code not in (0, 1):
+        raise shell.ShellError(
+            cmd=['git', 'merge-base', '--is-ancestor', ancestor, descendant],
+            stdout=result.stdout,
+            stderr=result.stderr,
+            return_code=result.return_code,
+        )
+    return result.return_code == 0
+
+
+async def compare_refs(refs: list[str], base: str) -> dict[str, RefStatus]:
+    """Resolves the refs and counts their commits ahead of and behind `base`.
+
+    Takes full ref names, e.g. refs/remotes/origin/main. Refs that do not exist are left
+    out of the result. The refs are resolved without starting git, see `resolve_refs`, and
+    refs at the same commit as the base need no counting. The rest are counted from the
+    commit-graph and loose commits, see commit_graph. Several refs left to count are
+    answered by one `git for-each-ref` where git supports it. Otherwise every ref is
+    counted by a `git rev-list`.
+    """
+    object_names = await resolve_refs([base, *refs])
+    if base not in object_names:
+        # Raises the error git reports for the base
+        await get_branch_tip_hash(base)
+
+    statuses = {
+        ref: RefStatus(object_names[ref], ahead=0, behind=0)
+        for ref in refs
+        if object_names.get(ref) == object_names[base]
+    }
+    to_count = [ref for ref in refs if ref in object_names and ref not in statuses]
+
+    if to_count and (commits := _open_commits()) is not None:
+        with contextlib.closing(commits):
+            for ref in list(to_count):
+                try:
+                    ahead, behind = commits.ahead_behind(object_names[ref], object_names[base])
+                except commit_graph.UnsupportedCommitError as e:
+                    logger.debug('counting %s with git: %s', ref, e)
+                    continue
+                statuses[ref] = RefStatus(object_names[ref], ahead, behind)
+                to_count.remove(ref)
+
+    counted = None
+    if len(to_count) > 1 and _ahead_behind_supported is not False:
+        counted = await _count_with_for_each_ref(to_count, base)
+    if counted is None:
+        counts = await asyncio.gather(
+            *(
+                shell.run(['git', 'rev-list', '--left-right', '--count', f'{base}...{ref}'])
+                for ref in to_count
+            )
+        )
+        counted = {}
+        for ref, count in zip(to_count, counts, strict=True):
+            behind, ahead = count.stdout.split()
+            counted[ref] = RefStatus(object_names[ref], int(ahead), int(behind))
+
+    statuses.update(counted)
+    return {ref: statuses[ref] for ref in refs if ref in statuses}
+
+
+async def _count_with_for_each_ref(refs: list[str], base: str) -> dict[str, RefStatus] | None:
+    """Counts with the %(ahead-behind:) atom, returns None if git does not support it."""
+    global _ahead_behind_supported
+
+    result = await shell.run(
+        ['git', 'for-each-ref', f'--format=%(refname) %(objectname) %(ahead-behind:{base})', *refs],
+        die_on_error=False,
+    )
+    if result.return_code != 0:
+        if 'ahead-behind' not in result.stderr:
+            raise shell.ShellError(
+                cmd=['git', 'for-each-ref'],
+                stdout=result.stdout,
+                stderr=result.stderr,
+                return_code=result.return_code,
+            )
+        logger.debug('git does not support %%(ahead-behind:), counting with rev-list')
+        _ahead_behind_supported = False
+        return None
+
+    _ahead_behind_supported = True
+    statuses = {}
+    for line in result.stdout.splitlines():
+        refname, object_name, ahead, behind = line.rsplit(' ', 3)
+        # for-each-ref also lists the refs below a name, e.g. refs/heads/main/x
+        if refname in refs:
+            statuses[refname] = RefStatus(object_name, int(ahead), int(behind))
+    return statuses
+
+
+def _commits(count: int) -> str:
+    return f'{count} commit' if count == 1 else f'{count} commits'
+
+
+@dataclass(frozen=True)
+class Divergence:
+    # Commits HEAD has that the other ref does not, and the other way around
+    ahead: int
+    behind: int
+
+    @property
+    def diverged(self) -> bool:
+        return self.ahead > 0 or self.behind > 0
+
+    def describe(self) -> str:
+        """E.g. '2 commits ahead, 1 commit behind'."""
+        parts = []
+        if self.ahead:
+            parts.append(f'{_commits(self.ahead)} ahead')
+        if self.behind:
+            parts.append(f'{_commits(self.behind)} behind')
+        return ', '.join(parts) or 'up to date'
+
+
+@dataclass(frozen=True)
+class BranchStatus:
+    """Where HEAD stands against the default branch and its own branch on the remote."""
+
+    head: str
+    default: Divergence
+    # None when the branch is not on the remote
+    upstream: Divergence | None
+
+
+async def get_branch_status(remote: str, default_branch: str, branch: str) -> BranchStatus:
+    """Counts the commits HEAD is ahead of and behind `<remote>/<default_branch>` and
+    `<remote>/<branch>`.
+
+    Answered by one `git for-each-ref` where git supports %(ahead-behind:). Otherwise, a
+    remote ref at the same commit as HEAD needs no git at all, see `compare_refs`.
+    """
+    default_ref = f'refs/remotes/{remote}/{default_branch}'
+    upstream_ref = f'refs/remotes/{remote}/{branch}'
+    head, statuses = await asyncio.gather(
+        get_branch_tip_hash('HEAD'),
+        compare_refs(list(dict.fromkeys([default_ref, upstream_ref])), base='HEAD'),
+    )
+    if default_ref not in statuses:
+        # Raises the error git reports for the default branch
+        await get_branch_tip_hash(default_ref)
+
+    def divergence(ref: str) -> Divergence | None:
+        if ref not in statuses:
+            return None
+        # The counts of the ref against HEAD, turned around
+        return Divergence(ahead=statuses[ref].behind, behind=statuses[ref].ahead)
+
+    default = divergence(default_ref)
+    assert default is not None
+    return BranchStatus(head=head, default=default, upstream=divergence(upstream_ref))
 
 
 @dataclass
@@ -80,22 +672,44 @@ class CheckBranchExistsResult:
     name: str
 
 
+def _issue_branch(ref: str, issue_number: int) -> CheckBranchExistsResult | None:
+    kind, _, b = ref.removeprefix('refs/').partition('/')
+    if kind == 'remotes':
+        # Remote branches are prefixed with remote name (e.g., 'origin/1-branch-name')
+        b = b.split('/', 1)[1] if '/' in b else b
+    if not b.startswith(f'{issue_number}-'):
+        return None
+    branch_type = 'local' if kind == 'heads' else 'remote'
+    logger.debug('found %s branch: %s', branch_type, b)
+    return CheckBranchExistsResult(branch_type, name=b)
+
+
 async def check_branch_exists(issue_number: int) -> CheckBranchExistsResult | None:
     logger.debug('checking if branch exists for issue #%d', issue_number)
-    local_branches, remote_branches = await asyncio.gather(
-        get_local_branches(), get_remote_branches()
-    )
-    for b in local_branches:
-        if b.startswith(f'{issue_number}-'):
-            logger.debug('found local branch: %s', b)
-            return CheckBranchExistsResult('local', name=b)
+    # Only the refs named after the issue are read, however many branches there are
+    refs = None
+    if (reader := git_refs.reader()) is not None:
+        with contextlib.suppress(git_refs.UnsupportedRepositoryError):
+            refs = [*reader.list_refs(f'refs/heads/{issue_number}-')]
+            for remote in dict.fromkeys([*reader.remotes(), *reader.remote_ref_dirs()]):
+                refs.extend(reader.list_refs(f'refs/remotes/{remote}/{issue_number}-'))
+
+    if refs is None:
+        # for-each-ref sorts by refname, so all local branches come before the remote ones
+        result = await shell.run(
+            [
+                'git',
+                'for-each-ref',
+                '--format=%(refname)',
+                f'refs/heads/{issue_number}-*',
+                f'refs/remotes/*/{issue_number}-*',
+            ]
+        )
+        refs = result.stdout.splitlines()
 
-    for b in remote_branches:
-        # Remote branches are prefixed with remote name (e.g., 'origin/1-branch-name')
-        b = b.split('/', 1)[1] if '/' in b else b
-        if b.startswith(f'{issue_number}-'):
-            logger.debug('found remote branch: %s', b)
-            return CheckBranchExistsResult('remote', name=b)
+    for ref in refs:
+        if (found := _issue_branch(ref, issue_number)) is not None:
+            return found
 
     logger.debug('no branch found for issue #%d', issue_number)
     return None
@@ -115,41 +729,99 @@ async def switch_branch(switch_input: LocalBranchName | SwitchRemoteInput) -> Br
     match switch_input:
         case str():
             logger.debug('switching to local branch: %s', switch_input)
-            await shell.run(['git', 'switch', switch_input])
+            await shell.run(['git', 'switch', switch_input], single_flight=False)
             return switch_input
         case SwitchRemoteInput(branch_to_switch_to=branch, remote=remote):
             logger.debug('switching to remote branch: %s/%s', remote, branch)
-            await shell.run(['git', 'switch', '-c', branch, f'{remote}/{branch}'])
+            await shell.run(
+                ['git', 'switch', '-c', branch, f'{remote}/{branch}'], single_flight=False
+            )
             return branch
 
 
 PR_START_COMMIT_HEADLINE = '[skip ci] PR start commit'
 
 
-async def push_pr_start_commit(dev_branch: str):
+async def push_pr_start_commit(dev_branch: str, *, remote: str | None = None):
+    """Pushes an empty commit on `dev_branch`, so a PR can be created for it.
+
+    The commit goes on HEAD, which is on `dev_branch`. With `remote`, the branch is not
+    checked out anywhere, and is created from `<remote>/<dev_branch>` with the commit on top.
+    """
     logger.debug('pushing empty commit on branch %s', dev_branch)
-    status = await shell.run(['git', 'status', '--porcelain'])
-    has_changes = bool(status.stdout)
+    # Made from the tree of HEAD and moved onto the branch by updating the ref, so the
+    # working tree and the index, with whatever changes they hold, are never touched
+    if remote is None:
+        parent = await get_branch_tip_hash('HEAD')
+        # Moves HEAD, and the branch it is on, only if it still points at the parent
+        ref, old = 'HEAD', parent
+    else:
+        parent = await get_branch_tip_hash(dev_branch, remote=remote)
+        # The empty old value makes sure the branch does not exist yet
+        ref, old = f'refs/heads/{dev_branch}', ''
+    result = await shell.run(
+        [
+            'git',
+            'commit-tree',
+            f'{parent}^{{tree}}',
+            '-p',
+            parent,
+            '-m',
+            PR_START_COMMIT_HEADLINE,
+            '-m',
+            'This commit serves no other purpose than to allow creation of a PR when executing `gh tt workon`. Because creating a PR without a commit is not possible. This commit should be squashed or removed before merging this PR.',
+        ],
+        single_flight=False,
+    )
+    await shell.run(
+        [
+            'git',
+            'update-ref',
+            '-m',
+            f'gh tt workon: {PR_START_COMMIT_HEADLINE}',
+            ref,
+            result.stdout,
+            old,
+        ],
+        single_flight=False,
+    )
+    await shell.run(['git', 'push', '-u', remote or 'origin', dev_branch], single_flight=False)
+
+
+@dataclass(frozen=True)
+class Worktree:
+    path: Path
+    # None when HEAD is detached
+    branch: str | None
+
+
+async def list_worktrees() -> list[Worktree]:
+    """Lists the worktrees of the repository, the main worktree first."""
+    result = await shell.run(['git', 'worktree', 'list', '--porcelain'])
+    worktrees = []
+    # Records of `attribute value` lines, separated by empty lines
+    for record in result.stdout.split('\n\n'):
+        attributes = dict(line.partition(' ')[::2] for line in record.splitlines())
+        if 'worktree' not in attributes or 'bare' in attributes:
+            continue
+        branch = attributes.get('branch')
+        worktrees.append(
+            Worktree(
+                path=Path(attributes['worktree']),
+                branch=branch.removeprefix('refs/heads/') if branch else None,
+            )
+        )
+    return worktrees
 
-    if has_changes:
-        logger.debug('stashing existing changes before empty commit')
-        await shell.run(['git', 'stash', '--include-untracked'])
 
-    try:
-        await shell.run(
-            [
-                'git',
-                'commit',
-                '--allow-empty',
-                '--no-verify',
-                '-m',
-                PR_START_COMMIT_HEADLINE,
-                '-m',
-                'This commit serves no other purpose than to allow creation of a PR when executing `gh tt workon`. Because creating a PR without a commit is not possible. This commit should be squashed or removed before merging this PR.',
-            ]
-        )
-        await shell.run(['git', 'push', '-u', 'origin', dev_branch])
-    finally:
-        if has_changes:
-            logger.debug('restoring stashed changes')
-            await shell.run(['git', 'stash', 'pop'])
+async def add_worktree(path: Path, branch: str, *, remote: str | None = None):
+    """Checks out `branch` in a new worktree at `path`.
+
+    With `remote`, the branch is created from `<remote>/<branch>`, and tracks it.
+    """
+    logger.debug('adding worktree for branch %s at %s', branch, path)
+    if remote is None:
+        cmd = ['git', 'worktree', 'add', str(path), branch]
+    else:
+        cmd = ['git', 'worktree', 'add', '--track', '-b', branch, str(path), f'{remote}/{branch}']
+    await shell.run(cmd, single_flight=False)
@@ -0,0 +1,365 @@
+"""
+Reads HEAD and refs straight from the files in the git directory, without starting git.
+
+Handles loose refs, `packed-refs` (memory-mapped), symbolic refs and linked worktrees,
+whose HEAD lives in the worktree's own git directory while the refs are shared. Anything
+else, like the reftable ref storage, bare repositories, working in a git directory or a git
+directory set through the environment, is reported as unsupported by `reader()` returning
+None, and callers ask git instead.
+"""
+
+import logging
+import mmap
+import os
+import re
+from dataclasses import dataclass
+from pathlib import Path
+
+from gh_tt import cassette
+
+logger = logging.getLogger(__name__)
+
+# The symbolic ref depth git follows, see SYMREF_MAXDEPTH in git's refs.h
+MAX_SYMREF_DEPTH = 5
+
+# The order git tries to expand a short name in, see ref_rev_parse_rules in git's refs.c
+REV_PARSE_RULES = (
+    '{}',
+    'refs/{}',
+    'refs/tags/{}',
+    'refs/heads/{}',
+    'refs/remotes/{}',
+    'refs/remotes/{}/HEAD',
+)
+
+# Environment variables that move the git directory or its refs away from the usual places
+GIT_DIR_ENV_VARS = ('GIT_DIR', 'GIT_COMMON_DIR', 'GIT_WORK_TREE', 'GIT_CEILING_DIRECTORIES')
+
+OBJECT_NAME_PATTERN = re.compile(rb'[0-9a-f]{40}|[0-9a-f]{64}')
+REFTABLE_CONFIG_PATTERN = re.compile(
+    r'^\s*refstorage\s*=\s*reftable\s*$', re.IGNORECASE | re.MULTILINE
+)
+BARE_CONFIG_PATTERN = re.compile(r'^\s*bare\s*=\s*true\s*$', re.IGNORECASE | re.MULTILINE)
+REMOTE_CONFIG_PATTERN = re.compile(r'^\s*\[remote\s+"([^"]+)"\]', re.MULTILINE)
+INCLUDE_CONFIG_PATTERN = re.compile(r'^\s*\[include', re.IGNORECASE | re.MULTILINE)
+# Refs like FETCH_HEAD or ORIG_HEAD, which live next to HEAD and may hold more than a ref
+PSEUDOREF_PATTERN = re.compile(r'[A-Z_]+')
+SYMREF_PREFIX = 'ref: '
+
+
+class UnsupportedRepositoryError(Exception):
+    """Raised for repositories the reader does not understand. Ask git instead."""
+
+
+def _read_text(path: Path) -> str | None:
+    try:
+        return path.read_text()
+    except (FileNotFoundError, NotADirectoryError, IsADirectoryError):
+        return None
+
+
+@dataclass(frozen=True)
+class RefReader:
+    # The working tree, the git directory of the worktree and the directory the refs are in
+    root: Path
+    git_dir: Path
+    common_dir: Path
+
+    def _packed_refs(self, prefix: str) -> dict[str, str]:
+        path = self.common_dir / 'packed-refs'
+        try:
+            with path.open('rb') as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return {}
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    return self._parse_packed_refs(data, prefix.encode())
+        except FileNotFoundError:
+            return {}
+
+    @staticmethod
+    def _parse_packed_refs(data: mmap.mmap, prefix: bytes) -> dict[str, str]:
+        # git writes packed-refs sorted by name, and says so in the header
+        header = data.readline()
+        is_sorted = header.startswith(b'# pack-refs with:') and b' sorted' in header
+        if is_sorted:
+            data.seek(_seek_packed_refs(data, prefix))
+        else:
+            data.seek(0)
+
+        refs = {}
+        for line in iter(data.readline, b''):
+            # Comments hold the traits of the file, '^' lines the commit an annotated tag peels to
+            if line.startswith((b'#', b'^')):
+                continue
+            object_name, _, refname = line.rstrip(b'\n').partition(b' ')
+            if not OBJECT_NAME_PATTERN.fullmatch(object_name):
+                raise UnsupportedRepositoryError(f'unexpected line in packed-refs: {line!r}')
+            if refname.startswith(prefix):
+                refs[refname.decode()] = object_name.decode()
+            elif is_sorted and refname > prefix:
+                break
+        return refs
+
+    def _packed_ref(self, refname: str) -> str | None:
+        """Finds a single ref in packed-refs without parsing the rest of the file."""
+        path = self.common_dir / 'packed-refs'
+        try:
+            with path.open('rb') as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    return None
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                    object_name = self._find_packed_ref(data, refname.encode())
+        except FileNotFoundError:
+            return None
+
+        if object_name is None:
+            return None
+        if not OBJECT_NAME_PATTERN.fullmatch(object_name):
+            raise UnsupportedRepositoryError(f'unexpected entry in packed-refs for {refname}')
+        return object_name.decode()
+
+    @staticmethod
+    def _find_packed_ref(data: mmap.mmap, refname: bytes) -> bytes | None:
+        header = data.readline()
+        if header.startswith(b'# pack-refs with:') and b' sorted' in header:
+            data.seek(_seek_packed_refs(data, refname))
+            for line in iter(data.readline, b''):
+                if line.startswith((b'#', b'^')):
+                    continue
+                object_name, _, name = line.rstrip(b'\n').partition(b' ')
+                return object_name if name == refname else None
+            return None
+
+        # Ref names cannot contain spaces, so this only matches a whole name
+        end = data.find(b' ' + refname + b'\n')
+        if end == -1:
+            return None
+        start = data.rfind(b'\n', 0, end) + 1
+        return data[start:end]
+
+    def _ref_dir(self, refname: str) -> Path:
+        # HEAD and the other pseudo refs belong to the worktree, everything below refs/ is shared
+        return self.common_dir if refname.startswith('refs/') else self.git_dir
+
+    def read(self, refname: str) -> str | None:
+        """Returns the raw value of a ref: an object name or 'ref: <target>' for a symbolic ref."""
+        content = _read_text(self._ref_dir(refname) / refname)
+        if content is not None:
+            return content.strip()
+        if refname.startswith('refs/'):
+            return self._packed_ref(refname)
+        return None
+
+    def symbolic_target(self, refname: str) -> str | None:
+        """Returns what a symbolic ref points to, e.g. refs/heads/main for HEAD."""
+        value = self.read(refname)
+        if value is None or not value.startswith(SYMREF_PREFIX):
+            return None
+        return value.removeprefix(SYMREF_PREFIX)
+
+    def resolve_ref(self, refname: str) -> str | None:
+        """Returns the object name a full ref name points to, following symbolic refs."""
+        for _ in range(MAX_SYMREF_DEPTH):
+            value = self.read(refname)
+            if value is None:
+                return None
+            if not value.startswith(SYMREF_PREFIX):
+                if not OBJECT_NAME_PATTERN.fullmatch(value.encode()):
+                    raise UnsupportedRepositoryError(f'unexpected value of {refname}: {value}')
+                return value
+            refname = value.removeprefix(SYMREF_PREFIX)
+        raise UnsupportedRepositoryError(f'symbolic refs nested too deeply at {refname}')
+
+    def resolve(self, name: str) -> str | None:
+        """Resolves a ref name the way `git rev-parse` does, e.g. HEAD, main or origin/main.
+
+        Returns None if no ref matches. Raises UnsupportedRepositoryError for anything but
+        a plain ref name, like object names or revision expressions such as HEAD~1.
+        """
+        if not name or any(c in name for c in ' ~^:?*[\\') or '@{' in name or '..' in name:
+            raise UnsupportedRepositoryError(f'not a plain ref name: {name}')
+        if OBJECT_NAME_PATTERN.fullmatch(name.encode()):
+            raise UnsupportedRepositoryError(f'looks like an object name: {name}')
+        if name != 'HEAD' and PSEUDOREF_PATTERN.fullmatch(name):
+            raise UnsupportedRepositoryError(f'not reading pseudo refs: {name}')
+
+        for rule in REV_PARSE_RULES:
+            refname = rule.format(name)
+            if rule == '{}' and refname != 'HEAD' and not refname.startswith('refs/'):
+                continue
+            object_name = self.resolve_ref(refname)
+            if object_name is not None:
+                return object_name
+        return None
+
+    def exists(self, refname: str) -> bool:
+        return self.resolve_ref(refname) is not None
+
+    def short_name(self, refname: str) -> str:
+        """Shortens a full ref name the way `%(refname:short)` does, e.g. main for refs/heads/main.
+
+        Picks the shortest name that still resolves to the ref, so refs/heads/v1 is heads/v1
+        when there is a tag v1 as well.
+        """
+        # Neither the first rule nor the last one shortens, so origin/HEAD stays origin/HEAD
+        for i in reversed(range(1, len(REV_PARSE_RULES) - 1)):
+            prefix, _, suffix = REV_PARSE_RULES[i].partition('{}')
+            if not (refname.startswith(prefix) and refname.endswith(suffix)):
+                continue
+            short = refname[len(prefix) : len(refname) - len(suffix)]
+            if not short:
+                continue
+            # Rules tried before this one must not find another ref under the short name
+            if not any(
+                self.exists(rule.format(short))
+                for rule in REV_PARSE_RULES[1:i]
+                if rule.format(short) != refname
+            ):
+                return short
+        return refname
+
+    def list_refs(self, prefix: str) -> dict[str, str]:
+        """Returns the object names of the refs starting with `prefix`, sorted by name.
+
+        The prefix is a directory like refs/heads/, or the start of a name like refs/heads/7-.
+        Only the refs under it are read, however many other refs there are.
+        """
+        refs = self._packed_refs(prefix)
+
+        directory, _, name_prefix = prefix.rpartition('/')
+        try:
+            entries = list(os.scandir(self.common_dir / directory))
+        except (FileNotFoundError, NotADirectoryError):
+            entries = []
+
+        paths = []
+        for entry in entries:
+            if not entry.name.startswith(name_prefix):
+                continue
+            if entry.is_dir():
+                paths.extend(
+                    Path(root, file) for root, _, files in os.walk(entry.path) for file in files
+                )
+            else:
+                paths.append(Path(entry.path))
+
+        for path in paths:
+            if path.name.endswith('.lock'):
+                continue
+            refname = path.relative_to(self.common_dir).as_posix()
+            value = self.resolve_ref(refname)
+            if value is not None:
+                refs[refname] = value
+
+        return dict(sorted(refs.items()))
+
+    def current_branch(self) -> str | None:
+        """Returns the branch checked out, or None if HEAD is detached."""
+        target = self.symbolic_target('HEAD')
+        if target is None:
+            return None
+        return target.removeprefix('refs/heads/')
+
+    def remotes(self) -> list[str]:
+        """Returns the remotes configured in the repository config, in the order they are listed."""
+        config = _read_text(self.common_dir / 'config') or ''
+        if INCLUDE_CONFIG_PATTERN.search(config):
+            # Included files can configure remotes as well
+            raise UnsupportedRepositoryError('the repository config includes other files')
+        return list(dict.fromkeys(REMOTE_CONFIG_PATTERN.findall(config)))
+
+    def remote_ref_dirs(self) -> list[str]:
+        """Returns the remotes that have a directory of loose refs below refs/remotes/."""
+        try:
+            entries = os.scandir(self.common_dir / 'refs' / 'remotes')
+        except FileNotFoundError:
+            return []
+        with entries:
+            return sorted(entry.name for entry in entries if entry.is_dir())
+
+
+def _seek_packed_refs(data: mmap.mmap, prefix: bytes) -> int:
+    """Returns the offset of the first ref not sorted before `prefix` in a sorted packed-refs.
+
+    A binary search over the lines, so a lookup reads a few pages of the file, however big.
+    """
+    low, high = 0, len(data)
+    while low < high:
+        middle = (low + high) // 2
+        # The start of the line `middle` is in
+        start = data.rfind(b'\n', low, middle) + 1 or low
+
+        # Skips to a line with a ref name, past the header and the peeled lines
+        end = start
+        refname = None
+        while end < high:
+            line_end = data.find(b'\n', end)
+            line_end = len(data) if line_end == -1 else line_end + 1
+            line = data[end:line_end]
+            end = line_end
+            if not line.startswith((b'#', b'^')):
+                refname = line.rstrip(b'\n').partition(b' ')[2]
+                break
+
+        if refname is not None and refname < prefix:
+            low = end
+        else:
+            high = start
+    return low
+
+
+def _is_git_dir(path: Path) -> bool:
+    """Whether `path` looks like a git directory to git, see is_git_directory in setup.c."""
+    return (path / 'HEAD').is_file() and (path / 'objects').is_dir() and (path / 'refs').is_dir()
+
+
+def find(start: Path) -> RefReader:
+    """Finds the repository `start` is in. Raises UnsupportedRepositoryError if it cannot."""
+    if any(os.getenv(var) for var in GIT_DIR_ENV_VARS):
+        raise UnsupportedRepositoryError('the git directory is set through the environment')
+
+    for root in (start, *start.parents):
+        # In a git directory, e.g. of a bare repository or a submodule, the enclosing
+        # repository is not the one git would find
+        if _is_git_dir(root):
+            raise UnsupportedRepositoryError(f'{start} is in the git directory {root}')
+        dot_git = root / '.git'
+        if dot_git.is_dir():
+            git_dir = dot_git
+            break
+        if dot_git.is_file():
+            # A linked worktree or submodule, its .git file points to its git directory
+            content = dot_git.read_text().strip()
+            if not content.startswith('gitdir: '):
+                raise UnsupportedRepositoryError(f'unexpected content in {dot_git}')
+            git_dir = (root / content.removeprefix('gitdir: ')).resolve()
+            break
+    else:
+        raise UnsupportedRepositoryError(f'{start} is not in a git repository')
+
+    commondir = _read_text(git_dir / 'commondir')
+    common_dir = (git_dir / commondir.strip()).resolve() if commondir else git_dir
+
+    config = _read_text(common_dir / 'config') or ''
+    if (common_dir / 'reftable').exists() or REFTABLE_CONFIG_PATTERN.search(config):
+        raise UnsupportedRepositoryError('the repository stores its refs in a reftable')
+    if BARE_CONFIG_PATTERN.search(config):
+        raise UnsupportedRepositoryError('the repository is bare')
+
+    return RefReader(root=root, git_dir=git_dir, common_dir=common_dir)
+
+
+def reader() -> RefReader | None:
+    """Returns a reader for the repository of the working directory, or None to ask git.
+
+    Also None while a cassette is recorded or replayed, so the commands it would have saved
+    are in the cassette.
+    """
+    if cassette.player() is not None or cassette.is_recording():
+        return None
+
+    try:
+        return find(Path.cwd())
+    except UnsupportedRepositoryError as e:
+        logger.debug('reading refs with git: %s', e)
+        return None
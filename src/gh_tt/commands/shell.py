@@ -1,11 +1,142 @@
+"""
+Runs external processes.
+
+All processes are started through a `Scheduler`, which limits how many processes of each
+binary run at the same time. Callers can `asyncio.gather` as many commands as they like
+without forking dozens of `gh` processes, which would trip the secondary rate limits of
+the GitHub API. Queued commands start in order of their `Priority`, then first come first
+served.
+
+A command that is already running in the same directory is not started again: `run` waits
+for the running one and shares its result (single flight). Commands that change anything
+opt out with `single_flight=False`.
+"""
+
 import asyncio
+import contextlib
+import dataclasses
+import heapq
+import itertools
 import logging
-from collections.abc import Callable
-from dataclasses import dataclass
+import os
+import random
+import shlex
+import time
+from collections.abc import AsyncIterator, Awaitable, Callable, Hashable, Iterator, Mapping
+from dataclasses import dataclass, field
+from enum import IntEnum
 from pathlib import Path
 
+from gh_tt import cassette, trace
+
 logger = logging.getLogger(__name__)
 
+# Processes of a binary that may run at the same time
+CONCURRENCY_LIMITS = {'gh': 4, 'git': 8}
+DEFAULT_CONCURRENCY_LIMIT = 8
+
+
+class Priority(IntEnum):
+    """Queued commands with a lower value start first."""
+
+    # The user is waiting for the result
+    INTERACTIVE = 0
+    # Polling and other work that can wait for interactive commands
+    BACKGROUND = 1
+
+
+@dataclass
+class QueueStats:
+    runs: int = 0
+    queued: int = 0
+    queue_seconds: float = 0.0
+    max_queue_seconds: float = 0.0
+    max_running: int = 0
+
+
+@dataclass
+class _Lane:
+    limit: int
+    running: int = 0
+    waiters: list[tuple[Priority, int, asyncio.Future[None]]] = field(default_factory=list)
+
+    def release(self):
+        self.running -= 1
+        while self.waiters:
+            _, _, waiter = heapq.heappop(self.waiters)
+            if not waiter.done():
+                # Hand the slot over, so a newly arriving command cannot take it first
+                self.running += 1
+                waiter.set_result(None)
+                return
+
+
+class Scheduler:
+    def __init__(
+        self,
+        limits: dict[str, int] | None = None,
+        default_limit: int = DEFAULT_CONCURRENCY_LIMIT,
+    ):
+        self.limits = CONCURRENCY_LIMITS if limits is None else limits
+        self.default_limit = default_limit
+        self.stats: dict[str, QueueStats] = {}
+        self._lanes: dict[str, _Lane] = {}
+        self._order = itertools.count()
+
+    def _lane(self, binary: str) -> _Lane:
+        if binary not in self._lanes:
+            self._lanes[binary] = _Lane(limit=self.limits.get(binary, self.default_limit))
+        return self._lanes[binary]
+
+    @contextlib.asynccontextmanager
+    async def slot(
+        self, binary: str, priority: Priority = Priority.INTERACTIVE
+    ) -> AsyncIterator[float]:
+        """Waits until a process of `binary` may start, and holds the slot while it runs.
+
+        Yields how many seconds the process waited for the slot.
+        """
+        lane = self._lane(binary)
+        stats = self.stats.setdefault(binary, QueueStats())
+        queued_at = time.perf_counter()
+
+        if lane.running < lane.limit and not lane.waiters:
+            lane.running += 1
+        else:
+            waiter = asyncio.get_running_loop().create_future()
+            heapq.heappush(lane.waiters, (priority, next(self._order), waiter))
+            try:
+                await waiter
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    # The slot was handed over just before the cancellation
+                    lane.release()
+                raise
+            stats.queued += 1
+
+        queue_seconds = time.perf_counter() - queued_at
+        stats.runs += 1
+        stats.queue_seconds += queue_seconds
+        stats.max_queue_seconds = max(stats.max_queue_seconds, queue_seconds)
+        stats.max_running = max(stats.max_running, lane.running)
+        if queue_seconds > 0.001:
+            logger.debug('waited %.0f ms for a %s slot', queue_seconds * 1000, binary)
+
+        try:
+            yield queue_seconds
+        finally:
+            lane.release()
+
+    def summary(self) -> str:
+        return ', '.join(
+            f'{binary}: {s.runs} runs, {s.queued} queued for {s.queue_seconds * 1000:.0f} ms '
+            f'(max {s.max_queue_seconds * 1000:.0f} ms), {s.max_running} at most at once'
+            for binary, s in sorted(self.stats.items())
+        )
+
+
+scheduler = Scheduler()
+
 
 @dataclass
 class ShellError(Exception):
@@ -23,28 +154,289 @@ class ShellResult:
     stdout: str
     stderr: str
     return_code: int | None
+    # How many times poll_until ran the command to get this result
+    attempts: int = 1
+
+
+@dataclass(frozen=True)
+class Backoff:
+    """The delays between the attempts of `poll_until`.
+
+    The first `fast_probes` delays are `fast_interval`, for results that are usually ready
+    almost immediately. After that, the delays start at `initial` and grow by `factor` up
+    to `cap`. With `jitter`, every delay after the fast probes is drawn uniformly between
+    zero and that value (full jitter), so concurrent pollers do not retry in lockstep.
 
+    The defaults poll at a fixed interval.
+    """
+
+    initial: float = 3
+    factor: float = 1
+    cap: float = 30
+    fast_probes: int = 0
+    fast_interval: float = 0.25
+    jitter: bool = False
+
+    def delays(self) -> Iterator[float]:
+        for _ in range(self.fast_probes):
+            yield self.fast_interval
 
-async def run(cmd: list[str], *, cwd: Path | None = None, die_on_error: bool = True) -> ShellResult:
+        delay = self.initial
+        while True:
+            # Not used for anything security related
+            yield random.uniform(0, delay) if self.jitter else delay  # noqa: S311
+            delay = min(self.cap, delay * self.factor)
+
+
+async def run(
+    cmd: list[str],
+    *,
+    cwd: Path | None = None,
+    die_on_error: bool = True,
+    priority: Priority = Priority.INTERACTIVE,
+    single_flight: bool = True,
+    env: Mapping[str, str] | None = None,
+) -> ShellResult:
+    """Runs the command and returns its output.
+
+    With `single_flight`, a call made while the same command runs in the same directory
+    waits for that run and shares its result, see `coalesce`. Commands that change
+    anything must pass `single_flight=False`, so each call runs it.
+
+    `env` holds environment variables to set for the command, on top of those of gh-tt.
+    """
     logger.debug('running command: %s', cmd)
-    process = await asyncio.create_subprocess_exec(
-        *cmd,
-        stdout=asyncio.subprocess.PIPE,
-        stderr=asyncio.subprocess.PIPE,
+    with trace.span(trace.command_name(cmd), 'shell', argv=cmd, cwd=str(cwd or '.')) as span:
+        completed = await communicate(
+            cmd, cwd=cwd, priority=priority, single_flight=single_flight, env=env
+        )
+
+        span.update(
+            exit_code=completed.return_code,
+            stdout_bytes=len(completed.stdout),
+            queue_ms=round(completed.queue_seconds * 1000, 3),
+            shared=completed.shared,
+        )
+
+    stdout = completed.stdout.rstrip()
+    stderr = completed.stderr.rstrip()
+    return_code = completed.return_code
+
+    logger.debug('command returned %d: %s', return_code, cmd)
+
+    if die_on_error and return_code != 0:
+        logger.debug('command failed, raising ShellError')
+        raise ShellError(cmd=cmd, stdout=stdout, stderr=stderr, return_code=return_code)
+
+    return ShellResult(stdout=stdout, stderr=stderr, return_code=return_code)
+
+
+@dataclass(frozen=True)
+class Completed:
+    stdout: str
+    stderr: str
+    return_code: int | None
+    queue_seconds: float
+    # Whether the result came from a run another caller started
+    shared: bool = False
+
+
+@dataclass
+class _Flight:
+    task: asyncio.Task
+    waiters: int = 0
+
+
+_flights: dict[Hashable, _Flight] = {}
+
+
+async def coalesce[T](key: Hashable, start: Callable[[], Awaitable[T]]) -> tuple[T, bool]:
+    """Awaits `start()`, or the call already in flight for `key`.
+
+    Returns the result and whether it was shared with an earlier caller. The call is only
+    cancelled when every caller waiting for it is.
+    """
+    flight = _flights.get(key)
+    shared = flight is not None and not flight.task.done()
+    if not shared:
+        flight = _flights[key] = _Flight(asyncio.ensure_future(start()))
+        flight.task.add_done_callback(
+            lambda _: _flights.pop(key) if _flights.get(key) is flight else None
+        )
+    assert flight is not None
+
+    flight.waiters += 1
+    try:
+        return await asyncio.shield(flight.task), shared
+    finally:
+        flight.waiters -= 1
+        if flight.waiters == 0 and not flight.task.done():
+            flight.task.cancel()
+
+
+def _command_key(
+    cmd: list[str] | str, cwd: Path | None, env: Mapping[str, str] | None = None
+) -> tuple:
+    # A command run through the shell is the same command as its words
+    words = shlex.split(cmd) if isinstance(cmd, str) else cmd
+    return ('run', *words, str(Path(cwd or Path.cwd()).resolve()), *sorted((env or {}).items()))
+
+
+async def communicate(
+    cmd: list[str] | str,
+    *,
+    cwd: Path | None = None,
+    priority: Priority = Priority.INTERACTIVE,
+    single_flight: bool = True,
+    env: Mapping[str, str] | None = None,
+) -> Completed:
+    """Waits for a scheduler slot and runs the command to completion, see `execute`."""
+
+    async def start() -> Completed:
+        binary = Path(shlex.split(cmd)[0] if isinstance(cmd, str) else cmd[0]).name
+        async with scheduler.slot(binary, priority) as queue_seconds:
+            stdout, stderr, return_code = await execute(cmd, cwd=cwd, env=env)
+        return Completed(stdout, stderr, return_code, queue_seconds)
+
+    if not single_flight:
+        return await start()
+
+    completed, shared = await coalesce(_command_key(cmd, cwd, env), start)
+    if shared:
+        logger.debug('shared the result of a running command: %s', cmd)
+        return dataclasses.replace(completed, shared=True)
+    return completed
+
+
+async def execute(
+    cmd: list[str] | str, *, cwd: Path | None = None, env: Mapping[str, str] | None = None
+) -> tuple[str, str, int | None]:
+    """Runs the command to completion, or replays it when a cassette is replayed.
+
+    A string is run through the shell. Returns the decoded stdout, stderr and exit code.
+    Callers hold a scheduler slot for the command.
+    """
+    if (player := cassette.player()) is not None:
+        entry = await player.play(cmd)
+        return entry.stdout, entry.stderr, entry.exit_code
+
+    started = time.perf_counter()
+    process_env = None if env is None else {**os.environ, **env}
+    if isinstance(cmd, str):
+        process = await asyncio.create_subprocess_shell(
+            cmd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=cwd,
+            env=process_env,
+        )
+    else:
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            cwd=cwd,
+            env=process_env,
+        )
+    stdout, stderr = await process.communicate()
+
+    cassette.record(
+        cmd,
         cwd=cwd,
+        stdout=stdout.decode(),
+        stderr=stderr.decode(),
+        exit_code=process.returncode,
+        seconds=time.perf_counter() - started,
     )
+    return stdout.decode(), stderr.decode(), process.returncode
 
-    stdout, stderr = await process.communicate()
-    stdout = stdout.decode().rstrip()
-    stderr = stderr.decode().rstrip()
 
-    logger.debug('command returned %d: %s', process.returncode, cmd)
+async def stream_lines(
+    cmd: list[str],
+    *,
+    cwd: Path | None = None,
+    die_on_error: bool = True,
+    priority: Priority = Priority.INTERACTIVE,
+) -> AsyncIterator[str]:
+    """Runs the command and yields the lines of its stdout as they are read.
+
+    Unlike `run`, the output is never held in memory as a whole, and the caller can stop
+    reading early, which kills the process. Wrap the iterator in `contextlib.aclosing`, so
+    that happens right away rather than when the iterator is garbage collected.
+
+    The process holds its scheduler slot until the iteration ends. If the command fails and
+    `die_on_error` is set, ShellError is raised after the last line.
+    """
+    if cassette.player() is not None:
+        # The recording is in memory anyway, and failures raise before the first line
+        result = await run(cmd, cwd=cwd, die_on_error=die_on_error, priority=priority)
+        for line in result.stdout.splitlines():
+            yield line
+        return
+
+    logger.debug('streaming command: %s', cmd)
+    stopped_early = False
+    # Only kept for the cassette
+    recorded: list[str] | None = [] if cassette.is_recording() else None
+    with trace.span(trace.command_name(cmd), 'shell', argv=cmd, cwd=str(cwd or '.')) as span:
+        async with scheduler.slot(Path(cmd[0]).name, priority) as queue_seconds:
+            process = await asyncio.create_subprocess_exec(
+                *cmd,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.PIPE,
+                cwd=cwd,
+            )
+            assert process.stdout is not None
+            assert process.stderr is not None
+            # Read alongside stdout, because a full stderr pipe would block the process
+            stderr_task = asyncio.create_task(process.stderr.read())
+
+            started = time.perf_counter()
+            lines = 0
+            stdout_bytes = 0
+            try:
+                async for line in process.stdout:
+                    lines += 1
+                    stdout_bytes += len(line)
+                    if recorded is not None:
+                        recorded.append(line.decode())
+                    yield line.decode().rstrip('\n')
+            except GeneratorExit:
+                stopped_early = True
+            finally:
+                if not process.stdout.at_eof():
+                    with contextlib.suppress(ProcessLookupError):
+                        process.kill()
+                await process.wait()
+                stderr = (await stderr_task).decode().rstrip()
+                if recorded is not None:
+                    cassette.record(
+                        cmd,
+                        cwd=cwd,
+                        stdout=''.join(recorded),
+                        stderr=stderr,
+                        exit_code=process.returncode,
+                        seconds=time.perf_counter() - started,
+                    )
+
+        span.update(
+            exit_code=process.returncode,
+            stdout_bytes=stdout_bytes,
+            lines=lines,
+            stopped_early=stopped_early,
+            queue_ms=round(queue_seconds * 1000, 3),
+        )
+
+    if stopped_early:
+        logger.debug('stopped reading after %d lines: %s', lines, cmd)
+        return
+
+    logger.debug('command returned %d after %d lines: %s', process.returncode, lines, cmd)
 
     if die_on_error and process.returncode != 0:
         logger.debug('command failed, raising ShellError')
-        raise ShellError(cmd=cmd, stdout=stdout, stderr=stderr, return_code=process.returncode)
-
-    return ShellResult(stdout=stdout, stderr=stderr, return_code=process.returncode)
+        # The lines have been handed to the caller already
+        raise ShellError(cmd=cmd, stdout='', stderr=stderr, return_code=process.returncode)
 
 
 async def poll_until(
@@ -53,6 +445,8 @@ async def poll_until(
     cwd: Path | None = None,
     timeout_seconds: int = 30,
     interval: int = 3,
+    priority: Priority = Priority.INTERACTIVE,
+    backoff: Backoff | None = None,
 ) -> ShellResult | None:
     """Reruns the command until the predicate is true. Be careful when using with effectful functions.
 
@@ -66,33 +460,54 @@ async def poll_until(
             reached, the `cmd` is called again.
         timeout_seconds: How long to keep retrying.
         interval: Amout of time between retries. Uses asyncio.sleep(), so may not be
-            exact.
+            exact. Ignored when `backoff` is given.
+        priority: The scheduling priority of the reruns.
+        backoff: The delays between retries, see `Backoff`.
 
     Returns:
-        A `ShellResult` if the predicate evaluates to True before the timeout.
+        A `ShellResult` if the predicate evaluates to True before the timeout, with
+        `attempts` set to the number of times the command ran.
         Returns `None` if the timeout is reached.
     """
+    if backoff is None:
+        backoff = Backoff(initial=interval)
 
     logger.debug(
-        'poll_until: starting with timeout=%ss, interval=%ss, cmd=%s',
+        'poll_until: starting with timeout=%ss, backoff=%s, cmd=%s',
         timeout_seconds,
-        interval,
+        backoff,
         cmd,
     )
-    try:
-        async with asyncio.timeout(timeout_seconds):
-            while True:
-                try:
-                    result = await run(cmd, cwd=cwd)
-                except ShellError:
-                    logger.debug('poll_until: command failed, retrying in %ds', interval)
-                    await asyncio.sleep(interval)
-                    continue
-                if predicate(result):
-                    logger.debug('poll_until: predicate satisfied')
-                    return result
-                logger.debug('poll_until: predicate not satisfied, retrying in %ds', interval)
-                await asyncio.sleep(interval)
-    except TimeoutError:
-        logger.debug('poll_until: timed out after %ds', timeout_seconds)
-        return None
+    delays = backoff.delays()
+    attempt = 0
+    with trace.span(f'poll_until {trace.command_name(cmd)}', 'poll', argv=cmd) as poll_span:
+        try:
+            async with asyncio.timeout(timeout_seconds):
+                while True:
+                    attempt += 1
+                    poll_span['attempts'] = attempt
+                    with trace.span(f'attempt {attempt}', 'poll') as attempt_span:
+                        try:
+                            result = await run(cmd, cwd=cwd, priority=priority)
+                        except ShellError:
+                            result = None
+                        satisfied = result is not None and predicate(result)
+                        attempt_span['satisfied'] = satisfied
+
+                    if satisfied:
+                        logger.debug('poll_until: predicate satisfied after %d attempts', attempt)
+                        return dataclasses.replace(result, attempts=attempt)
+
+                    delay = next(delays)
+                    logger.debug(
+                        'poll_until: %s, retrying in %.2fs',
+                        'command failed' if result is None else 'predicate not satisfied',
+                        delay,
+                    )
+                    await asyncio.sleep(delay)
+        except TimeoutError:
+            logger.debug(
+                'poll_until: timed out after %ds and %d attempts', timeout_seconds, attempt
+            )
+            poll_span['timed_out'] = True
+            return None
@@ -32,6 +32,9 @@ class ProjectConfig(ConfigModel):
 
 class WorkonConfig(ConfigModel):
     status: str = 'In Progress'
+    # Where `workon --worktree` adds the worktrees, relative to the main worktree. By
+    # default next to it, in `<main worktree>-worktrees`
+    worktree_dir: str | None = None
 
 
 class DeliverPolicies(ConfigModel):
@@ -42,6 +45,11 @@ class DeliverConfig(ConfigModel):
     policies: DeliverPolicies = DeliverPolicies()
 
 
+class FetchConfig(ConfigModel):
+    # Skips fetching the refs gh-tt fetched less than this many seconds ago, 0 always fetches
+    freshness_seconds: int = Field(ge=0, default=0)
+
+
 SEMVER_PATTERN = re.compile(r'^\d+\.\d+\.\d+$')
 
 
@@ -56,6 +64,7 @@ class TtConfig(ConfigModel):
     workon: WorkonConfig = WorkonConfig()
     deliver: DeliverConfig = DeliverConfig()
     semver: SemverConfig = SemverConfig()
+    fetch: FetchConfig = FetchConfig()
 
 
 def _load_user_config(config_path: Path) -> dict:
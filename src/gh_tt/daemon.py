@@ -0,0 +1,393 @@
+"""
+Keeps a warm gh-tt interpreter per user, so commands skip uv, interpreter startup and imports.
+
+The daemon is opt-in: `gh tt daemon start`. It listens on a Unix socket that only the user
+can access, in a directory the user owns. When the socket exists, the `gh-tt` launcher forwards invocations to it with
+`daemon_client.py` and falls back to running gh-tt itself when the daemon does not answer.
+
+Commands run one at a time on a single event loop, each with the client's working
+directory, environment and stdio. A command that arrives while another one runs is
+answered with `EX_TEMPFAIL`, so the launcher runs it without the daemon rather than
+waiting. Repository metadata (repo, default branch, remote,
+project and project field IDs) stays cached while consecutive commands run in the same
+repository, for up to `REPO_CACHE_TTL_SECONDS`. Everything else is looked up per command.
+"""
+
+import asyncio
+import contextlib
+import json
+import logging
+import os
+import socket
+import stat
+import subprocess
+import sys
+import time
+import traceback
+from pathlib import Path
+
+from gh_tt import cassette, daemon_client, preflight, trace
+
+logger = logging.getLogger(__name__)
+
+IDLE_TIMEOUT_SECONDS = 60 * 60
+REPO_CACHE_TTL_SECONDS = 5 * 60
+START_TIMEOUT_SECONDS = 10
+# Clients send their request right after connecting
+REQUEST_TIMEOUT_SECONDS = 5
+
+LOG_FILE_NAME = 'daemon.log'
+
+# Imported when the daemon starts, so commands do not pay for it
+WARM_MODULES = (
+    'gh_tt.configuration',
+    'gh_tt.commands.gh',
+    'gh_tt.deliver',
+    'gh_tt.legacy.semver',
+    'gh_tt.workon',
+    'rich.console',
+    'rich.live',
+)
+
+
+class DaemonError(Exception):
+    pass
+
+
+def _exit_code(code: object) -> int:
+    """Maps a `SystemExit.code` to a process exit code, like the interpreter does."""
+    match code:
+        case None:
+            return 0
+        case int():
+            return code
+        case _:
+            print(code, file=sys.stderr)
+            return 1
+
+
+def _receive_request(conn: socket.socket) -> tuple[dict, list[int]]:
+    """Reads a request and the file descriptors sent with it. Blocks, so run it in a thread."""
+    header, fds, _, _ = socket.recv_fds(conn, daemon_client.HEADER.size, 3)
+    while len(header) < daemon_client.HEADER.size:
+        chunk = conn.recv(daemon_client.HEADER.size - len(header))
+        if not chunk:
+            raise ConnectionError('Client disconnected while sending the request')
+        header += chunk
+
+    (length,) = daemon_client.HEADER.unpack(header)
+    payload = b''
+    while len(payload) < length:
+        chunk = conn.recv(length - len(payload))
+        if not chunk:
+            raise ConnectionError('Client disconnected while sending the request')
+        payload += chunk
+
+    return json.loads(payload), fds
+
+
+class Daemon:
+    def __init__(self, path: Path, idle_timeout: float = IDLE_TIMEOUT_SECONDS):
+        self.path = path
+        self.idle_timeout = idle_timeout
+        self.started_at = time.time()
+        self.requests_served = 0
+        self._repo: Path | None = None
+        self._repo_cached_at = 0.0
+        # Commands change the working directory, environment and stdio of the process
+        self._running_command = False
+        self._stopping = asyncio.Event()
+
+    def _bind(self) -> socket.socket:
+        directory = self.path.parent
+        directory.mkdir(mode=0o700, parents=True, exist_ok=True)
+        # Another user may have created the directory first, to receive the commands
+        info = directory.lstat()
+        if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid():
+            raise DaemonError(f'{directory} is not a directory you own')
+        directory.chmod(0o700)
+
+        if self.path.exists():
+            try:
+                daemon_client.connect(self.path).close()
+            except OSError:
+                logger.info('removing stale socket %s', self.path)
+                self.path.unlink()
+            else:
+                raise DaemonError(f'A gh-tt daemon is already listening on {self.path}')
+
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(str(self.path))
+        self.path.chmod(0o600)
+        server.listen()
+        server.setblocking(False)  # noqa: FBT003
+        return server
+
+    async def serve(self):
+        """Serves requests until stopped or idle for `idle_timeout` seconds."""
+        loop = asyncio.get_running_loop()
+        server = self._bind()
+        logger.info('listening on %s (pid %d)', self.path, os.getpid())
+        connections: set[asyncio.Task] = set()
+
+        try:
+            while True:
+                accept = asyncio.ensure_future(loop.sock_accept(server))
+                stopping = asyncio.ensure_future(self._stopping.wait())
+                done, _ = await asyncio.wait(
+                    {accept, stopping},
+                    timeout=self.idle_timeout,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                stopping.cancel()
+                if accept not in done:
+                    accept.cancel()
+                    if self._stopping.is_set():
+                        logger.info('stopping on request')
+                        return
+                    if self._running_command:
+                        continue
+                    logger.info('idle for %ss, stopping', self.idle_timeout)
+                    return
+
+                conn, _ = accept.result()
+                # Served alongside the running command, to turn new commands away
+                task = asyncio.create_task(self._serve_connection(conn))
+                connections.add(task)
+                task.add_done_callback(connections.discard)
+        finally:
+            server.close()
+            self.path.unlink(missing_ok=True)
+            for task in connections:
+                task.cancel()
+            await asyncio.gather(*connections, return_exceptions=True)
+
+    async def _serve_connection(self, conn: socket.socket):
+        with conn:
+            if not await self._handle(conn):
+                self._stopping.set()
+
+    async def _handle(self, conn: socket.socket) -> bool:
+        """Handles one connection. Returns False when the daemon should stop."""
+        loop = asyncio.get_running_loop()
+        # sock_accept returns non-blocking sockets, read the request with a blocking one, but
+        # not for longer than a client takes to send it
+        conn.settimeout(REQUEST_TIMEOUT_SECONDS)
+        try:
+            request, fds = await asyncio.to_thread(_receive_request, conn)
+        except (OSError, ValueError) as e:
+            logger.warning('dropping malformed request: %s', e)
+            return True
+        conn.setblocking(False)  # noqa: FBT003
+
+        match request:
+            case {'control': 'stop'}:
+                response = {'stopped': True}
+            case {'control': 'status'}:
+                response = {
+                    'pid': os.getpid(),
+                    'uptime_seconds': round(time.time() - self.started_at),
+                    'requests_served': self.requests_served,
+                }
+            case {'argv': list(argv)} if self._running_command:
+                logger.info('a command is running, turning away %s', argv)
+                for fd in fds:
+                    os.close(fd)
+                response = {'exit_code': daemon_client.EX_TEMPFAIL}
+            case {'argv': list(argv), 'cwd': str(cwd), 'env': dict(env)} if len(fds) == 3:
+                self._running_command = True
+                try:
+                    exit_code = await self._run_command(conn, argv, Path(cwd), env, fds)
+                finally:
+                    self._running_command = False
+                self.requests_served += 1
+                response = {'exit_code': exit_code}
+            case _:
+                logger.warning('dropping unknown request with keys %s', sorted(request))
+                for fd in fds:
+                    os.close(fd)
+                return True
+
+        with contextlib.suppress(OSError):
+            await loop.sock_sendall(conn, json.dumps(response).encode())
+
+        return request.get('control') != 'stop'
+
+    def _reset_caches(self, cwd: Path):
+        from gh_tt.commands import gh, git, git_refs
+        from gh_tt.legacy.gitter import Gitter
+
+        # Issues change between commands, even in the same repository
+        gh.get_issue.cache_clear()
+
+        try:
+            repo = git_refs.find(cwd).root
+        except git_refs.UnsupportedRepositoryError:
+            # Cannot be told apart from other repositories, so nothing is kept
+            repo = None
+        now = time.monotonic()
+        if (
+            repo is None
+            or repo != self._repo
+            or now - self._repo_cached_at > REPO_CACHE_TTL_SECONDS
+        ):
+            logger.info('resetting repository caches for %s', repo)
+            for cache in (
+                gh.get_repo,
+                gh.get_project,
+                gh.get_project_status_field,
+                git.get_remote,
+            ):
+                cache.cache_clear()
+            self._repo = repo
+            self._repo_cached_at = now
+
+        Gitter.workdir = cwd
+        Gitter.fetched = False
+
+    async def _run_command(
+        self, conn: socket.socket, argv: list[str], cwd: Path, env: dict, fds: list[int]
+    ) -> int:
+        loop = asyncio.get_running_loop()
+        stdin = os.fdopen(fds[0], encoding='utf-8')
+        stdout = os.fdopen(fds[1], 'w', encoding='utf-8', buffering=1)
+        stderr = os.fdopen(fds[2], 'w', encoding='utf-8', buffering=1)
+        saved_cwd, saved_env = Path.cwd(), dict(os.environ)
+        saved_stdio = sys.stdin, sys.stdout, sys.stderr
+
+        try:
+            os.chdir(cwd)
+            os.environ.clear()
+            os.environ.update(env)
+            sys.stdin, sys.stdout, sys.stderr = stdin, stdout, stderr
+            self._reset_caches(cwd)
+
+            command = asyncio.create_task(self._execute(argv))
+            # The client closes the connection when it is interrupted, e.g. by Ctrl+C
+            disconnected = asyncio.ensure_future(loop.sock_recv(conn, 1))
+            await asyncio.wait({command, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if not command.done():
+                logger.info('client disconnected, cancelling %s', argv)
+                command.cancel()
+                with contextlib.suppress(asyncio.CancelledError):
+                    await command
+                return 130
+            disconnected.cancel()
+            return command.result()
+        finally:
+            logging.getLogger().handlers.clear()
+            sys.stdin, sys.stdout, sys.stderr = saved_stdio
+            os.chdir(saved_cwd)
+            os.environ.clear()
+            os.environ.update(saved_env)
+            for stream in (stdin, stdout, stderr):
+                with contextlib.suppress(OSError):
+                    stream.close()
+
+    async def _execute(self, argv: list[str]) -> int:
+        from gh_tt.__main__ import run, setup_logging
+        from gh_tt.cli.tt_parser import tt_parse
+
+        try:
+            args = tt_parse(argv)
+            if args.command in {'daemon', 'self'}:
+                # The launcher runs these without the daemon when it gets this exit code
+                return daemon_client.EX_TEMPFAIL
+            # setup_logging only configures logging if no handler is set, and the handlers
+            # of the previous command write to that command's stderr
+            logging.getLogger().handlers.clear()
+            setup_logging(args.verbose)
+            command = ' '.join(['gh tt', *argv])
+            with (
+                trace.recording(args.trace, name=command),
+                cassette.recording(args.record, args.replay, args.replay_speed),
+                trace.span(command, 'step'),
+            ):
+                await run(args)
+        except SystemExit as e:
+            return _exit_code(e.code)
+        except Exception:
+            traceback.print_exc()
+            return 1
+
+        return 0
+
+
+def _control(request: dict) -> dict | None:
+    """Sends a control request to the daemon. Returns None if no daemon is running."""
+    try:
+        sock = daemon_client.connect(daemon_client.socket_path())
+    except OSError:
+        return None
+
+    with sock:
+        daemon_client.send_request(sock, request)
+        return daemon_client.read_response(sock)
+
+
+def status() -> dict | None:
+    return _control({'control': 'status'})
+
+
+def stop() -> bool:
+    """Stops the daemon. Returns False if no daemon was running."""
+    return _control({'control': 'stop'}) is not None
+
+
+async def serve(idle_timeout: float):
+    """Runs the daemon in the foreground, on the event loop of the current invocation."""
+    for module in WARM_MODULES:
+        __import__(module)
+
+    handler = logging.StreamHandler(sys.stderr)
+    handler.setFormatter(logging.Formatter('%(asctime)s %(levelname)s %(message)s'))
+    # The root logger is reconfigured by every command, so the daemon logs on its own
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+    await Daemon(daemon_client.socket_path(), idle_timeout=idle_timeout).serve()
+
+
+def _spawn(idle_timeout: float, log_path: Path) -> subprocess.Popen:
+    log_path.parent.mkdir(parents=True, exist_ok=True)
+    with log_path.open('a') as log:
+        return subprocess.Popen(
+            [
+                sys.executable,
+                '-m',
+                'gh_tt',
+                'daemon',
+                'start',
+                '--foreground',
+                '--idle-timeout',
+                str(idle_timeout),
+            ],
+            stdin=subprocess.DEVNULL,
+            stdout=log,
+            stderr=log,
+            cwd='/',
+            # Detach from the terminal, so the daemon outlives the shell that started it
+            start_new_session=True,
+        )
+
+
+async def start(idle_timeout: float) -> Path:
+    """Starts the daemon in the background and waits until it accepts connections."""
+    path = daemon_client.socket_path()
+    if status() is not None:
+        raise DaemonError(f'A gh-tt daemon is already listening on {path}')
+
+    log_path = preflight.cache_dir() / LOG_FILE_NAME
+    process = _spawn(idle_timeout, log_path)
+
+    try:
+        async with asyncio.timeout(START_TIMEOUT_SECONDS):
+            while status() is None:
+                if process.poll() is not None:
+                    raise DaemonError(f'The gh-tt daemon exited on startup, see {log_path}')
+                await asyncio.sleep(0.05)
+    except TimeoutError as e:
+        raise DaemonError(f'The gh-tt daemon did not start in time, see {log_path}') from e
+
+    return path
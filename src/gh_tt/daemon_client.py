@@ -0,0 +1,186 @@
+"""
+Thin client forwarding a `gh tt` invocation to a running `gh tt daemon`.
+
+The `gh-tt` launcher runs this file directly with `python3 -I -S`, so it must only use
+the standard library. It passes the daemon socket path followed by the gh tt arguments.
+
+The client sends its stdin, stdout and stderr file descriptors over the socket, followed
+by the arguments, working directory and the environment variables gh tt, git and gh use.
+The daemon runs the command with those descriptors and answers with the exit code, or
+with `EX_TEMPFAIL` without running it when it is busy with another command.
+
+Both go to the daemon only if the socket and its directory belong to the user alone and
+the process listening on it runs as the user, so another user cannot pose as the daemon
+by creating the directory first.
+"""
+
+import json
+import os
+import socket
+import stat
+import struct
+import sys
+from pathlib import Path
+
+# Exit code telling the launcher the daemon is unavailable, so it runs gh tt without it
+EX_TEMPFAIL = 75
+
+HEADER = struct.Struct('!I')
+
+# The environment variables sent to the daemon, by name and by prefix
+FORWARDED_ENV = frozenset(
+    {
+        'ALL_PROXY',
+        'BROWSER',
+        'CLICOLOR',
+        'CLICOLOR_FORCE',
+        'COLORTERM',
+        'COLUMNS',
+        'EDITOR',
+        'FORCE_COLOR',
+        'GNUPGHOME',
+        'GPG_TTY',
+        'HOME',
+        'HTTPS_PROXY',
+        'HTTP_PROXY',
+        'LANG',
+        'LANGUAGE',
+        'LINES',
+        'LOGNAME',
+        'NO_COLOR',
+        'NO_PROXY',
+        'PAGER',
+        'PATH',
+        'SHELL',
+        'SSL_CERT_DIR',
+        'SSL_CERT_FILE',
+        'TERM',
+        'TMPDIR',
+        'TZ',
+        'USER',
+        'VISUAL',
+        'all_proxy',
+        'http_proxy',
+        'https_proxy',
+        'no_proxy',
+    }
+)
+FORWARDED_ENV_PREFIXES = ('GH_', 'GITHUB_', 'GIT_', 'LC_', 'SSH_', 'XDG_')
+
+# struct ucred from SO_PEERCRED on Linux, and the start of struct xucred from
+# LOCAL_PEERCRED (option 1 at level SOL_LOCAL, 0) on macOS
+LINUX_PEERCRED = struct.Struct('iII')
+DARWIN_PEERCRED = struct.Struct('=II')
+DARWIN_XUCRED_SIZE = 76
+
+
+def socket_path() -> Path:
+    """Returns the per-user daemon socket path. Must match the path used in the gh-tt launcher."""
+    if runtime_dir := os.getenv('XDG_RUNTIME_DIR'):
+        return Path(runtime_dir) / 'gh-tt' / 'daemon.sock'
+    tmp_dir = os.getenv('TMPDIR') or '/tmp'  # noqa: S108
+    return Path(tmp_dir) / f'gh-tt-{os.getuid()}' / 'daemon.sock'
+
+
+def send_request(sock: socket.socket, request: dict, fds: list[int] | None = None):
+    payload = json.dumps(request).encode()
+    socket.send_fds(sock, [HEADER.pack(len(payload))], fds or [])
+    sock.sendall(payload)
+
+
+def read_response(sock: socket.socket) -> dict | None:
+    chunks = []
+    while chunk := sock.recv(4096):
+        chunks.append(chunk)
+    if not chunks:
+        return None
+    return json.loads(b''.join(chunks))
+
+
+def check_owner(path: Path):
+    """Raises PermissionError unless the socket and its directory belong to the user alone.
+
+    Uses lstat, so neither of them can be a symlink to a socket somewhere else.
+    """
+    directory = os.lstat(path.parent)
+    if (
+        not stat.S_ISDIR(directory.st_mode)
+        or directory.st_uid != os.getuid()
+        or stat.S_IMODE(directory.st_mode) != 0o700
+    ):
+        raise PermissionError(f'{path.parent} is not a directory only you can access')
+
+    info = os.lstat(path)
+    if not stat.S_ISSOCK(info.st_mode) or info.st_uid != os.getuid():
+        raise PermissionError(f'{path} is not a socket you own')
+
+
+def peer_uid(sock: socket.socket) -> int:
+    """Returns the user the process on the other end of a connected socket runs as."""
+    if hasattr(socket, 'SO_PEERCRED'):
+        creds = sock.getsockopt(socket.SOL_SOCKET, socket.SO_PEERCRED, LINUX_PEERCRED.size)
+        _pid, uid, _gid = LINUX_PEERCRED.unpack(creds)
+        return uid
+    if sys.platform == 'darwin':
+        creds = sock.getsockopt(0, 1, DARWIN_XUCRED_SIZE)
+        _version, uid = DARWIN_PEERCRED.unpack_from(creds)
+        return uid
+    raise PermissionError(f'cannot tell who listens on the socket on {sys.platform}')
+
+
+def connect(path: Path) -> socket.socket:
+    """Connects to the daemon. Raises PermissionError if it is not the user's own daemon."""
+    check_owner(path)
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(str(path))
+        if (uid := peer_uid(sock)) != os.getuid():
+            raise PermissionError(f'{path} is served by user {uid}')
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+def forwarded_env() -> dict[str, str]:
+    return {
+        name: value
+        for name, value in os.environ.items()
+        if name in FORWARDED_ENV or name.startswith(FORWARDED_ENV_PREFIXES)
+    }
+
+
+def forward(path: Path, argv: list[str]) -> int:
+    request = {'argv': argv, 'cwd': str(Path.cwd()), 'env': forwarded_env()}
+    try:
+        sock = connect(path)
+    except PermissionError as e:
+        print(f'gh-tt: not using the daemon: {e}', file=sys.stderr)
+        return EX_TEMPFAIL
+    except OSError:
+        return EX_TEMPFAIL
+
+    try:
+        send_request(sock, request, fds=[0, 1, 2])
+    except OSError:
+        sock.close()
+        return EX_TEMPFAIL
+
+    # The daemon has accepted the command from here on. Do not fall back, because the
+    # command may already have changed something.
+    with sock:
+        try:
+            response = read_response(sock)
+        except KeyboardInterrupt:
+            # Closing the connection makes the daemon cancel the command
+            return 130
+
+    if response is None:
+        print('gh-tt daemon closed the connection before the command finished', file=sys.stderr)
+        return 1
+
+    return response['exit_code']
+
+
+if __name__ == '__main__':
+    sys.exit(forward(Path(sys.argv[1]), sys.argv[2:]))
@@ -1,15 +1,20 @@
+from __future__ import annotations
+
 import asyncio
 import logging
 import sys
 from datetime import UTC, datetime
+from typing import TYPE_CHECKING
 
-from rich.console import Console
-from rich.live import Live
-from rich.text import Text
-
+from gh_tt import preflight
 from gh_tt.commands import gh, git
 from gh_tt.commands.shell import ShellError
 
+if TYPE_CHECKING:
+    from collections.abc import Awaitable
+
+    from rich.text import Text
+
 logger = logging.getLogger(__name__)
 
 
@@ -42,6 +47,8 @@ def _sort_checks(checks: list[gh.Check]) -> list[gh.Check]:
 
 
 def _render_status(checks: list[gh.Check]) -> Text:
+    from rich.text import Text
+
     now = datetime.now(tz=UTC).astimezone()
     timestamp = now.strftime('%H:%M:%S')
     terminal = [c for c in checks if c.bucket in gh.TERMINAL_BUCKETS]
@@ -53,6 +60,8 @@ def _render_status(checks: list[gh.Check]) -> Text:
 
 
 def _render_final(checks: list[gh.Check]) -> Text:
+    from rich.text import Text
+
     now = datetime.now(tz=UTC).astimezone()
     timestamp = now.strftime('%H:%M:%S')
     total = len(checks)
@@ -101,6 +110,11 @@ async def poll_checks(
     no_checks_retries: int = 5,
 ) -> bool:
     """Poll PR checks until all are terminal. Returns True if all passed."""
+    # rich is only needed when polling, so it is not imported with the module
+    from rich.console import Console
+    from rich.live import Live
+    from rich.text import Text
+
     logger.debug(
         'poll_checks: branch=%s, interval=%s, timeout=%s, no_checks_retries=%s',
         branch,
@@ -160,10 +174,28 @@ async def poll_checks(
             return True
 
 
-async def deliver(*, delete_branch: bool, poll: bool = False):
+async def _fetch_branch(branch: Awaitable[str], freshness_seconds: float) -> str:
+    """Fetches the branch as soon as its name is known, returns the name."""
+    name = await branch
+    # A detached HEAD has no branch to fetch
+    if name != 'HEAD':
+        await git.fetch(branches=[name], freshness_seconds=freshness_seconds)
+    return name
+
+
+async def deliver(
+    *,
+    delete_branch: bool,
+    poll: bool = False,
+    gate: preflight.Gate = preflight.OPEN,
+    fetch_freshness_seconds: float = 0,
+):
     logger.debug('deliver: delete_branch=%s, poll=%s', delete_branch, poll)
-    current_branch, _, remote, default_branch = await asyncio.gather(
-        git.get_current_branch_name(), git.fetch(), git.get_remote(), gh.get_default_branch()
+    # The current branch is fetched while the default branch may still be asked from GitHub
+    current_branch, remote, default_branch = await asyncio.gather(
+        _fetch_branch(git.get_current_branch_name(), fetch_freshness_seconds),
+        git.get_remote(),
+        _fetch_branch(gh.get_default_branch(), fetch_freshness_seconds),
     )
     logger.debug(
         'current branch: %s, remote: %s, default_branch: %s',
@@ -172,47 +204,43 @@ async def deliver(*, delete_branch: bool, poll: bool = False):
         default_branch,
     )
 
-    (
-        default_branch_tip_hash,
-        remote_dev_branch_tip_hash,
-        current_branch_tip_hash,
-        merge_base_hash,
-    ) = await asyncio.gather(
-        git.get_branch_tip_hash(remote=remote, branch=default_branch),
-        git.get_branch_tip_hash(remote=remote, branch=current_branch),
-        git.get_branch_tip_hash(branch='HEAD'),
-        git.get_merge_base(branch=current_branch, remote=remote, default_branch=default_branch),
-    )
-    logger.debug(
-        'default_branch_tip_hash=%s, remote_dev_branch_tip_hash=%s, current_branch_tip_hash=%s merge_base_hash=%s',
-        default_branch_tip_hash,
-        remote_dev_branch_tip_hash,
-        current_branch_tip_hash,
-        merge_base_hash,
-    )
+    if current_branch == 'HEAD':
+        raise DeliverError(
+            'HEAD is detached, not on a local branch. Switch to the branch to deliver.'
+        )
 
-    if default_branch_tip_hash != merge_base_hash:
+    status = await git.get_branch_status(remote, default_branch, current_branch)
+    logger.debug('branch status against %s: %s', remote, status)
+
+    # The default branch is an ancestor of the branch when the branch is not behind it
+    if status.default.behind > 0:
         logger.debug(
             'branch %s is not up to date with %s/%s', current_branch, remote, default_branch
         )
         raise DeliverError(
-            f'The {default_branch} branch has commits your branch does not. Run git rebase {remote}/{default_branch} to integrate commits from {default_branch}.'
+            f'The {default_branch} branch has commits your branch does not (your branch is {status.default.describe()} of {remote}/{default_branch}). Run git rebase {remote}/{default_branch} to integrate commits from {default_branch}.'
         )
 
-    if remote_dev_branch_tip_hash != current_branch_tip_hash:
+    if status.upstream is None or status.upstream.diverged:
         logger.debug(
             'branch %s is not up to date with its remote %s/%s',
             current_branch,
             remote,
             current_branch,
         )
+        compared = (
+            f'{remote}/{current_branch} does not exist'
+            if status.upstream is None
+            else f'your branch is {status.upstream.describe()} of {remote}/{current_branch}'
+        )
         raise DeliverError(
-            f'Branch {current_branch} is not up to date with its remote. You may have unpushed commits on your local branch. Align your local branch with its remote before delivering.'
+            f'Branch {current_branch} is not up to date with its remote ({compared}). You may have unpushed commits on your local branch. Align your local branch with its remote before delivering.'
         )
 
     logger.debug(
         'branch is up to date and commits are pushed, marking PR ready and fetching PR info'
     )
+    await gate.wait()
     pr, _ = await asyncio.gather(gh.get_pr(), gh.mark_pr_ready(dev_branch=current_branch))
     logger.debug('merging PR on branch %s', current_branch)
     await gh.merge_pr(
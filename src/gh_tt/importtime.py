@@ -0,0 +1,81 @@
+"""
+Reports how long imports take, in the format of `python -X importtime`.
+
+`-X importtime` has to be passed to the interpreter, which the gh extension launcher
+does not allow for. Instead, `ImportTimer` hooks the function the import system calls
+for modules that are not yet in `sys.modules`, which is also where `-X importtime`
+takes its measurements. Modules imported before the timer is installed are not listed.
+That function is private to CPython, so on an interpreter without it nothing is measured
+and `PYTHONPROFILEIMPORTTIME=1` gives the report instead.
+"""
+
+import importlib._bootstrap as bootstrap
+import sys
+import time
+from collections.abc import Callable
+from dataclasses import dataclass, field
+
+
+@dataclass
+class ImportRecord:
+    name: str
+    depth: int
+    self_ns: int = 0
+    cumulative_ns: int = 0
+
+
+@dataclass
+class ImportTimer:
+    records: list[ImportRecord] = field(default_factory=list)
+    modules_before: int = 0
+    _stack: list[ImportRecord] = field(default_factory=list)
+    _original: Callable | None = None
+
+    def install(self) -> bool:
+        """Starts measuring. Returns False if the import system has no function to hook."""
+        assert self._original is None, 'ImportTimer is already installed'
+        original = getattr(bootstrap, '_find_and_load', None)
+        if original is None:
+            return False
+
+        self.modules_before = len(sys.modules)
+        self._original = original
+        bootstrap._find_and_load = self._find_and_load
+        return True
+
+    def uninstall(self):
+        if self._original is not None:
+            bootstrap._find_and_load = self._original
+            self._original = None
+
+    def _find_and_load(self, name, import_):
+        assert self._original is not None
+
+        record = ImportRecord(name=name, depth=len(self._stack))
+        self._stack.append(record)
+        start = time.perf_counter_ns()
+        try:
+            return self._original(name, import_)
+        finally:
+            record.cumulative_ns = time.perf_counter_ns() - start
+            # Nested imports already subtracted their cumulative time from self_ns
+            record.self_ns += record.cumulative_ns
+            self._stack.pop()
+            if self._stack:
+                self._stack[-1].self_ns -= record.cumulative_ns
+            self.records.append(record)
+
+    def report(self) -> str:
+        """Returns the report, with nested imports listed before the module importing them."""
+        lines = ['import time: self [us] | cumulative | imported package']
+        lines.extend(
+            f'import time: {r.self_ns // 1000:>9} | {r.cumulative_ns // 1000:>10} | '
+            f'{"  " * r.depth}{r.name}'
+            for r in self.records
+        )
+        total_ns = sum(r.cumulative_ns for r in self.records if r.depth == 0)
+        lines.append(
+            f'import time: {len(self.records)} modules imported in {total_ns / 1e6:.1f} ms '
+            f'({self.modules_before} modules were loaded before measuring started)'
+        )
+        return '\n'.join(lines)
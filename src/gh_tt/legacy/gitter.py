@@ -3,6 +3,8 @@ import shutil
 from pathlib import Path
 from typing import ClassVar
 
+from gh_tt import trace
+from gh_tt.commands import git, shell
 from gh_tt.legacy.lazyload import Lazyload
 
 
@@ -38,25 +40,24 @@ class Gitter(Lazyload):
         self.set('cache', self.use_cache)
 
     async def run(self):            
-        process = await asyncio.create_subprocess_shell(
-            cmd=self.get('cmd'),
-            stdout=asyncio.subprocess.PIPE,
-            stderr=asyncio.subprocess.PIPE,
-            cwd=self.get('workdir')
-        )
+        words = self.get('cmd').split()
+        with trace.span(trace.command_name(words), 'gitter', cmd=self.get('cmd')) as span:
+            # Shares the process limits of shell.run, and the run of the same command in flight
+            completed = await shell.communicate(self.get('cmd'), cwd=self.get('workdir'))
+            stdout, stderr, returncode = completed.stdout, completed.stderr, completed.return_code
 
-        stdout, stderr = await process.communicate()
+            span.update(exit_code=returncode, stdout_bytes=len(stdout), shared=completed.shared)
 
-        stdout = stdout.decode().rstrip()
-        stderr = stderr.decode().rstrip()
+        stdout = stdout.rstrip()
+        stderr = stderr.rstrip()
 
-        if self.get('die_on_error') and process.returncode != 0:
+        if self.get('die_on_error') and returncode != 0:
             raise RuntimeError(f"{stderr}")
         
         result = {
             'stdout': stdout,
             'stderr': stderr,
-            'returncode': process.returncode
+            'returncode': returncode
         }
 
         return stdout, result
@@ -75,9 +76,11 @@ class Gitter(Lazyload):
             if prune:
                 msg += " and prune local branches and tags)"
 
-            [_, _] = await Gitter(
-                cmd=f"git fetch --tags --all -f {prune_switch}",
-                msg=f"{msg}").run()
+            # Waits for, and reuses, a fetch of other gh-tt processes in the same clone
+            await git.fetch_exclusively(
+                git.ALL_REMOTES,
+                git.ALL_REFSPECS,
+                Gitter(cmd=f"git fetch --tags --all -f {prune_switch}", msg=f"{msg}").run)
 
             cls.fetched = True
 
@@ -37,19 +37,25 @@ class Lazyload:
     _manifest: ClassVar[dict] = {}  # Class-level variable to store loaded properties
     _manifest_loaded = False
 
-    for allowed_option in [
-        Path(__file__).resolve().parent / "props.json",
-        Path(__file__).resolve().parent / "props.jsonc"
-    ]:
-        [loaded, manifest] = load_jsonc(allowed_option)
-        if loaded:
-            _manifest = manifest
-            _manifest_loaded = True
-            break
-    
+    @classmethod
+    def _read_manifest(cls):
+        """Parse the manifest file on first use rather than when the module is imported"""
+        if Lazyload._manifest_loaded:
+            return
+
+        for allowed_option in [
+            Path(__file__).resolve().parent / "props.json",
+            Path(__file__).resolve().parent / "props.jsonc"
+        ]:
+            [loaded, manifest] = load_jsonc(allowed_option)
+            if loaded:
+                Lazyload._manifest = manifest
+                Lazyload._manifest_loaded = True
+                break
 
 
     def __init__(self):
+        self._read_manifest()
         self.props = {}
         self.set('_loaded', [])  # List of properties that have been loaded
 
@@ -1,14 +1,15 @@
 from __future__ import annotations
 
 import asyncio
+import contextlib
 import logging
 import re
 import sys
 from dataclasses import dataclass
 from enum import Enum, StrEnum, auto
 
-from gh_tt import configuration
-from gh_tt.commands import gh, git, shell
+from gh_tt import configuration, preflight
+from gh_tt.commands import git, shell
 from gh_tt.legacy.lazyload import Lazyload
 
 logger = logging.getLogger(__name__)
@@ -215,24 +216,18 @@ class SemverVersion:
         # We no longer support configurable suffixes
         return SemverVersion(self.major, self.minor, self.patch, "alpha1", None)
     
-    def bump_build(self, *, include_sha: bool = True) -> SemverVersion:
+    def bump_build(self, *, include_sha: bool = True, sha: str | None = None) -> SemverVersion:
         """Bump build version according to SemVer.
         
         Args:
             include_sha: Whether to include short SHA in build number (default=True)
+            sha: The commit SHA to include, typically the SHA of HEAD
             
         Returns:
             A new SemverVersion with bumped build
         """
-        # Get the short SHA if needed
-        short_sha = None
-        if include_sha:
-            import contextlib
-            with contextlib.suppress(Exception):
-                # Get the current commit SHA and take first 7 characters
-                full_sha = asyncio.run(git.get_branch_tip_hash(branch='HEAD'))
-                if full_sha:
-                    short_sha = full_sha[:7]  # Use first 7 chars for short SHA
+        # Use first 7 chars for short SHA
+        short_sha = sha[:7] if include_sha and sha else None
                 
         # Parse existing build if any
         sequence = 1
@@ -307,11 +302,19 @@ class SemverTag:
 class Semver(Lazyload):
     """Class used to represent the semver state of git repository"""
 
-    def __init__(self, prefix: str | None = None, initial: str | None = None, tag_string: str | None = None):
+    def __init__(
+            self,
+            prefix: str | None = None,
+            initial: str | None = None,
+            tag_string: str | None = None,
+            config: configuration.TtConfig | None = None
+        ):
         super().__init__()
 
-        git_root = asyncio.run(git.get_root())
-        config = configuration.load_config(git_root=git_root)
+        # Commands pass the config of the repository, loaded once on the event loop.
+        # Instances made by from_json, which only the tests use, get the defaults
+        if config is None:
+            config = configuration.TtConfig()
 
         if initial is not None and initial != '':
             try:
@@ -333,17 +336,49 @@ class Semver(Lazyload):
             self.set('semver_tags', self._parse_tags(tag_string, prefix))
 
     @classmethod
-    def with_tags_loaded(cls) -> Semver:
-        semver = cls()
-        asyncio.run(semver._assert_props(['tags', 'tag_shas']))
-        semver.set('semver_tags', semver._parse_tags(
-            semver.get('tags'), 
-            semver.get('prefix'),
-            semver.get('tag_shas')
-        ))
+    async def with_tags_loaded(cls, config: configuration.TtConfig) -> Semver:
+        from gh_tt.legacy.gitter import Gitter
+
+        semver = cls(config=config)
+        await git.fetch(tags=True, freshness_seconds=config.fetch.freshness_seconds)
+
+        # One pass over the tags and the commits they point at (resolving through annotated
+        # tags), parsed line by line rather than holding the whole listing in memory
+        semver_tags = semver._new_semver_tags()
+        cmd = [
+            'git',
+            'for-each-ref',
+            '--format=%(if:equals=tag)%(objecttype)%(then)%(object)%(else)%(objectname)%(end) %(refname:short)',
+            'refs/tags/',
+        ]
+        async with contextlib.aclosing(shell.stream_lines(cmd, cwd=Gitter.workdir)) as lines:
+            async for line in lines:
+                sha, _, tag_str = line.partition(' ')
+                semver._add_tag(semver_tags, tag_str, semver.get('prefix'), sha)
+        semver.set('semver_tags', semver_tags)
 
         return semver
-    
+
+    @staticmethod
+    def _new_semver_tags() -> dict:
+        return {
+            'current': {
+                'release': [],
+                'prerelease': [],
+                'other': [],
+            }
+        }
+
+    @staticmethod
+    def _add_tag(semver_tags: dict, tag_str: str, prefix: str | None, sha: str | None = None):
+        # Create tag with SHA information upfront
+        semver_tag = SemverTag.from_string(tag_str, prefix, sha)
+        if semver_tag:
+            category = 'prerelease' if semver_tag.version.is_prerelease() else 'release'
+            semver_tags['current'][category].append(semver_tag)
+        else:
+            semver_tags['current']['other'].append(tag_str)
+
     def _parse_tags(self, tag_string: str, prefix: str | None, tag_shas_string: str | None = None) -> dict:
         tags = tag_string.split('\n') if tag_string else []
         
@@ -357,26 +392,13 @@ class Semver(Lazyload):
                         sha, tag_name = parts
                         tag_sha_map[tag_name] = sha
 
-        semver_tags = {
-            'current': {
-                'release': [],
-                'prerelease': [],
-                'other': [],
-            }
-        }
+        semver_tags = self._new_semver_tags()
 
         for tag_str in tags:
             if not tag_str.strip(): # skip empty
                 continue
 
-            # Create tag with SHA information upfront
-            sha = tag_sha_map.get(tag_str)
-            semver_tag = SemverTag.from_string(tag_str, prefix, sha)
-            if semver_tag:
-                category = 'prerelease' if semver_tag.version.is_prerelease() else 'release'
-                semver_tags['current'][category].append(semver_tag)
-            else:
-                semver_tags['current']['other'].append(tag_str)
+            self._add_tag(semver_tags, tag_str, prefix, tag_sha_map.get(tag_str))
 
         assert isinstance(semver_tags, dict)
         assert isinstance(semver_tags.get('current'), dict)
@@ -419,7 +441,7 @@ class Semver(Lazyload):
         
         return max(current_tags['prerelease'], default=None)
 
-    def bump(
+    async def bump(
             self, 
             level: str, 
             message: str | None,
@@ -456,7 +478,7 @@ class Semver(Lazyload):
             return cmd
         
         assert execution_mode is ExecutionMode.LIVE
-        asyncio.run(shell.run(['git', 'tag', '-a', '-m', f'{next_tag}\nBumped {level} from version \'{from_version}\' to \'{next_tag}\'{message}', next_tag]))
+        await shell.run(['git', 'tag', '-a', '-m', f'{next_tag}\nBumped {level} from version \'{from_version}\' to \'{next_tag}\'{message}', next_tag], single_flight=False)
 
         return {next_tag}
     
@@ -501,7 +523,7 @@ class Semver(Lazyload):
                         print(tag)
 
 
-def _handle_semver_bump_build(args, semver):
+async def _handle_semver_bump_build(args, semver, gate: preflight.Gate):
     """Handle the semver bump build subcommand"""
     # First try to get a prerelease version, if not available fall back to release
     current_version = semver.get_current_semver(release_type=ReleaseType.PRERELEASE)
@@ -512,7 +534,12 @@ def _handle_semver_bump_build(args, semver):
         print('No version found to bump build number.', file=sys.stderr)
         sys.exit(1)
 
-    new_version = current_version.version.bump_build(include_sha=args.include_sha)
+    sha = None
+    if args.include_sha:
+        with contextlib.suppress(Exception):
+            sha = await git.get_branch_tip_hash(branch='HEAD')
+
+    new_version = current_version.version.bump_build(include_sha=args.include_sha, sha=sha)
     # Handle the prefix if specified
     tag_str = f'{args.prefix or ""}{new_version}'
     message = f"Bumped build from version '{current_version}' to '{tag_str}'"
@@ -522,22 +549,25 @@ def _handle_semver_bump_build(args, semver):
     cmd = ['git', 'tag', '-a', '-m', f'{tag_str}\n{message}', tag_str]
 
     if args.run:
-        asyncio.run(shell.run(cmd))
+        await gate.wait()
+        await shell.run(cmd, single_flight=False)
         # Print the new tag when in --run mode
         print(f'{tag_str}')
     else:
         print(' '.join(cmd))
 
 
-def handle_semver_bump(args, semver, release_type):
+async def handle_semver_bump(args, semver, release_type, gate: preflight.Gate = preflight.OPEN):
     """Handle the semver bump subcommand"""
     assert args.level in ['major', 'minor', 'patch', 'prerelease', 'build']
 
     # For build level, we need to use the bump_build method directly
     if args.level == 'build':
-        _handle_semver_bump_build(args, semver)
+        await _handle_semver_bump_build(args, semver, gate)
     else:
-        result = semver.bump(
+        if args.run:
+            await gate.wait()
+        result = await semver.bump(
             level=args.level,
             message=args.message,
             prefix=args.prefix,
@@ -554,11 +584,18 @@ def handle_semver_bump(args, semver, release_type):
 class BumpError(Exception):
     pass
 
-async def validate_bump_context():
+async def validate_bump_context(config: configuration.TtConfig):
     """Validates that your git (branch, remote status) is in a state ready to execute semver bump."""
+    # Only bumping needs gh, so its pydantic models are not loaded when listing versions
+    from gh_tt.commands import gh
 
-    current_branch, _, remote, default_branch = await asyncio.gather(
-        git.get_current_branch_name(), git.fetch(), git.get_remote(), gh.get_default_branch()
+    current_branch, remote, default_branch = await asyncio.gather(
+        git.get_current_branch_name(), git.get_remote(), gh.get_default_branch()
+    )
+    await git.fetch(
+        branches=[default_branch],
+        tags=True,
+        freshness_seconds=config.fetch.freshness_seconds,
     )
     logger.debug(
         'current branch: %s, remote: %s, default_branch: %s',
@@ -572,27 +609,15 @@ async def validate_bump_context():
             f'You are currently on the {current_branch} branch. Bumping is only allowed from the {default_branch} branch. Switch to {default_branch} before bumping.'
         )
 
-    (
-        default_branch_tip_hash,
-        remote_dev_branch_tip_hash,
-        merge_base_hash,
-    ) = await asyncio.gather(
-        git.get_branch_tip_hash(remote=remote, branch=default_branch),
-        git.get_branch_tip_hash(remote=remote, branch=current_branch),
-        git.get_merge_base(branch=current_branch, remote=remote, default_branch=default_branch),
-    )
-    logger.debug(
-        'default_branch_tip_hash=%s, remote_dev_branch_tip_hash=%s, merge_base_hash=%s',
-        default_branch_tip_hash,
-        remote_dev_branch_tip_hash,
-        merge_base_hash,
-    )
-        
-    if default_branch_tip_hash != merge_base_hash:
+    status = await git.get_branch_status(remote, default_branch, current_branch)
+    logger.debug('branch status against %s: %s', remote, status)
+
+    # The default branch is an ancestor of the branch when the branch is not behind it
+    if status.default.behind > 0:
         logger.debug(
             'branch %s is not up to date with %s/%s', current_branch, remote, default_branch
         )
         raise BumpError(
-            f'The {default_branch} branch has commits your branch does not. Run git rebase {remote}/{default_branch} to integrate commits from {default_branch} before you bump.'
+            f'The {default_branch} branch has commits your branch does not (your branch is {status.default.describe()} of {remote}/{default_branch}). Run git rebase {remote}/{default_branch} to integrate commits from {default_branch} before you bump.'
         )
 
@@ -0,0 +1,189 @@
+"""
+Caches the gh CLI preflight checks (version and token scopes) across invocations.
+
+The cache is stored as JSON in the user cache directory. It is keyed by the path and mtime
+of the gh binary and by a fingerprint of the credentials gh authenticates with, so upgrading
+gh or re-authenticating invalidates it. Entries also expire after `CACHE_TTL_SECONDS`.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import re
+import shutil
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+CACHE_FILE_NAME = 'preflight.json'
+CACHE_TTL_SECONDS = 24 * 60 * 60
+
+# Environment variables gh reads credentials and host selection from
+TOKEN_ENV_VARS = ('GH_TOKEN', 'GITHUB_TOKEN', 'GH_ENTERPRISE_TOKEN', 'GH_HOST')
+
+SCOPE_ERROR_PATTERN = re.compile(
+    r'insufficient_scopes|missing required scopes|not been granted the required scopes',
+    re.IGNORECASE,
+)
+
+
+class PreflightError(Exception):
+    """Raised when gh does not pass the preflight checks."""
+
+
+def cache_dir() -> Path:
+    """Returns the gh-tt directory in the user cache directory."""
+    xdg_cache_home = os.getenv('XDG_CACHE_HOME')
+    base = Path(xdg_cache_home) if xdg_cache_home else Path.home() / '.cache'
+    return base / 'gh-tt'
+
+
+def cache_path() -> Path:
+    return cache_dir() / CACHE_FILE_NAME
+
+
+def _gh_config_dir() -> Path:
+    if gh_config_dir := os.getenv('GH_CONFIG_DIR'):
+        return Path(gh_config_dir)
+    if xdg_config_home := os.getenv('XDG_CONFIG_HOME'):
+        return Path(xdg_config_home) / 'gh'
+    return Path.home() / '.config' / 'gh'
+
+
+def _token_fingerprint() -> str:
+    """Hashes everything that decides which token gh authenticates with.
+
+    The raw values never leave this function, only the digest is persisted.
+    """
+    digest = hashlib.sha256()
+    for var in TOKEN_ENV_VARS:
+        digest.update(f'{var}={os.getenv(var, "")}\0'.encode())
+
+    hosts_file = _gh_config_dir() / 'hosts.yml'
+    try:
+        digest.update(hosts_file.read_bytes())
+        digest.update(str(hosts_file.stat().st_mtime_ns).encode())
+    except OSError:
+        digest.update(b'no-hosts-file')
+
+    return digest.hexdigest()
+
+
+def cache_key() -> dict | None:
+    """Returns the key identifying the current gh installation and credentials.
+
+    Returns None when gh is not on the PATH, in which case nothing is cached.
+    """
+    gh_path = shutil.which('gh')
+    if gh_path is None:
+        return None
+
+    resolved = Path(gh_path).resolve()
+    try:
+        mtime_ns = resolved.stat().st_mtime_ns
+    except OSError:
+        return None
+
+    return {'gh_path': str(resolved), 'gh_mtime_ns': mtime_ns, 'token': _token_fingerprint()}
+
+
+def _read_entry(key: dict) -> dict:
+    try:
+        entry = json.loads(cache_path().read_text())
+    except (OSError, ValueError):
+        return {}
+
+    if not isinstance(entry, dict) or entry.get('key') != key:
+        logger.debug('preflight cache: key mismatch, ignoring cached entry')
+        return {}
+
+    if time.time() - entry.get('created_at', 0) > CACHE_TTL_SECONDS:
+        logger.debug('preflight cache: entry expired')
+        return {}
+
+    return entry
+
+
+def _write_entry(key: dict, **values):
+    entry = _read_entry(key)
+    if not entry:
+        entry = {'key': key, 'created_at': time.time()}
+    entry.update(values)
+
+    path = cache_path()
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Write to a temporary file first, so concurrent invocations never read a partial file
+        tmp_path = path.with_suffix(f'.{os.getpid()}.tmp')
+        tmp_path.write_text(json.dumps(entry))
+        tmp_path.replace(path)
+    except OSError as e:
+        logger.debug('preflight cache: could not write %s: %s', path, e)
+
+
+def invalidate():
+    """Removes the cached preflight results."""
+    logger.debug('preflight cache: invalidating')
+    cache_path().unlink(missing_ok=True)
+
+
+def is_scope_error(stderr: str) -> bool:
+    """Returns True if a gh error message indicates the token lacks a required scope."""
+    return SCOPE_ERROR_PATTERN.search(stderr) is not None
+
+
+async def get_gh_cli_version(*, use_cache: bool = True) -> str:
+    """Returns the gh CLI version, served from the preflight cache when possible."""
+    key = cache_key() if use_cache else None
+    if key is not None and (version := _read_entry(key).get('gh_version')):
+        logger.debug('preflight cache: hit for gh version %s', version)
+        return version
+
+    # Imported on a cache miss only, the gh module loads all pydantic models for gh responses
+    from gh_tt.commands import gh
+
+    version = await gh.get_gh_cli_version()
+    if key is not None:
+        _write_entry(key, gh_version=version)
+
+    return version
+
+
+async def get_gh_auth_scopes(*, use_cache: bool = True) -> list[str]:
+    """Returns the gh token scopes, served from the preflight cache when possible."""
+    key = cache_key() if use_cache else None
+    if key is not None and (scopes := _read_entry(key).get('scopes')) is not None:
+        logger.debug('preflight cache: hit for gh scopes %s', scopes)
+        return scopes
+
+    from gh_tt.commands import gh
+
+    scopes = await gh.get_gh_auth_scopes()
+    if key is not None:
+        _write_entry(key, scopes=scopes)
+
+    return scopes
+
+
+class Gate:
+    """Lets read-only work start before the preflight checks have finished.
+
+    Steps that change state locally or on GitHub await `wait()` first. It returns once the
+    checks passed, and raises `PreflightError` if they failed.
+    """
+
+    def __init__(self, checks: asyncio.Future[None] | None = None):
+        self._checks = checks
+
+    async def wait(self):
+        if self._checks is None:
+            return
+        # Shield the checks, so a cancelled waiter does not cancel the checks for everybody else
+        await asyncio.shield(self._checks)
+
+
+# A gate for callers that ran the preflight checks up front, or do not need them
+OPEN = Gate()
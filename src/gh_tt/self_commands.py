@@ -2,17 +2,106 @@
 This module contains code for `self` commands, like `gh tt self upgrade`.
 
 It is named self_commands.py rather than self to prevent shadowing Python's class instance reference.
+
+After reinstalling the extension, `upgrade` builds a virtual environment with the extension and
+its dependencies installed and compiled to bytecode, in `PREBUILT_ENV` next to the launcher.
+The `gh-tt` launcher runs its interpreter directly, which saves resolving the environment with
+`uv run` on every invocation. The launcher only uses it while `PREBUILT_MARKER` is newer than
+uv.lock and the git index of the extension, so a checkout that changes the extension falls back
+to `uv run` until the next upgrade. The .venv directory is left to `uv run`, which keeps the
+dev dependencies and the editable install in it.
 """
 
+import logging
+import statistics
+import time
+from pathlib import Path
+
 from gh_tt.commands import shell
 
+logger = logging.getLogger(__name__)
+
+EXTENSION_NAME = 'gh-tt'
+
+# The prebuilt environment and the marker `upgrade` writes into it, both read by the launcher
+PREBUILT_ENV = '.gh-tt-env'
+PREBUILT_MARKER = 'gh-tt-prebuilt'
+
+STARTUP_SAMPLES = 5
+
+
+def extension_dir() -> Path:
+    """Returns the directory the extension is installed in, the one with the gh-tt launcher.
+
+    Found from this file rather than from where gh keeps its extensions, which depends on
+    GH_DATA_DIR and XDG_DATA_HOME. This file is in the src directory of the extension, or in
+    the prebuilt environment in its `PREBUILT_ENV` directory.
+    """
+    for directory in Path(__file__).resolve().parents:
+        if (directory / EXTENSION_NAME).is_file():
+            return directory
+    raise FileNotFoundError(f'{__file__} is not in a directory with the {EXTENSION_NAME} launcher')
+
+
+async def build_prebuilt_env(directory: Path, pin: str) -> Path:
+    """Installs the extension and its locked dependencies into `directory`/`PREBUILT_ENV`.
+
+    Returns the interpreter of the environment.
+    """
+    venv = directory / PREBUILT_ENV
+    await shell.run(
+        [
+            'uv',
+            'sync',
+            '--project',
+            str(directory),
+            '--frozen',
+            '--no-dev',
+            '--no-editable',
+            '--compile-bytecode',
+            '--quiet',
+        ],
+        single_flight=False,
+        env={'UV_PROJECT_ENVIRONMENT': str(venv)},
+    )
+
+    (venv / PREBUILT_MARKER).write_text(f'{pin}\n')
+    return venv / 'bin' / 'python'
+
+
+async def _median_startup_ms(cmd: list[str]) -> float:
+    samples = []
+    for _ in range(STARTUP_SAMPLES):
+        start = time.perf_counter()
+        await shell.run(cmd)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def _startup_cmd(directory: Path, python: Path | None = None) -> list[str]:
+    """Returns the command the launcher runs for `gh tt --help`, with or without `python`."""
+    if python is not None:
+        return [str(python), '-m', 'gh_tt', '--help']
+    return [
+        'uv',
+        'run',
+        '--quiet',
+        '--project',
+        str(directory),
+        '--frozen',
+        'python',
+        '-m',
+        'gh_tt',
+        '--help',
+    ]
+
 
 async def upgrade(pin: str):
     result = await shell.run(['gh', 'ext', 'list'])
     extensions = result.stdout
 
     assert 'gh-tt' in extensions, 'Expected gh-tt to be installed'
-    await shell.run(['gh', 'ext', 'remove', 'gh-tt'])
+    await shell.run(['gh', 'ext', 'remove', 'gh-tt'], single_flight=False)
 
     await shell.run(
         [
@@ -22,5 +111,21 @@ async def upgrade(pin: str):
             'thetechcollective/gh-tt',
             '--pin',
             pin,
-        ]
+        ],
+        single_flight=False,
+    )
+
+    try:
+        directory = extension_dir()
+        uv_run_ms = await _median_startup_ms(_startup_cmd(directory))
+        python = await build_prebuilt_env(directory, pin)
+        prebuilt_ms = await _median_startup_ms(_startup_cmd(directory, python))
+    except (shell.ShellError, OSError) as e:
+        # The launcher keeps using `uv run`, which still works without the prebuilt environment
+        logger.warning('could not build the prebuilt environment: %s', e)
+        return
+
+    print(
+        f'Startup time: {prebuilt_ms:.0f} ms with the prebuilt environment, '
+        f'{uv_run_ms:.0f} ms with uv run (median of {STARTUP_SAMPLES} runs)'
     )
@@ -0,0 +1,156 @@
+"""
+Records a span for every external process and step of an invocation, for `--trace FILE`.
+
+The trace is written in the Chrome trace event format, which chrome://tracing and
+https://ui.perfetto.dev open. Spans that run at the same time are put on separate lanes
+(threads in the trace viewer), and every span names the step it ran in as its parent.
+
+Recording is off unless `recording()` is active, so `span()` costs next to nothing in
+normal runs.
+"""
+
+import contextlib
+import itertools
+import json
+import logging
+import os
+import time
+from collections.abc import Iterator
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class Span:
+    span_id: int
+    name: str
+    category: str
+    lane: int
+    start_ns: int
+    parent: 'Span | None' = None
+    args: dict = field(default_factory=dict)
+
+
+@dataclass
+class Tracer:
+    name: str
+    start_ns: int = field(default_factory=time.perf_counter_ns)
+    events: list[dict] = field(default_factory=list)
+    _ids: Iterator[int] = field(default_factory=itertools.count)
+    _busy_lanes: set[int] = field(default_factory=set)
+
+    def _acquire_lane(self) -> int:
+        lane = next(lane for lane in itertools.count() if lane not in self._busy_lanes)
+        self._busy_lanes.add(lane)
+        return lane
+
+    def _microseconds(self, ns: int) -> float:
+        return (ns - self.start_ns) / 1000
+
+    def begin(self, name: str, category: str, parent: Span | None, args: dict) -> Span:
+        return Span(
+            span_id=next(self._ids),
+            name=name,
+            category=category,
+            lane=self._acquire_lane(),
+            start_ns=time.perf_counter_ns(),
+            parent=parent,
+            args=args,
+        )
+
+    def end(self, span: Span):
+        end_ns = time.perf_counter_ns()
+        self._busy_lanes.discard(span.lane)
+        args = {'id': span.span_id, **span.args}
+        if span.parent is not None:
+            args['parent'] = f'{span.parent.name} #{span.parent.span_id}'
+        self.events.append(
+            {
+                'name': span.name,
+                'cat': span.category,
+                'ph': 'X',
+                'ts': self._microseconds(span.start_ns),
+                'dur': (end_ns - span.start_ns) / 1000,
+                'pid': os.getpid(),
+                'tid': span.lane,
+                'args': args,
+            }
+        )
+
+    def to_json(self) -> dict:
+        pid = os.getpid()
+        lanes = sorted({event['tid'] for event in self.events})
+        metadata = [{'name': 'process_name', 'ph': 'M', 'pid': pid, 'args': {'name': self.name}}]
+        metadata.extend(
+            {
+                'name': 'thread_name',
+                'ph': 'M',
+                'pid': pid,
+                'tid': lane,
+                'args': {'name': f'lane {lane}'},
+            }
+            for lane in lanes
+        )
+        return {
+            'traceEvents': metadata + sorted(self.events, key=lambda event: event['ts']),
+            'displayTimeUnit': 'ms',
+        }
+
+
+def command_name(cmd: list[str]) -> str:
+    """Names a span after the binary and subcommand of a command, e.g. 'gh pr view'."""
+    words = itertools.takewhile(lambda arg: not arg.startswith('-'), cmd[1:3])
+    return ' '.join([Path(cmd[0]).name, *words])
+
+
+_tracer: Tracer | None = None
+_parent: ContextVar[Span | None] = ContextVar('parent', default=None)
+
+
+@contextlib.contextmanager
+def span(name: str, category: str, **args) -> Iterator[dict]:
+    """Records a span around the block. Yields the span arguments, to add results to."""
+    tracer = _tracer
+    if tracer is None:
+        yield args
+        return
+
+    record = tracer.begin(name, category, _parent.get(), args)
+    token = _parent.set(record)
+    try:
+        yield record.args
+    except SystemExit as e:
+        record.args['exit_code'] = e.code
+        raise
+    except BaseException as e:
+        record.args['error'] = type(e).__name__
+        raise
+    finally:
+        _parent.reset(token)
+        tracer.end(record)
+
+
+@contextlib.contextmanager
+def recording(path: Path | None, name: str) -> Iterator[None]:
+    """Records spans while the block runs and writes them to `path`. Does nothing without a path."""
+    global _tracer
+
+    if path is None:
+        yield
+        return
+
+    _tracer = tracer = Tracer(name=name)
+    try:
+        yield
+    finally:
+        _tracer = None
+        # A trace that cannot be written must not hide how the invocation itself ended
+        try:
+            path.write_text(json.dumps(tracer.to_json()))
+        except OSError as e:
+            logger.warning('could not write the trace to %s: %s', path, e)
+        else:
+            logger.info('wrote %d spans to %s', len(tracer.events), path)
@@ -1,9 +1,16 @@
+from __future__ import annotations
+
 import asyncio
 import logging
+from pathlib import Path
+from typing import TYPE_CHECKING
 
-from gh_tt import configuration
+from gh_tt import preflight
 from gh_tt.commands import gh, git
 
+if TYPE_CHECKING:
+    from gh_tt import configuration
+
 logger = logging.getLogger(__name__)
 
 
@@ -11,10 +18,31 @@ class WorkonError(Exception):
     pass
 
 
-async def workon_issue(issue: int | gh.Issue, config: configuration.TtConfig, *, assign: bool):  # noqa: C901
-    logger.debug('workon_issue: issue=%s, assign=%s', issue, assign)
+async def workon_issue(  # noqa: C901
+    issue: int | gh.Issue,
+    config: configuration.TtConfig,
+    *,
+    assign: bool,
+    gate: preflight.Gate = preflight.OPEN,
+    worktree: bool = False,
+):
+    """Checks out the branch of the issue, creating it and its draft PR if needed.
 
-    _, should_use_stash = await asyncio.gather(git.fetch(), git.has_changes_to_tracked_files())
+    With `worktree`, the branch is checked out in a worktree of its own, and the checkout
+    of the working directory is left alone.
+    """
+    logger.debug('workon_issue: issue=%s, assign=%s, worktree=%s', issue, assign, worktree)
+
+    issue_number = issue if isinstance(issue, int) else issue.number
+    find_branch = _find_issue_branch(issue_number, config.fetch.freshness_seconds)
+    if worktree:
+        # Uncommitted changes stay in the working directory, which is not switched
+        existing_branch = await find_branch
+        should_use_stash = False
+    else:
+        existing_branch, should_use_stash = await asyncio.gather(
+            find_branch, git.has_changes_to_tracked_files()
+        )
     match issue:
         case int():
             issue, repo, remote = await asyncio.gather(
@@ -32,12 +60,27 @@ async def workon_issue(issue: int | gh.Issue, config: configuration.TtConfig, *,
             'Issue is closed. Working on closed issues is not supported. Please open a new issue in favor of reopening issues.'
         )
 
+    # Everything above is read-only and may overlap with the preflight checks
+    await gate.wait()
+
     if should_use_stash:
         logger.debug('stashing uncommitted changes before branch switch')
         await git.stash()
 
+    worktree_path = None
     try:
-        dev_branch = await _create_or_reuse_branch(issue=issue, repo=repo, remote=remote)
+        if worktree:
+            dev_branch, worktree_path = await _create_or_reuse_worktree(
+                issue=issue,
+                repo=repo,
+                remote=remote,
+                existing_branch=existing_branch,
+                worktree_dir=config.workon.worktree_dir,
+            )
+        else:
+            dev_branch = await _create_or_reuse_branch(
+                issue=issue, repo=repo, remote=remote, existing_branch=existing_branch
+            )
     except:
         if should_use_stash:
             logger.debug('branch operation failed, restoring stashed changes')
@@ -86,21 +129,50 @@ async def workon_issue(issue: int | gh.Issue, config: configuration.TtConfig, *,
     else:
         logger.debug('skipping project status update (project config not fully set)')
 
-    print(str(issue.url))
+    print(str(worktree_path or issue.url))
 
 
 async def workon_title(
-    issue_title: str, issue_body: str | None, config: configuration.TtConfig, *, assign: bool
+    issue_title: str,
+    issue_body: str | None,
+    config: configuration.TtConfig,
+    *,
+    assign: bool,
+    gate: preflight.Gate = preflight.OPEN,
+    worktree: bool = False,
 ):
     logger.debug('workon_title: title=%s, assign=%s', issue_title, assign)
+    await gate.wait()
     issue = await gh.create_issue(title=issue_title, body=issue_body)
-    await workon_issue(issue=issue, assign=assign, config=config)
+    await workon_issue(issue=issue, assign=assign, config=config, gate=gate, worktree=worktree)
+
 
+async def _find_issue_branch(
+    issue_number: int, freshness_seconds: float
+) -> git.CheckBranchExistsResult | None:
+    """Finds the branch of the issue, asking the remote only if there is no local branch.
 
-async def _create_or_reuse_branch(issue: gh.Issue, repo: gh.Repo, remote: str) -> str:
-    existing_branch = await git.check_branch_exists(issue.number)
+    A local branch is worked on as it is, so the remote does not matter then. Otherwise
+    only the branches named after the issue are fetched, which the remote lists by prefix,
+    however many branches it has.
+    """
+    existing_branch = await git.check_branch_exists(issue_number)
+    if existing_branch is not None and existing_branch.branch_type == 'local':
+        logger.debug('found local branch %s, not fetching', existing_branch.name)
+        return existing_branch
+
+    await git.fetch(branches=[f'{issue_number}-*'], freshness_seconds=freshness_seconds)
+    existing_branch = await git.check_branch_exists(issue_number)
     logger.debug('existing branch check result: %s', existing_branch)
+    return existing_branch
+
 
+async def _create_or_reuse_branch(
+    issue: gh.Issue,
+    repo: gh.Repo,
+    remote: str,
+    existing_branch: git.CheckBranchExistsResult | None,
+) -> str:
     match existing_branch:
         case None:
             logger.debug('no existing branch, creating new dev branch')
@@ -141,3 +213,70 @@ async def _create_or_reuse_branch(issue: gh.Issue, repo: gh.Repo, remote: str) -
                 )
 
     return dev_branch
+
+
+def _worktree_path(main_root: Path, worktree_dir: str | None, branch: str) -> Path:
+    if worktree_dir is None:
+        return main_root.parent / f'{main_root.name}-worktrees' / branch
+    # Relative to the main worktree, unless absolute
+    return main_root / Path(worktree_dir).expanduser() / branch
+
+
+async def _create_or_reuse_worktree(
+    issue: gh.Issue,
+    repo: gh.Repo,
+    remote: str,
+    existing_branch: git.CheckBranchExistsResult | None,
+    worktree_dir: str | None,
+) -> tuple[str, Path]:
+    worktrees = await git.list_worktrees()
+    main_root = worktrees[0].path
+
+    match existing_branch:
+        case None:
+            logger.debug('no existing branch, creating new dev branch in a worktree')
+            dev_branch = await gh.develop_issue(
+                issue_title=issue.title,
+                issue_number=issue.number,
+                default_branch=repo.default_branch,
+                checkout=False,
+            )
+            await git.fetch(branches=[dev_branch])
+            # The branch is created locally with the start commit, before any checkout
+            await git.push_pr_start_commit(dev_branch=dev_branch, remote=remote)
+            path = _worktree_path(main_root, worktree_dir, dev_branch)
+            await asyncio.gather(
+                git.add_worktree(path, dev_branch),
+                gh.create_draft_pr(
+                    issue_number=issue.number,
+                    issue_title=issue.title,
+                    default_branch=repo.default_branch,
+                    head=dev_branch,
+                ),
+            )
+            return dev_branch, path
+        case git.CheckBranchExistsResult(branch_type='local', name=branch_name):
+            logger.debug('found local branch: %s', branch_name)
+            if not await gh.is_pr_open(branch_name):
+                raise WorkonError(
+                    f"Found local branch '{branch_name}', but could not find a corresponding open pull request. This indicates this branch was not created via `gh tt workon`. gh-tt currently does not support working on branches not created via gh-tt.\n\nTo fix this, please create a PR manually.\n\nIf this branch was created via gh tt workon, please report this as a bug."
+                )
+
+            checked_out = next((w.path for w in worktrees if w.branch == branch_name), None)
+            if checked_out is not None:
+                logger.debug('reusing worktree %s', checked_out)
+                return branch_name, checked_out
+
+            path = _worktree_path(main_root, worktree_dir, branch_name)
+            await git.add_worktree(path, branch_name)
+            return branch_name, path
+        case git.CheckBranchExistsResult(branch_type='remote', name=branch_name):
+            logger.debug('found remote branch: %s', branch_name)
+            if not await gh.is_pr_open(branch_name):
+                raise WorkonError(
+                    f"Found remote branch '{branch_name}', but could not find a corresponding open pull request. This indicates this branch was not created via `gh tt workon`. gh-tt currently does not support working on branches not created via gh-tt.\n\nTo fix this, please create a PR manually.\n\nIf this branch was created via gh tt workon, please report this as a bug."
+                )
+
+            path = _worktree_path(main_root, worktree_dir, branch_name)
+            await git.add_worktree(path, branch_name, remote=remote)
+            return branch_name, path
@@ -46,6 +46,25 @@ async def check_end_to_end_env():
     assert 'gh tt' in extensions, 'gh tt is not installed. Install with\ngh extension install .'
 
 
+@pytest.fixture
+async def repo(tmp_path, monkeypatch):
+    """A git repository with one commit on main, as the working directory.
+
+    Returns a function running git in it, which returns the output.
+    """
+
+    async def run(*args: str) -> str:
+        result = await shell.run(['git', *args], cwd=tmp_path)
+        return result.stdout
+
+    await run('init', '-q', '-b', 'main')
+    await run('config', 'user.name', 't')
+    await run('config', 'user.email', 't@t')
+    await run('commit', '-q', '--allow-empty', '-m', 'init')
+    monkeypatch.chdir(tmp_path)
+    return run
+
+
 def pytest_configure(config):
     worker_id = os.environ.get('PYTEST_XDIST_WORKER')
     if worker_id is not None:
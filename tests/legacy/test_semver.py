@@ -6,6 +6,7 @@ from hypothesis import given
 from hypothesis import strategies as st
 
 from gh_tt.commands import shell
+from gh_tt.configuration import SemverConfig, TtConfig
 from gh_tt.legacy.gitter import Gitter
 from gh_tt.legacy.semver import ExecutionMode, ReleaseType, Semver, SemverTag, SemverVersion
 from tests.env_builder import IntegrationEnv
@@ -35,6 +36,23 @@ def test_semver_init(capsys):
     assert "Invalid initial version" in capsys.readouterr().err
 
 
+async def test_semver_with_tags_loaded_uses_the_config_passed(mocker):
+    mocker.patch('gh_tt.commands.git.fetch')
+    mocker.patch('gh_tt.commands.shell.stream_lines', return_value=_lines('abc123 v1.0.0'))
+    config = TtConfig(semver=SemverConfig(prefix="v", initial="1.0.0"))
+
+    semver = await Semver.with_tags_loaded(config)
+
+    assert semver.get("prefix") == "v"
+    assert semver.get("initial") == "1.0.0"
+    assert [str(tag.version) for tag in semver.get("semver_tags")['current']['release']] == ['1.0.0']
+
+
+async def _lines(*lines: str):
+    for line in lines:
+        yield line
+
+
 def test_semver_list(capsys):
     # Setup
     semver = Semver().from_json("tests/legacy/data/semver/semver_loaded_release_and_prerelease.json")
@@ -63,11 +81,11 @@ def test_semver_get_current():
     prerelease = semver.get_current_semver(release_type=ReleaseType.PRERELEASE)
     assert str(prerelease) == "1.0.11-rc1"
 
-def test_semver_bump(capsys):
+async def test_semver_bump(capsys):
     semver = Semver().from_json('tests/legacy/data/semver/semver_loaded_release_and_prerelease.json')
     semver.set('semver_tags', semver._parse_tags(semver.get('tags'), prefix=semver.get('prefix')))
 
-    semver.bump("patch", message="Test patch bump", release_type=ReleaseType.PRERELEASE, execution_mode=ExecutionMode.DRY_RUN)
+    await semver.bump("patch", message="Test patch bump", release_type=ReleaseType.PRERELEASE, execution_mode=ExecutionMode.DRY_RUN)
     output = capsys.readouterr().out
     assert "git tag -a -m \"1.0.12-alpha1" in output  # Check the prefix part
     assert "Bumped patch from version '1.0.11-rc1' to '1.0.12-alpha1" in output
@@ -96,11 +114,11 @@ def test_semver_first_prerelease(capsys):
     assert prerelease is None
 
 
-def test_semver_first_prerelease_bump(capsys):
+async def test_semver_first_prerelease_bump(capsys):
     semver = Semver().from_json('tests/legacy/data/semver/semver_loaded_release.json')
     semver.set('semver_tags', semver._parse_tags(semver.get('tags'), prefix=semver.get('prefix')))
 
-    semver.bump("patch", message="Test patch bump", release_type=ReleaseType.PRERELEASE, execution_mode=ExecutionMode.DRY_RUN)
+    await semver.bump("patch", message="Test patch bump", release_type=ReleaseType.PRERELEASE, execution_mode=ExecutionMode.DRY_RUN)
     output = capsys.readouterr().out
     assert "git tag -a -m \"0.7.4-alpha1" in output
     assert "Bumped patch from version '0.7.3' to '0.7.4-alpha1'" in output
@@ -301,11 +319,11 @@ def test_semver_get_next_semvers(current_release, current_prerelease):
     Semver()._get_next_semvers(current_release, current_prerelease)
 
 @pytest.mark.parametrize(('prefix', 'expected'), [('v', 'v3.0.0'), ('', '3.0.0'), (' ', '3.0.0'), ('123', '1233.0.0')])
-def test_bump_user_passed_prefix_included_over_config(prefix, expected):
+async def test_bump_user_passed_prefix_included_over_config(prefix, expected):
     semver = Semver.from_json('tests/legacy/data/semver/semver_loaded_prefix.json')
     semver.set('semver_tags', semver._parse_tags(semver.get('tags'), prefix=None))
     
-    result = semver.bump(level='major', message=None, prefix=prefix, execution_mode=ExecutionMode.DRY_RUN)
+    result = await semver.bump(level='major', message=None, prefix=prefix, execution_mode=ExecutionMode.DRY_RUN)
     
     assert expected in result
     assert semver.get('prefix') not in result
@@ -0,0 +1,88 @@
+import json
+import sys
+from dataclasses import asdict
+from pathlib import Path
+
+import pytest
+
+from gh_tt import cassette
+from gh_tt.commands import shell
+from gh_tt.legacy.gitter import Gitter
+
+
+def _entries(path: Path) -> list[dict]:
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+async def test_record_then_replay_without_running_the_commands(tmp_path: Path, mocker):
+    path = tmp_path / 'cassette.jsonl'
+    failing = [sys.executable, '-c', 'import sys; print("out"); sys.exit("err")']
+
+    with cassette.recording(path, replay=None):
+        recorded = await shell.run(['git', '--version'])
+        await shell.run(failing, die_on_error=False)
+        await Gitter(cmd='git --version').run()
+        lines = [line async for line in shell.stream_lines(['git', '--version'])]
+
+    entries = _entries(path)
+    assert [entry['cmd'] for entry in entries] == [
+        ['git', '--version'],
+        failing,
+        'git --version',
+        ['git', '--version'],
+    ]
+    assert entries[1]['exit_code'] == 1
+    assert entries[1]['stderr'] == 'err\n'
+    assert all(entry['latency_ms'] > 0 for entry in entries)
+
+    spawn = mocker.patch('asyncio.create_subprocess_exec')
+    with cassette.recording(None, replay=path, speed=0):
+        assert await shell.run(['git', '--version']) == recorded
+        result = await shell.run(failing, die_on_error=False)
+        stdout, _ = await Gitter(cmd='git --version').run()
+        assert [line async for line in shell.stream_lines(['git', '--version'])] == lines
+
+    assert (result.stdout, result.stderr, result.return_code) == ('out', 'err', 1)
+    assert stdout == recorded.stdout
+    spawn.assert_not_called()
+
+
+async def test_replay_serves_the_last_recording_when_run_more_often(tmp_path: Path):
+    path = tmp_path / 'cassette.jsonl'
+    entries = [
+        cassette.Entry(
+            cmd=['gh', 'pr', 'checks'], cwd='.', stdout=stdout, stderr='', exit_code=0, latency_ms=0
+        )
+        for stdout in ('pending', 'pass')
+    ]
+    path.write_text(''.join(json.dumps(asdict(entry)) + '\n' for entry in entries))
+
+    with cassette.recording(None, replay=path):
+        outputs = [(await shell.run(['gh', 'pr', 'checks'])).stdout for _ in range(3)]
+
+    assert outputs == ['pending', 'pass', 'pass']
+
+
+async def test_replay_scales_the_latency(tmp_path: Path, mocker):
+    path = tmp_path / 'cassette.jsonl'
+    entry = cassette.Entry(
+        cmd=['gh', '--version'], cwd='.', stdout='', stderr='', exit_code=0, latency_ms=500
+    )
+    path.write_text(json.dumps(asdict(entry)) + '\n')
+    sleep = mocker.patch('asyncio.sleep')
+
+    with cassette.recording(None, replay=path, speed=2):
+        await shell.run(['gh', '--version'])
+
+    sleep.assert_awaited_once_with(0.25)
+
+
+async def test_replay_of_a_command_that_was_not_recorded(tmp_path: Path):
+    path = tmp_path / 'cassette.jsonl'
+    path.write_text('')
+
+    with (
+        cassette.recording(None, replay=path),
+        pytest.raises(cassette.CassetteError, match='was not recorded'),
+    ):
+        await shell.run(['gh', '--version'])
@@ -0,0 +1,110 @@
+import itertools
+from pathlib import Path
+
+import pytest
+
+from gh_tt.commands import commit_graph, git, shell
+
+
+@pytest.fixture
+async def repo(repo):
+    """The repository of conftest, with a merge and an octopus merge, as branches a to f."""
+
+    async def commit(branch: str, message: str):
+        await repo('switch', '-q', branch)
+        await repo('commit', '-q', '--allow-empty', '-m', message)
+
+    await repo('branch', '-m', 'a')
+    for branch in ('b', 'c', 'd'):
+        await repo('branch', branch)
+    for branch in ('a', 'b', 'c', 'd'):
+        await commit(branch, branch)
+    await repo('switch', '-q', '-c', 'e', 'a')
+    await repo('merge', '-q', '--no-edit', 'b')
+    await repo('switch', '-q', '-c', 'f', 'a')
+    await repo('merge', '-q', '--no-edit', 'b', 'c', 'd')
+    return repo
+
+
+async def _assert_answers_like_git(run, path: Path):
+    commits = commit_graph.open_commits(path / '.git')
+    branches = 'abcdef'
+    names = {branch: await run('rev-parse', branch) for branch in branches}
+
+    for a, b in itertools.product(branches, repeat=2):
+        is_ancestor = await shell.run(
+            ['git', 'merge-base', '--is-ancestor', a, b], die_on_error=False
+        )
+        assert commits.is_ancestor(names[a], names[b]) == (is_ancestor.return_code == 0), (a, b)
+
+        counts = await run('rev-list', '--left-right', '--count', f'{a}...{b}')
+        assert commits.ahead_behind(names[a], names[b]) == tuple(map(int, counts.split())), (a, b)
+    commits.close()
+
+
+async def test_reads_loose_commits(repo, tmp_path):
+    await _assert_answers_like_git(repo, tmp_path)
+
+
+async def test_reads_the_commit_graph(repo, tmp_path):
+    await repo('gc', '-q')
+    await repo('commit-graph', 'write', '--reachable')
+    assert not list((tmp_path / '.git' / 'objects').glob('??/*'))
+
+    await _assert_answers_like_git(repo, tmp_path)
+
+
+async def test_reads_a_commit_graph_chain_and_loose_commits_on_top(repo, tmp_path):
+    await repo('gc', '-q')
+    await repo('commit-graph', 'write', '--reachable', '--split=no-merge')
+    await repo('switch', '-q', 'a')
+    await repo('commit', '-q', '--allow-empty', '-m', 'a2')
+    await repo('repack', '-q', '-d')
+    await repo('commit-graph', 'write', '--reachable', '--split=no-merge')
+    await repo('switch', '-q', 'e')
+    await repo('merge', '-q', '--no-edit', 'a')
+    assert (tmp_path / '.git/objects/info/commit-graphs/commit-graph-chain').exists()
+
+    await _assert_answers_like_git(repo, tmp_path)
+
+
+async def test_packed_commits_outside_the_graph_are_left_to_git(repo, tmp_path, mocker):
+    await repo('-c', 'gc.writeCommitGraph=false', 'gc', '-q')
+    commits = commit_graph.open_commits(tmp_path / '.git')
+    with pytest.raises(commit_graph.UnsupportedCommitError):
+        commits.is_ancestor(await repo('rev-parse', 'a'), await repo('rev-parse', 'e'))
+
+    run = mocker.spy(shell, 'run')
+    assert await git.is_ancestor('a', 'e')
+    assert run.call_args.args[0][:3] == ['git', 'merge-base', '--is-ancestor']
+
+
+@pytest.mark.usefixtures('repo')
+async def test_is_ancestor_without_git(mocker):
+    run = mocker.spy(shell, 'run')
+
+    assert await git.is_ancestor('refs/heads/a', 'refs/heads/f')
+    assert not await git.is_ancestor('refs/heads/f', 'refs/heads/a')
+    run.assert_not_called()
+
+
+@pytest.mark.usefixtures('repo')
+async def test_shallow_clones_are_left_to_git(tmp_path):
+    (tmp_path / '.git' / 'shallow').write_text('')
+
+    with pytest.raises(commit_graph.UnsupportedCommitError):
+        commit_graph.open_commits(tmp_path / '.git')
+
+
+@pytest.mark.parametrize('size', [0, 7, 100, -40])
+async def test_damaged_commit_graph_is_left_to_git(repo, tmp_path, size):
+    await repo('commit-graph', 'write', '--reachable')
+    path = tmp_path / '.git' / 'objects' / 'info' / 'commit-graph'
+    data = path.read_bytes()
+    path.chmod(0o644)
+    path.write_bytes(data[:size])
+
+    with pytest.raises(commit_graph.UnsupportedCommitError):
+        commit_graph.open_commits(tmp_path / '.git')
+    assert git._open_commits() is None
+    assert await git.is_ancestor('refs/heads/a', 'refs/heads/f')
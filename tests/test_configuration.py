@@ -20,9 +20,12 @@ def test_default_values():
     assert config.project.number is None
 
     assert config.workon.status == 'In Progress'
+    assert config.workon.worktree_dir is None
 
     assert config.deliver.policies.poll is True
 
+    assert config.fetch.freshness_seconds == 0
+
 
 def test_config_models_are_immutable():
     config = TtConfig()
@@ -81,6 +84,10 @@ def test_partial_override_retains_untouched_defaults():
             json.dumps({'deliver': {'policies': {'poll': 'yes'}}}),
             pytest.raises(ConfigValidationError),
         ),
+        (
+            json.dumps({'fetch': {'freshness_seconds': -1}}),
+            pytest.raises(ConfigValidationError),
+        ),
         (json.dumps({'unknown_field': 'should_be_ignored'}), does_not_raise()),
     ],
 )
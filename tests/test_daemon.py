@@ -0,0 +1,190 @@
+import asyncio
+import os
+from pathlib import Path
+
+import pytest
+from pytest_mock import MockerFixture
+
+from gh_tt import daemon_client
+from gh_tt.daemon import Daemon, DaemonError
+
+
+async def _send(path: Path, request: dict, fds: list[int] | None = None) -> dict | None:
+    def send():
+        with daemon_client.connect(path) as sock:
+            daemon_client.send_request(sock, request, fds=fds)
+            return daemon_client.read_response(sock)
+
+    return await asyncio.to_thread(send)
+
+
+@pytest.fixture
+async def running_daemon(tmp_path: Path):
+    server = Daemon(tmp_path / 'gh-tt' / 'daemon.sock', idle_timeout=10)
+    task = asyncio.create_task(server.serve())
+    # The socket is bound before serve() first yields to the event loop
+    await asyncio.sleep(0)
+
+    yield server
+
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+
+
+async def test_daemon_runs_command_with_client_stdio_cwd_and_env(
+    running_daemon: Daemon, tmp_path: Path, mocker: MockerFixture
+):
+    async def execute(_self, argv):
+        print(f'{argv} {Path.cwd()} {os.environ["GH_TT_TEST"]}')
+        return 3
+
+    mocker.patch.object(Daemon, '_execute', execute)
+    mocker.patch.object(Daemon, '_reset_caches')
+    stdout_read, stdout_write = os.pipe()
+    cwd = Path.cwd()
+
+    response = await _send(
+        running_daemon.path,
+        {'argv': ['semver'], 'cwd': str(tmp_path), 'env': {'GH_TT_TEST': 'from-client'}},
+        fds=[stdout_read, stdout_write, stdout_write],
+    )
+    os.close(stdout_write)
+
+    with os.fdopen(stdout_read) as stdout:
+        assert stdout.read() == f"['semver'] {tmp_path} from-client\n"
+    assert response == {'exit_code': 3}
+    assert Path.cwd() == cwd
+    assert 'GH_TT_TEST' not in os.environ
+
+
+async def test_daemon_turns_commands_away_while_one_runs(
+    running_daemon: Daemon, tmp_path: Path, mocker: MockerFixture
+):
+    started, finish = asyncio.Event(), asyncio.Event()
+
+    async def execute(_self, _argv):
+        started.set()
+        await finish.wait()
+        return 0
+
+    mocker.patch.object(Daemon, '_execute', execute)
+    mocker.patch.object(Daemon, '_reset_caches')
+    request = {'argv': ['deliver'], 'cwd': str(tmp_path), 'env': {}}
+    first = asyncio.create_task(_send(running_daemon.path, request, fds=[0, 1, 2]))
+    await started.wait()
+
+    assert await _send(running_daemon.path, request, fds=[0, 1, 2]) == {
+        'exit_code': daemon_client.EX_TEMPFAIL
+    }
+    assert (await _send(running_daemon.path, {'control': 'status'}))['requests_served'] == 0
+
+    finish.set()
+    assert await first == {'exit_code': 0}
+    assert running_daemon.requests_served == 1
+
+
+async def test_daemon_drops_clients_that_send_nothing(
+    running_daemon: Daemon, mocker: MockerFixture
+):
+    mocker.patch('gh_tt.daemon.REQUEST_TIMEOUT_SECONDS', 0.1)
+
+    def connect_silently():
+        with daemon_client.connect(running_daemon.path) as sock:
+            return daemon_client.read_response(sock)
+
+    assert await asyncio.wait_for(asyncio.to_thread(connect_silently), timeout=5) is None
+    assert (await _send(running_daemon.path, {'control': 'status'}))['pid'] == os.getpid()
+
+
+async def test_daemon_status_and_stop(tmp_path: Path):
+    server = Daemon(tmp_path / 'daemon.sock')
+    task = asyncio.create_task(server.serve())
+    await asyncio.sleep(0)
+
+    status = await _send(server.path, {'control': 'status'})
+    assert status['pid'] == os.getpid()
+    assert status['requests_served'] == 0
+
+    assert await _send(server.path, {'control': 'stop'}) == {'stopped': True}
+    await task
+    assert not server.path.exists()
+
+
+async def test_daemon_refuses_to_replace_a_running_daemon(running_daemon: Daemon):
+    with pytest.raises(DaemonError, match='already listening'):
+        await Daemon(running_daemon.path).serve()
+
+
+def test_forward_reports_unavailable_daemon(tmp_path: Path):
+    assert daemon_client.forward(tmp_path / 'missing.sock', ['semver']) == (
+        daemon_client.EX_TEMPFAIL
+    )
+
+
+async def test_client_only_connects_to_a_socket_only_the_user_can_access(
+    running_daemon: Daemon, tmp_path: Path, capsys
+):
+    running_daemon.path.parent.chmod(0o755)
+    with pytest.raises(PermissionError, match='only you can access'):
+        daemon_client.connect(running_daemon.path)
+
+    running_daemon.path.parent.chmod(0o700)
+    link = tmp_path / 'link'
+    link.symlink_to(running_daemon.path.parent)
+    with pytest.raises(PermissionError, match='only you can access'):
+        daemon_client.connect(link / 'daemon.sock')
+
+    assert daemon_client.forward(link / 'daemon.sock', ['semver']) == daemon_client.EX_TEMPFAIL
+    assert 'not using the daemon' in capsys.readouterr().err
+
+
+async def test_client_only_connects_to_a_daemon_of_the_user(
+    running_daemon: Daemon, mocker: MockerFixture
+):
+    mocker.patch.object(daemon_client, 'peer_uid', return_value=os.getuid() + 1)
+
+    with pytest.raises(PermissionError, match='served by user'):
+        daemon_client.connect(running_daemon.path)
+
+
+async def test_daemon_refuses_a_directory_of_another_user(tmp_path: Path, mocker: MockerFixture):
+    mocker.patch('gh_tt.daemon.os.getuid', return_value=os.getuid() + 1)
+
+    with pytest.raises(DaemonError, match='not a directory you own'):
+        await Daemon(tmp_path / 'daemon.sock').serve()
+
+
+def test_client_sends_only_the_environment_gh_tt_uses(monkeypatch):
+    monkeypatch.setenv('GH_HOST', 'github.example.com')
+    monkeypatch.setenv('GIT_AUTHOR_NAME', 'name')
+    monkeypatch.setenv('AWS_SECRET_ACCESS_KEY', 'secret')
+
+    env = daemon_client.forwarded_env()
+
+    assert env['GH_HOST'] == 'github.example.com'
+    assert env['GIT_AUTHOR_NAME'] == 'name'
+    assert env['PATH'] == os.environ['PATH']
+    assert 'AWS_SECRET_ACCESS_KEY' not in env
+
+
+def test_repo_caches_are_kept_within_a_repository(tmp_path: Path, mocker: MockerFixture):
+    get_issue = mocker.patch('gh_tt.commands.gh.get_issue', new=mocker.MagicMock())
+    get_repo = mocker.patch('gh_tt.commands.gh.get_repo', new=mocker.MagicMock())
+    for repo in ('one', 'two'):
+        (tmp_path / repo / '.git').mkdir(parents=True)
+        (tmp_path / repo / 'src').mkdir()
+    server = Daemon(tmp_path / 'daemon.sock')
+
+    server._reset_caches(tmp_path / 'one')
+    server._reset_caches(tmp_path / 'one' / 'src')
+    assert get_repo.cache_clear.call_count == 1
+    assert get_issue.cache_clear.call_count == 2
+
+    server._reset_caches(tmp_path / 'two')
+    assert get_repo.cache_clear.call_count == 2
+
+    # Repositories git_refs cannot read are not told apart, so their caches are not kept
+    (tmp_path / 'two' / '.git' / 'reftable').mkdir()
+    server._reset_caches(tmp_path / 'two')
+    server._reset_caches(tmp_path / 'two')
+    assert get_repo.cache_clear.call_count == 4
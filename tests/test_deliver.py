@@ -1,3 +1,4 @@
+import asyncio
 from pathlib import Path
 
 import pytest
@@ -6,10 +7,10 @@ from hypothesis import provisional as hypothesis_provisional
 from hypothesis import strategies as st
 from pydantic import HttpUrl
 
-from gh_tt.commands import gh, shell
+from gh_tt.commands import gh, git, shell
 from gh_tt.commands.gh import Commit
 from gh_tt.commands.git import PR_START_COMMIT_HEADLINE
-from gh_tt.deliver import _build_merge_body
+from gh_tt.deliver import DeliverError, _build_merge_body, deliver
 from tests.env_builder import IntegrationEnv
 
 st.register_type_strategy(HttpUrl, hypothesis_provisional.urls().map(HttpUrl))
@@ -36,6 +37,33 @@ def test_merge_body_includes_skip_ci_outside_of_first_commit(pr: gh.PullRequest)
     assert '[skip ci]' in body
 
 
+async def test_deliver_fetches_the_current_branch_while_looking_up_the_default_branch(mocker):
+    default_branch_asked = asyncio.Event()
+    current_branch_fetched = asyncio.Event()
+
+    async def get_default_branch():
+        default_branch_asked.set()
+        await current_branch_fetched.wait()
+        return 'main'
+
+    async def fetch(*, branches, **_):
+        if branches == ['7-feature']:
+            current_branch_fetched.set()
+        else:
+            assert current_branch_fetched.is_set()
+
+    mocker.patch.object(git, 'get_current_branch_name', return_value='7-feature')
+    mocker.patch.object(git, 'get_remote', return_value='origin')
+    mocker.patch.object(gh, 'get_default_branch', side_effect=get_default_branch)
+    fetch = mocker.patch.object(git, 'fetch', side_effect=fetch)
+    mocker.patch.object(git, 'get_branch_status', side_effect=DeliverError('stop here'))
+
+    with pytest.raises(DeliverError, match='stop here'):
+        await deliver(delete_branch=False)
+
+    assert [call.kwargs['branches'] for call in fetch.call_args_list] == [['7-feature'], ['main']]
+
+
 @pytest.mark.usefixtures('check_end_to_end_env')
 async def test_workon_deliver_flow_success():
     async with (
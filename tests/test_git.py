@@ -0,0 +1,482 @@
+import asyncio
+import fcntl
+import json
+import time
+from collections.abc import Callable
+from pathlib import Path
+
+import pytest
+
+from gh_tt.commands import git, git_refs, shell
+
+
+@pytest.mark.parametrize(
+    ('change', 'expected'),
+    [
+        ('', False),
+        ('echo untracked > untracked', False),
+        ('echo tracked >> tracked', True),
+        ('echo tracked >> tracked && git add tracked', True),
+        # Staged, then changed back in the working tree only
+        ('echo tracked >> tracked && git add tracked && echo tracked > tracked', True),
+        ('git rm -q --cached tracked', True),
+        ('touch -d "2001-01-01" tracked', False),
+    ],
+)
+async def test_has_changes_to_tracked_files(repo, tmp_path, mocker, change, expected):
+    (tmp_path / 'tracked').write_text('tracked\n')
+    await repo('add', 'tracked')
+    await repo('commit', '-q', '-m', 'tracked')
+    if change:
+        await shell.run(['sh', '-c', change])
+    run = mocker.spy(shell, 'run')
+
+    assert await git.has_changes_to_tracked_files() is expected
+    assert all(call.kwargs['env'] == {'GIT_OPTIONAL_LOCKS': '0'} for call in run.call_args_list)
+
+
+async def test_check_branch_exists_prefers_local_branches(repo):
+    await repo('branch', '7-local')
+    await repo('update-ref', 'refs/remotes/origin/7-remote', 'HEAD')
+
+    assert await git.check_branch_exists(7) == git.CheckBranchExistsResult('local', '7-local')
+
+
+async def test_check_branch_exists_finds_remote_branches(repo):
+    await repo('branch', '17-other-issue')
+    await repo('update-ref', 'refs/remotes/origin/7-remote', 'HEAD')
+
+    assert await git.check_branch_exists(7) == git.CheckBranchExistsResult('remote', '7-remote')
+
+
+async def test_check_branch_exists_without_a_branch(repo):
+    await repo('branch', '17-other-issue')
+
+    assert await git.check_branch_exists(7) is None
+
+
+async def test_check_branch_exists_asks_git_for_the_issue_branches_only(repo, monkeypatch, mocker):
+    monkeypatch.setattr(git_refs, 'reader', lambda: None)
+    await repo('branch', '17-other-issue')
+    await repo('update-ref', 'refs/remotes/origin/7-remote', 'HEAD')
+    run = mocker.spy(shell, 'run')
+
+    assert await git.check_branch_exists(7) == git.CheckBranchExistsResult('remote', '7-remote')
+    run.assert_called_once_with(
+        ['git', 'for-each-ref', '--format=%(refname)', 'refs/heads/7-*', 'refs/remotes/*/7-*']
+    )
+
+
+async def test_get_branch_tip_hash_resolves_over_one_process(repo, monkeypatch):
+    # As for repositories git_refs cannot read
+    monkeypatch.setattr(git_refs, 'reader', lambda: None)
+    await repo('update-ref', 'refs/remotes/origin/main', 'HEAD')
+    head = (await shell.run(['git', 'rev-parse', 'HEAD'])).stdout
+
+    try:
+        tips = await asyncio.gather(
+            git.get_branch_tip_hash('HEAD'),
+            git.get_branch_tip_hash('main'),
+            git.get_branch_tip_hash('main', remote='origin'),
+        )
+        assert tips == [head] * 3
+        assert len(git._batch_checks) == 1
+    finally:
+        await git.close_batch_checks()
+
+    assert git._batch_checks == {}
+
+
+@pytest.mark.usefixtures('repo')
+async def test_get_branch_tip_hash_of_a_missing_ref():
+    try:
+        with pytest.raises(shell.ShellError, match='unknown revision'):
+            await git.get_branch_tip_hash('main', remote='origin')
+    finally:
+        await git.close_batch_checks()
+
+
+async def _commit(repo, message: str):
+    await repo('commit', '-q', '--allow-empty', '-m', message)
+
+
+@pytest.mark.parametrize(
+    ('ahead_behind_supported', 'commits'), [(None, None), (False, None), (False, 'native')]
+)
+async def test_compare_refs(repo, monkeypatch, ahead_behind_supported, commits):
+    if commits is None:
+        # Counted by git, as for repositories commit_graph cannot read
+        monkeypatch.setattr(git, '_open_commits', lambda: None)
+    # None tries %(ahead-behind:) first, False goes straight to the rev-list fallback
+    monkeypatch.setattr(git, '_ahead_behind_supported', ahead_behind_supported)
+    await repo('update-ref', 'refs/remotes/origin/main', 'HEAD')
+    await repo('switch', '-q', '-c', '7-feature')
+    await _commit(repo, 'feature')
+    await repo('update-ref', 'refs/remotes/origin/7-feature', 'HEAD')
+    await _commit(repo, 'unpushed')
+    await repo('switch', '-q', 'main')
+    await _commit(repo, 'main')
+    await repo('update-ref', 'refs/remotes/origin/main', 'HEAD')
+    tip = (await shell.run(['git', 'rev-parse', '7-feature'])).stdout
+
+    try:
+        refs = await git.compare_refs(
+            ['refs/heads/7-feature', 'refs/remotes/origin/7-feature', 'refs/heads/missing'],
+            base='refs/remotes/origin/main',
+        )
+    finally:
+        await git.close_batch_checks()
+
+    assert refs == {
+        'refs/heads/7-feature': git.RefStatus(tip, ahead=2, behind=1),
+        'refs/remotes/origin/7-feature': git.RefStatus(
+            refs['refs/remotes/origin/7-feature'].object_name, ahead=1, behind=1
+        ),
+    }
+
+
+async def test_compare_refs_with_ahead_behind(mocker, monkeypatch):
+    monkeypatch.setattr(git, '_ahead_behind_supported', None)
+    mocker.patch(
+        'gh_tt.commands.git.resolve_refs',
+        return_value={
+            'refs/remotes/origin/main': 'base',
+            'refs/heads/main': 'abc',
+            'refs/heads/x': 'ghi',
+        },
+    )
+    run = mocker.patch(
+        'gh_tt.commands.shell.run',
+        return_value=shell.ShellResult(
+            stdout='refs/heads/main abc 0 3\nrefs/heads/main/nested def 1 0\nrefs/heads/x ghi 2 0',
+            stderr='',
+            return_code=0,
+        ),
+    )
+
+    refs = await git.compare_refs(
+        ['refs/heads/main', 'refs/heads/x'], base='refs/remotes/origin/main'
+    )
+
+    assert refs == {
+        'refs/heads/main': git.RefStatus('abc', ahead=0, behind=3),
+        'refs/heads/x': git.RefStatus('ghi', ahead=2, behind=0),
+    }
+    assert (
+        run.call_args.args[0][2]
+        == '--format=%(refname) %(objectname) %(ahead-behind:refs/remotes/origin/main)'
+    )
+    assert git._ahead_behind_supported is True
+
+
+@pytest.fixture
+async def remote(repo, tmp_path_factory):
+    """A bare clone of `repo` as its origin, with branches and a tag `repo` has not fetched."""
+    path = tmp_path_factory.mktemp('remote') / 'remote.git'
+    await repo('clone', '-q', '--bare', '.', str(path))
+    await repo('remote', 'add', 'origin', str(path))
+
+    async def run(*args: str):
+        await shell.run(['git', *args], cwd=path)
+
+    for branch in ('7-feature', '8-other'):
+        await run('branch', branch, 'main')
+    await run('tag', '1.0.0', 'main')
+    git.get_remote.cache_clear()
+    return run
+
+
+async def _refs(*patterns: str) -> list[str]:
+    result = await shell.run(['git', 'for-each-ref', '--format=%(refname)', *patterns])
+    return result.stdout.splitlines()
+
+
+@pytest.mark.usefixtures('remote')
+async def test_fetch_only_the_branches_and_tags_asked_for(mocker):
+    run = mocker.spy(shell, 'run')
+
+    try:
+        await asyncio.gather(git.fetch(branches=['main', '7-*']), git.fetch(tags=True))
+        # Fetched already in this invocation
+        await git.fetch(branches=['main'])
+    finally:
+        git.forget_fetches()
+
+    assert await _refs('refs/remotes/', 'refs/tags/') == [
+        'refs/remotes/origin/7-feature',
+        'refs/remotes/origin/main',
+        'refs/tags/1.0.0',
+    ]
+    fetches = [call.args[0] for call in run.call_args_list if call.args[0][1] == 'fetch']
+    assert fetches == [
+        [
+            'git',
+            'fetch',
+            '--no-tags',
+            'origin',
+            '+refs/heads/7-*:refs/remotes/origin/7-*',
+            '+refs/heads/main:refs/remotes/origin/main',
+            git.TAGS_REFSPEC,
+        ]
+    ]
+
+
+@pytest.mark.usefixtures('remote')
+async def test_fetch_without_the_branches_missing_on_the_remote():
+    try:
+        await git.fetch(branches=['main', '9-not-pushed'])
+    finally:
+        git.forget_fetches()
+
+    assert await _refs('refs/remotes/') == ['refs/remotes/origin/main']
+
+
+@pytest.mark.usefixtures('remote')
+async def test_fetch_skips_the_refs_fetched_within_the_freshness_window(mocker):
+    try:
+        await git.fetch(branches=['7-*'])
+        git.forget_fetches()
+        run = mocker.spy(shell, 'run')
+        await git.fetch(branches=['7-*'], freshness_seconds=60)
+        run.assert_not_called()
+
+        # Another fetch within the window does not make the other refs fresh
+        await git.fetch(branches=['7-*', 'main'], freshness_seconds=60)
+    finally:
+        git.forget_fetches()
+
+    fetches = [call.args[0] for call in run.call_args_list if call.args[0][1] == 'fetch']
+    assert fetches == [
+        ['git', 'fetch', '--no-tags', 'origin', '+refs/heads/main:refs/remotes/origin/main']
+    ]
+    assert await _refs('refs/remotes/') == [
+        'refs/remotes/origin/7-feature',
+        'refs/remotes/origin/main',
+    ]
+
+
+@pytest.mark.usefixtures('remote')
+async def test_fetch_reports_the_command_that_failed():
+    await shell.run(['git', 'remote', 'set-url', 'origin', 'does-not-exist'])
+
+    try:
+        with pytest.raises(shell.ShellError) as e:
+            await git.fetch(branches=['main'])
+    finally:
+        git.forget_fetches()
+
+    assert e.value.cmd == [
+        'git',
+        'fetch',
+        '--no-tags',
+        'origin',
+        '+refs/heads/main:refs/remotes/origin/main',
+    ]
+
+
+@pytest.mark.usefixtures('remote')
+async def test_fetch_again_after_a_cancelled_fetch(mocker):
+    started = asyncio.Event()
+
+    async def hang(_remote, _refspecs):
+        started.set()
+        await asyncio.Event().wait()
+
+    coordinator = git._fetch_coordinator()
+    try:
+        mocker.patch.object(coordinator, '_run', side_effect=hang)
+        first = asyncio.create_task(git.fetch(branches=['main']))
+        await started.wait()
+        # As when a daemon command is cancelled on a client disconnect
+        coordinator._fetches['+refs/heads/main:refs/remotes/origin/main'].cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await first
+
+        mocker.patch.object(coordinator, '_run', new=mocker.AsyncMock())
+        await git.fetch(branches=['main'])
+        coordinator._run.assert_awaited_once()
+    finally:
+        git.forget_fetches()
+
+
+async def _hold_fetch_lock(fetched: dict[str, list[str]] | None) -> Callable[[], None]:
+    """Locks the fetch lock file the way another gh-tt process does, returns the unlock.
+
+    The unlock records the refspecs in `fetched`, by remote, as fetched.
+    """
+    f = Path('.git/gh-tt-fetch.lock').open('a+')  # noqa: ASYNC230, SIM115
+    fcntl.flock(f, fcntl.LOCK_EX)
+
+    def release():
+        if fetched is not None:
+            now = time.time()
+            fetches = {remote: dict.fromkeys(refspecs, now) for remote, refspecs in fetched.items()}
+            f.write(json.dumps({'fetches': fetches}))
+            f.flush()
+        fcntl.flock(f, fcntl.LOCK_UN)
+        f.close()
+
+    return release
+
+
+@pytest.mark.parametrize(
+    ('fetched', 'fetches'),
+    [
+        ({'origin': ['a', 'b']}, 0),
+        ({git.ALL_REMOTES: sorted(git.ALL_REFSPECS)}, 0),
+        ({'origin': ['b']}, 1),
+        ({'upstream': ['a', 'b']}, 1),
+        (None, 1),
+    ],
+)
+@pytest.mark.usefixtures('repo')
+async def test_fetch_exclusively_reuses_the_fetch_of_another_process(mocker, fetched, fetches):
+    release = await _hold_fetch_lock(fetched)
+    fetch = mocker.AsyncMock()
+
+    task = asyncio.create_task(git.fetch_exclusively('origin', {'a', 'b'}, fetch))
+    await asyncio.sleep(git.FETCH_LOCK_POLL_SECONDS * 2)
+    assert not task.done()
+    fetch.assert_not_called()
+
+    release()
+    await task
+
+    assert fetch.await_count == fetches
+
+
+@pytest.mark.usefixtures('repo')
+async def test_fetch_exclusively_records_its_fetch(mocker):
+    fetch = mocker.AsyncMock()
+
+    await git.fetch_exclusively('origin', {'b', 'a'}, fetch)
+
+    await git.fetch_exclusively('upstream', {'a'}, fetch)
+
+    assert fetch.await_count == 2
+    record = json.loads(Path('.git/gh-tt-fetch.lock').read_text())  # noqa: ASYNC240
+    assert {remote: sorted(times) for remote, times in record['fetches'].items()} == {
+        'origin': ['a', 'b'],
+        'upstream': ['a'],
+    }
+
+
+@pytest.mark.parametrize(
+    ('ahead_behind_supported', 'commits'), [(None, None), (False, None), (False, 'native')]
+)
+async def test_get_branch_status(repo, monkeypatch, ahead_behind_supported, commits):
+    if commits is None:
+        # Counted by git, as for repositories commit_graph cannot read
+        monkeypatch.setattr(git, '_open_commits', lambda: None)
+    monkeypatch.setattr(git, '_ahead_behind_supported', ahead_behind_supported)
+    await repo('switch', '-q', '-c', '7-feature')
+    await _commit(repo, 'feature')
+    await repo('update-ref', 'refs/remotes/origin/7-feature', 'HEAD')
+    await _commit(repo, 'unpushed')
+    await repo('switch', '-q', 'main')
+    await _commit(repo, 'main')
+    await repo('update-ref', 'refs/remotes/origin/main', 'HEAD')
+    await repo('switch', '-q', '7-feature')
+    head = (await shell.run(['git', 'rev-parse', 'HEAD'])).stdout
+
+    try:
+        status = await git.get_branch_status('origin', 'main', '7-feature')
+        missing = await git.get_branch_status('origin', 'main', '8-not-pushed')
+    finally:
+        await git.close_batch_checks()
+
+    assert status == git.BranchStatus(
+        head=head,
+        default=git.Divergence(ahead=2, behind=1),
+        upstream=git.Divergence(ahead=1, behind=0),
+    )
+    assert missing.upstream is None
+
+
+async def test_get_branch_status_counts_nothing_at_the_same_commit(repo, monkeypatch, mocker):
+    monkeypatch.setattr(git, '_ahead_behind_supported', False)
+    await repo('update-ref', 'refs/remotes/origin/main', 'HEAD')
+    run = mocker.spy(shell, 'run')
+
+    try:
+        status = await git.get_branch_status('origin', 'main', 'main')
+    finally:
+        await git.close_batch_checks()
+
+    assert status.default == status.upstream == git.Divergence(ahead=0, behind=0)
+    run.assert_not_called()
+
+
+@pytest.mark.parametrize(
+    ('divergence', 'description'),
+    [
+        (git.Divergence(ahead=0, behind=0), 'up to date'),
+        (git.Divergence(ahead=0, behind=3), '3 commits behind'),
+        (git.Divergence(ahead=1, behind=2), '1 commit ahead, 2 commits behind'),
+    ],
+)
+def test_divergence_describe(divergence: git.Divergence, description: str):
+    assert divergence.describe() == description
+
+
+@pytest.mark.usefixtures('remote')
+async def test_push_pr_start_commit_leaves_the_working_tree_alone(tmp_path):
+    (tmp_path / 'staged').write_text('staged')
+    (tmp_path / 'untracked').write_text('untracked')
+    await shell.run(['git', 'add', 'staged'])
+    await shell.run(['git', 'switch', '-q', '-c', '7-feature'])
+    status = await shell.run(['git', 'status', '--porcelain'])
+    parent = await git.get_branch_tip_hash('HEAD')
+
+    await git.push_pr_start_commit('7-feature')
+
+    assert (await shell.run(['git', 'status', '--porcelain'])).stdout == status.stdout
+    assert not (await shell.run(['git', 'stash', 'list'])).stdout
+    commit = await shell.run(['git', 'log', '-1', '--format=%P %T %s', '7-feature'])
+    tree = await shell.run(['git', 'rev-parse', f'{parent}^{{tree}}'])
+    assert commit.stdout == f'{parent} {tree.stdout} {git.PR_START_COMMIT_HEADLINE}'
+    assert await git.get_branch_tip_hash('7-feature', remote='origin') == (
+        await git.get_branch_tip_hash('HEAD')
+    )
+
+
+@pytest.mark.usefixtures('remote')
+async def test_push_pr_start_commit_on_a_branch_that_is_not_checked_out():
+    await git.fetch(branches=['7-feature'])
+    head = await git.get_branch_tip_hash('HEAD')
+
+    await git.push_pr_start_commit('7-feature', remote='origin')
+
+    assert await git.get_current_branch_name() == 'main'
+    assert await git.get_branch_tip_hash('HEAD') == head
+    commit = await shell.run(['git', 'log', '-1', '--format=%P %s', '7-feature'])
+    assert commit.stdout == f'{head} {git.PR_START_COMMIT_HEADLINE}'
+    upstream = await shell.run(['git', 'rev-parse', '--abbrev-ref', '7-feature@{upstream}'])
+    assert upstream.stdout == 'origin/7-feature'
+    with pytest.raises(shell.ShellError):
+        # The branch exists now
+        await git.push_pr_start_commit('7-feature', remote='origin')
+
+
+@pytest.mark.usefixtures('remote')
+async def test_worktrees(tmp_path_factory):
+    await git.fetch(branches=['7-feature', '8-other'])
+    directory = tmp_path_factory.mktemp('worktrees')
+    main = (await git.list_worktrees())[0]
+
+    await git.add_worktree(directory / '7-feature', '7-feature', remote='origin')
+    await shell.run(['git', 'branch', '8-other', 'origin/8-other'])
+    await git.add_worktree(directory / '8-other', '8-other')
+    await shell.run(['git', 'worktree', 'add', '-q', '--detach', str(directory / 'detached')])
+
+    assert await git.list_worktrees() == [
+        main,
+        git.Worktree(directory / '7-feature', '7-feature'),
+        git.Worktree(directory / '8-other', '8-other'),
+        git.Worktree(directory / 'detached', None),
+    ]
+    assert main.branch == 'main'
+    upstream = await shell.run(
+        ['git', 'rev-parse', '--abbrev-ref', '7-feature@{upstream}'], cwd=directory / '7-feature'
+    )
+    assert upstream.stdout == 'origin/7-feature'
@@ -0,0 +1,228 @@
+import mmap
+from pathlib import Path
+
+import pytest
+from hypothesis import given
+from hypothesis import strategies as st
+
+from gh_tt import cassette
+from gh_tt.commands import gh, git, git_refs, shell
+
+
+@pytest.fixture
+async def repo(repo):
+    """The repository of conftest, with a branch, an annotated tag and a remote."""
+    await repo('branch', '7-feature')
+    await repo('tag', '-a', 'v1', '-m', 'v1')
+    await repo('update-ref', 'refs/remotes/origin/main', 'HEAD')
+    await repo('symbolic-ref', 'refs/remotes/origin/HEAD', 'refs/remotes/origin/main')
+    await repo('remote', 'add', 'origin', 'https://github.com/org/repo.git')
+    return repo
+
+
+async def _assert_reads_like_git(run):
+    reader = git_refs.reader()
+    assert reader is not None
+
+    assert reader.root == Path(await run('rev-parse', '--show-toplevel'))
+    for name in ('HEAD', 'main', 'v1', 'origin/main', 'origin', 'refs/heads/7-feature'):
+        assert reader.resolve(name) == await run('rev-parse', name), name
+    assert reader.resolve('missing') is None
+
+    for prefix in ('refs/heads/', 'refs/remotes/', 'refs/tags/'):
+        listed = await run(
+            'for-each-ref', '--format=%(refname) %(refname:short) %(objectname)', prefix
+        )
+        assert [
+            f'{ref} {reader.short_name(ref)} {name}'
+            for ref, name in reader.list_refs(prefix).items()
+        ] == listed.splitlines()
+
+
+async def test_reads_loose_refs_like_git(repo):
+    await _assert_reads_like_git(repo)
+
+
+async def test_reads_packed_refs_like_git(repo):
+    await repo('pack-refs', '--all')
+
+    await _assert_reads_like_git(repo)
+
+
+async def test_loose_refs_take_precedence_over_packed_refs(repo):
+    await repo('pack-refs', '--all')
+    await repo('commit', '-q', '--allow-empty', '-m', 'next')
+
+    await _assert_reads_like_git(repo)
+
+
+async def test_lists_refs_by_name_prefix_like_git(repo):
+    for kind in ('heads', 'remotes/origin'):
+        for n in range(12):
+            await repo('update-ref', f'refs/{kind}/{n}-branch', 'HEAD')
+    await repo('pack-refs', '--all')
+    await repo('branch', '2-loose')
+    reader = git_refs.reader()
+    assert reader is not None
+
+    listed = await repo('for-each-ref', '--format=%(refname) %(objectname)')
+    for prefix in (
+        'refs/heads/1',
+        'refs/heads/2-',
+        'refs/remotes/origin/1',
+        'refs/heads/x',
+        'refs/',
+    ):
+        expected = [line for line in listed.splitlines() if line.startswith(prefix)]
+        assert [f'{ref} {name}' for ref, name in reader.list_refs(prefix).items()] == expected
+
+
+@given(
+    refnames=st.sets(st.text('ab/-', min_size=1, max_size=6)),
+    prefix=st.text('ab/-', max_size=3),
+)
+def test_packed_refs_lookup_by_prefix(tmp_path_factory, refnames: set[str], prefix: str):
+    lines = [b'# pack-refs with: peeled fully-peeled sorted \n']
+    for i, refname in enumerate(sorted(refnames)):
+        lines.append(f'{i:040x} refs/{refname}\n'.encode())
+        if i % 2:
+            # As written for annotated tags
+            lines.append(f'^{i:040x}\n'.encode())
+    path = tmp_path_factory.mktemp('packed') / 'packed-refs'
+    path.write_bytes(b''.join(lines))
+
+    with path.open('rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        refs = git_refs.RefReader._parse_packed_refs(data, f'refs/{prefix}'.encode())
+
+    assert sorted(refs) == sorted(f'refs/{r}' for r in refnames if r.startswith(prefix))
+
+
+@given(
+    refnames=st.sets(st.text('ab/-', min_size=1, max_size=6)),
+    refname=st.text('ab/-', min_size=1, max_size=6),
+)
+def test_packed_refs_lookup_by_name(tmp_path_factory, refnames: set[str], refname: str):
+    lines = [b'# pack-refs with: peeled fully-peeled sorted \n']
+    for i, name in enumerate(sorted(refnames)):
+        lines.append(f'{i:040x} refs/{name}\n'.encode())
+        if i % 2:
+            lines.append(f'^{i:040x}\n'.encode())
+    path = tmp_path_factory.mktemp('packed') / 'packed-refs'
+    path.write_bytes(b''.join(lines))
+
+    with path.open('rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        object_name = git_refs.RefReader._find_packed_ref(data, f'refs/{refname}'.encode())
+
+    expected = sorted(refnames).index(refname) if refname in refnames else None
+    assert object_name == (None if expected is None else f'{expected:040x}'.encode())
+
+
+async def test_short_names_stay_unambiguous(repo):
+    await repo('branch', 'v1')
+    reader = git_refs.reader()
+    assert reader is not None
+
+    assert reader.short_name('refs/heads/v1') == await repo(
+        'for-each-ref', '--format=%(refname:short)', 'refs/heads/v1'
+    )
+
+
+async def test_reads_the_head_of_a_linked_worktree(repo, tmp_path, monkeypatch):
+    worktree = tmp_path / 'worktree'
+    await repo('worktree', 'add', '-q', str(worktree), '7-feature')
+    monkeypatch.chdir(worktree)
+
+    reader = git_refs.reader()
+    assert reader is not None
+    assert reader.root == worktree
+    assert reader.current_branch() == '7-feature'
+    assert reader.list_refs('refs/heads/').keys() == {'refs/heads/7-feature', 'refs/heads/main'}
+    assert await git.get_current_branch_name() == '7-feature'
+
+
+async def test_git_functions_read_natively(repo, mocker):
+    await repo('switch', '-q', '--detach')
+    main = await repo('rev-parse', 'main')
+    git.get_remote.cache_clear()
+    run = mocker.spy(shell, 'run')
+    stream = mocker.spy(shell, 'stream_lines')
+
+    assert await git.get_current_branch_name() == 'HEAD'
+    assert await git.get_remote() == 'origin'
+    assert await git.get_branch_tip_hash('main', remote='origin') == main
+    assert await git.check_branch_exists(7) == git.CheckBranchExistsResult('local', '7-feature')
+
+    run.assert_not_called()
+    stream.assert_not_called()
+
+
+@pytest.mark.usefixtures('repo')
+async def test_default_branch_from_the_remote_head(mocker):
+    git.get_remote.cache_clear()
+    get_repo = mocker.patch.object(gh, 'get_repo')
+
+    assert await gh.get_default_branch() == 'main'
+    get_repo.assert_not_called()
+
+
+async def test_default_branch_after_a_rename_is_asked_from_github(repo, mocker):
+    # As left behind by a pruning fetch after the default branch was renamed on GitHub
+    await repo('symbolic-ref', 'refs/remotes/origin/HEAD', 'refs/remotes/origin/master')
+    git.get_remote.cache_clear()
+    get_repo = mocker.patch.object(gh, 'get_repo', return_value=mocker.Mock(default_branch='main'))
+
+    assert await gh.get_default_branch() == 'main'
+    get_repo.assert_awaited_once()
+
+
+async def test_unborn_branch_is_left_to_git(tmp_path, monkeypatch):
+    await shell.run(['git', 'init', '-q', '-b', 'main'], cwd=tmp_path)
+    monkeypatch.chdir(tmp_path)
+
+    with pytest.raises(shell.ShellError):
+        await git.get_current_branch_name()
+
+
+async def test_reftable_is_left_to_git(repo):
+    await repo('config', 'extensions.refStorage', 'reftable')
+
+    assert git_refs.reader() is None
+
+
+async def test_bare_repository_is_left_to_git(repo):
+    await repo('config', 'core.bare', 'true')
+
+    assert git_refs.reader() is None
+
+
+async def test_git_directory_is_left_to_git(repo, tmp_path, monkeypatch):
+    # Inside the working tree of `repo`, which git_refs must not pick instead
+    await repo('clone', '-q', '--bare', '.', 'inner.git')
+    await repo('init', '-q', '--bare', 'modules/sub')
+
+    for cwd in (tmp_path / '.git' / 'refs', tmp_path / 'inner.git', tmp_path / 'modules' / 'sub'):
+        monkeypatch.chdir(cwd)
+        assert git_refs.reader() is None, cwd
+
+
+@pytest.mark.usefixtures('repo')
+async def test_git_dir_in_the_environment_is_left_to_git(monkeypatch):
+    monkeypatch.setenv('GIT_DIR', '.git')
+
+    assert git_refs.reader() is None
+
+
+@pytest.mark.usefixtures('repo')
+async def test_not_read_while_recording(tmp_path):
+    with cassette.recording(tmp_path / 'cassette.jsonl', replay=None):
+        assert git_refs.reader() is None
+
+
+@pytest.mark.usefixtures('repo')
+async def test_revision_expressions_are_left_to_git():
+    reader = git_refs.reader()
+    assert reader is not None
+
+    for name in ('HEAD~1', 'main^{commit}', '@{u}', 'ORIG_HEAD', 'a' * 40):
+        with pytest.raises(git_refs.UnsupportedRepositoryError):
+            reader.resolve(name)
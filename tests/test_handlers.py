@@ -2,18 +2,31 @@ import argparse
 
 import pytest
 
-from gh_tt.cli.tt_handlers import handle_deliver, handle_workon
+from gh_tt import daemon, self_commands
+from gh_tt.cli.tt_handlers import handle_deliver, handle_self, handle_workon
+from gh_tt.configuration import TtConfig
 
 
-def test_workon_aborts_without_pr_workflow():
+async def test_workon_aborts_without_pr_workflow():
     args = argparse.Namespace(command='workon', pr_workflow=False)
 
     with pytest.raises(SystemExit):
-        handle_workon(args)
+        await handle_workon(args, TtConfig())
 
 
-def test_deliver_aborts_without_pr_workflow():
+async def test_deliver_aborts_without_pr_workflow():
     args = argparse.Namespace(command='deliver', pr_workflow=False)
 
     with pytest.raises(SystemExit):
-        handle_deliver(args)
+        await handle_deliver(args, TtConfig())
+
+
+async def test_self_upgrade_stops_the_daemon_before_replacing_the_extension(mocker, capsys):
+    calls = mocker.Mock()
+    mocker.patch.object(daemon, 'stop', side_effect=lambda: calls.stop() or True)
+    mocker.patch.object(self_commands, 'upgrade', side_effect=lambda **_: calls.upgrade())
+
+    await handle_self(argparse.Namespace(self_command='upgrade', pin='stable'))
+
+    assert [call[0] for call in calls.mock_calls] == ['stop', 'upgrade']
+    assert 'Stopped the gh-tt daemon' in capsys.readouterr().out
@@ -0,0 +1,56 @@
+import importlib._bootstrap as bootstrap
+import sys
+
+from gh_tt.importtime import ImportTimer
+
+
+def test_import_timer_reports_nested_imports(tmp_path, monkeypatch):
+    (tmp_path / 'tt_outer_module.py').write_text('import tt_inner_module\n')
+    (tmp_path / 'tt_inner_module.py').write_text('VALUE = 1\n')
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.delitem(sys.modules, 'tt_outer_module', raising=False)
+    monkeypatch.delitem(sys.modules, 'tt_inner_module', raising=False)
+
+    timer = ImportTimer()
+    timer.install()
+    try:
+        import tt_outer_module  # noqa: F401
+    finally:
+        timer.uninstall()
+
+    names = [r.name for r in timer.records]
+    assert names.index('tt_inner_module') < names.index('tt_outer_module'), (
+        'Expected nested imports to be reported before the importing module'
+    )
+
+    outer = next(r for r in timer.records if r.name == 'tt_outer_module')
+    inner = next(r for r in timer.records if r.name == 'tt_inner_module')
+    assert inner.depth == outer.depth + 1
+    assert outer.cumulative_ns >= inner.cumulative_ns
+    assert outer.self_ns == outer.cumulative_ns - inner.cumulative_ns
+
+    report = timer.report()
+    assert report.startswith('import time: self [us] | cumulative | imported package')
+    assert '|   tt_inner_module' in report
+
+
+def test_uninstall_restores_import_system():
+    original = bootstrap._find_and_load
+    timer = ImportTimer()
+
+    timer.install()
+    timer.uninstall()
+
+    assert bootstrap._find_and_load is original
+
+
+def test_install_without_the_import_hook_measures_nothing(monkeypatch):
+    timer = ImportTimer()
+
+    monkeypatch.delattr(bootstrap, '_find_and_load')
+    installed = timer.install()
+    monkeypatch.undo()
+
+    assert installed is False
+    timer.uninstall()
+    assert timer.records == []
@@ -1,6 +1,13 @@
+import argparse
+import asyncio
+import sys
+
 import pytest
+from pytest_mock import MockerFixture
 
-from gh_tt.__main__ import is_version_sufficient, parse_version
+from gh_tt.__main__ import dispatch, is_version_sufficient, parse_version, preflight_checks
+from gh_tt.configuration import ProjectConfig, TtConfig
+from gh_tt.preflight import PreflightError
 
 
 @pytest.mark.parametrize(
@@ -30,3 +37,76 @@ def test_parse_version(version, expected):
 )
 def test_is_version_sufficient(actual, required, expected):
     assert is_version_sufficient(actual, required) == expected
+
+
+async def test_dispatch_starts_handler_before_checks_finish(mocker: MockerFixture):
+    checks_done = asyncio.Event()
+    handler_started_early = False
+
+    async def checks():
+        await asyncio.sleep(0.01)
+        checks_done.set()
+
+    async def handler(_args, _config, gate):
+        nonlocal handler_started_early
+        handler_started_early = not checks_done.is_set()
+        await gate.wait()
+        assert checks_done.is_set(), 'Expected the gate to wait for the checks'
+
+    mocker.patch.dict('gh_tt.__main__.COMMAND_HANDLERS', {'workon': handler})
+    args = argparse.Namespace(command='workon')
+
+    await dispatch(args, TtConfig(), asyncio.ensure_future(checks()))
+
+    assert handler_started_early
+
+
+async def test_dispatch_cancels_handler_when_checks_fail(mocker: MockerFixture, capsys):
+    mutated = False
+
+    async def checks():
+        raise PreflightError('gh version 2.0.0 is not supported')
+
+    async def handler(_args, _config, gate):
+        nonlocal mutated
+        await gate.wait()
+        mutated = True
+
+    mocker.patch.dict('gh_tt.__main__.COMMAND_HANDLERS', {'deliver': handler})
+    args = argparse.Namespace(command='deliver')
+
+    with pytest.raises(SystemExit) as exit_info:
+        await dispatch(args, TtConfig(), asyncio.ensure_future(checks()))
+
+    assert exit_info.value.code == 1
+    assert not mutated
+    assert 'is not supported' in capsys.readouterr().err
+
+
+async def test_preflight_checks_require_project_scope(mocker: MockerFixture):
+    mocker.patch('gh_tt.preflight.get_gh_cli_version', return_value='2.60.0')
+    mocker.patch('gh_tt.preflight.get_gh_auth_scopes', return_value=['repo'])
+    config = TtConfig(project=ProjectConfig(owner='owner', number=1))
+
+    async def load_config():
+        return config
+
+    with pytest.raises(PreflightError, match='project'):
+        await preflight_checks(load_config(), use_cache=True, check_scopes=True)
+
+
+async def test_dispatch_reraises_handler_exit(mocker: MockerFixture):
+    async def checks():
+        pass
+
+    async def handler(_args, _config, gate):
+        await gate.wait()
+        sys.exit(3)
+
+    mocker.patch.dict('gh_tt.__main__.COMMAND_HANDLERS', {'workon': handler})
+    args = argparse.Namespace(command='workon')
+
+    with pytest.raises(SystemExit) as exit_info:
+        await dispatch(args, TtConfig(), asyncio.ensure_future(checks()))
+
+    assert exit_info.value.code == 3
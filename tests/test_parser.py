@@ -1,4 +1,5 @@
 from contextlib import nullcontext as does_not_raise
+from pathlib import Path
 
 import pytest
 
@@ -144,3 +145,47 @@ def test_parser_deliver_delete_branch_only_with_pr_workflow(
 
     with expectation:
         tt_parse(args)
+
+
+@pytest.mark.parametrize(
+    ('args', 'expectation'),
+    [
+        (['workon', '-i', '1', '--worktree'], pytest.raises(SystemExit)),
+        (['workon', '-i', '1', '--worktree', '--pr-workflow'], does_not_raise()),
+    ],
+)
+def test_parser_workon_worktree_only_with_pr_workflow(args, expectation):
+    with expectation:
+        assert tt_parse(args).worktree is True
+
+
+@pytest.mark.parametrize(
+    ('args', 'expected'),
+    [
+        (['workon', '-i', '1'], False),
+        (['workon', '-i', '1', '--no-preflight-cache'], True),
+        (['deliver', '--no-preflight-cache'], True),
+    ],
+)
+def test_parser_no_preflight_cache(args, expected):
+    assert tt_parse(args).no_preflight_cache is expected
+
+
+def test_parser_daemon_start():
+    parsed = tt_parse(['daemon', 'start', '--foreground', '--idle-timeout', '60'])
+
+    assert parsed.command == 'daemon'
+    assert parsed.daemon_command == 'start'
+    assert parsed.foreground is True
+    assert parsed.idle_timeout == 60
+
+
+def test_parser_record_and_replay():
+    parsed = tt_parse(['deliver', '--replay', 'deliver.jsonl', '--replay-speed', '2'])
+
+    assert parsed.replay == Path('deliver.jsonl')
+    assert parsed.replay_speed == 2
+    assert parsed.record is None
+
+    with pytest.raises(SystemExit):
+        tt_parse(['deliver', '--record', 'a.jsonl', '--replay', 'b.jsonl'])
@@ -0,0 +1,151 @@
+import asyncio
+import json
+
+import pytest
+from pytest_mock import MockerFixture
+
+from gh_tt import preflight
+
+
+@pytest.fixture
+def gh_binary(tmp_path, monkeypatch):
+    """Points the preflight cache at a temporary cache dir and a fake gh binary."""
+    gh_path = tmp_path / 'bin' / 'gh'
+    gh_path.parent.mkdir()
+    gh_path.write_text('')
+
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / 'cache'))
+    monkeypatch.setenv('GH_CONFIG_DIR', str(tmp_path / 'gh-config'))
+    monkeypatch.setenv('GH_TOKEN', 'token-a')
+    monkeypatch.setattr(preflight.shutil, 'which', lambda _: str(gh_path))
+
+    return gh_path
+
+
+@pytest.fixture
+def gh_calls(mocker: MockerFixture):
+    version = mocker.patch(
+        'gh_tt.commands.gh.get_gh_cli_version', return_value='2.60.0', new_callable=mocker.AsyncMock
+    )
+    scopes = mocker.patch(
+        'gh_tt.commands.gh.get_gh_auth_scopes',
+        return_value=['project', 'repo'],
+        new_callable=mocker.AsyncMock,
+    )
+    return version, scopes
+
+
+@pytest.mark.usefixtures('gh_binary')
+async def test_second_call_is_served_from_cache(gh_calls):
+    version, scopes = gh_calls
+
+    assert await preflight.get_gh_cli_version() == '2.60.0'
+    assert await preflight.get_gh_auth_scopes() == ['project', 'repo']
+    assert await preflight.get_gh_cli_version() == '2.60.0'
+    assert await preflight.get_gh_auth_scopes() == ['project', 'repo']
+
+    assert version.await_count == 1
+    assert scopes.await_count == 1
+
+
+@pytest.mark.usefixtures('gh_binary')
+async def test_no_cache_always_calls_gh(gh_calls):
+    version, _ = gh_calls
+
+    await preflight.get_gh_cli_version(use_cache=False)
+    await preflight.get_gh_cli_version(use_cache=False)
+
+    assert version.await_count == 2
+    assert not preflight.cache_path().exists()
+
+
+async def test_token_change_invalidates_cache(gh_binary, gh_calls, monkeypatch):
+    _, scopes = gh_calls
+
+    await preflight.get_gh_auth_scopes()
+    monkeypatch.setenv('GH_TOKEN', 'token-b')
+    await preflight.get_gh_auth_scopes()
+
+    assert gh_binary.exists()
+    assert scopes.await_count == 2
+
+
+async def test_gh_upgrade_invalidates_cache(gh_binary, gh_calls):
+    version, _ = gh_calls
+
+    await preflight.get_gh_cli_version()
+    stat = gh_binary.stat()
+    preflight.os.utime(gh_binary, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+    await preflight.get_gh_cli_version()
+
+    assert version.await_count == 2
+
+
+@pytest.mark.usefixtures('gh_binary')
+async def test_expired_entry_is_ignored(gh_calls):
+    version, _ = gh_calls
+
+    await preflight.get_gh_cli_version()
+    entry = json.loads(preflight.cache_path().read_text())
+    entry['created_at'] -= preflight.CACHE_TTL_SECONDS + 1
+    preflight.cache_path().write_text(json.dumps(entry))
+    await preflight.get_gh_cli_version()
+
+    assert version.await_count == 2
+
+
+@pytest.mark.usefixtures('gh_binary')
+async def test_invalidate_removes_cache(gh_calls):
+    _, scopes = gh_calls
+
+    await preflight.get_gh_auth_scopes()
+    preflight.invalidate()
+    await preflight.get_gh_auth_scopes()
+
+    assert scopes.await_count == 2
+
+
+@pytest.mark.parametrize(
+    ('stderr', 'expected'),
+    [
+        (
+            "GraphQL: Your token has not been granted the required scopes to execute 'addProjectV2ItemById'",
+            True,
+        ),
+        ('error: your authentication token is missing required scopes [project]', True),
+        ('type: INSUFFICIENT_SCOPES', True),
+        ('no pull requests found for branch "main"', False),
+    ],
+)
+def test_is_scope_error(stderr, expected):
+    assert preflight.is_scope_error(stderr) is expected
+
+
+async def test_open_gate_does_not_wait():
+    await preflight.OPEN.wait()
+
+
+async def test_gate_raises_when_checks_fail():
+    async def failing_checks():
+        raise preflight.PreflightError('gh too old')
+
+    gate = preflight.Gate(asyncio.ensure_future(failing_checks()))
+
+    with pytest.raises(preflight.PreflightError):
+        await gate.wait()
+
+
+async def test_cancelled_waiter_does_not_cancel_checks():
+    release = asyncio.Event()
+
+    async def checks():
+        await release.wait()
+
+    checks_task = asyncio.ensure_future(checks())
+    waiter = asyncio.ensure_future(preflight.Gate(checks_task).wait())
+    await asyncio.sleep(0)
+    waiter.cancel()
+    release.set()
+
+    await checks_task
+    assert not checks_task.cancelled()
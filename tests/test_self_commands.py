@@ -0,0 +1,44 @@
+from pathlib import Path
+
+from pytest_mock import MockerFixture
+
+from gh_tt import self_commands
+from gh_tt.commands.shell import ShellError, ShellResult
+
+
+async def test_build_prebuilt_env_writes_marker(tmp_path: Path, mocker: MockerFixture):
+    run = mocker.patch('gh_tt.commands.shell.run', new_callable=mocker.AsyncMock)
+    venv = tmp_path / self_commands.PREBUILT_ENV
+    venv.mkdir()
+
+    python = await self_commands.build_prebuilt_env(tmp_path, pin='1.2.3')
+
+    assert python == venv / 'bin' / 'python'
+    assert (venv / self_commands.PREBUILT_MARKER).read_text() == '1.2.3\n'
+    cmd = run.call_args.args[0]
+    assert cmd[:2] == ['uv', 'sync']
+    assert {'--frozen', '--no-dev', '--no-editable', '--compile-bytecode'} <= set(cmd)
+    # Not into .venv, which `uv run` syncs with the dev dependencies
+    assert run.call_args.kwargs['env'] == {'UV_PROJECT_ENVIRONMENT': str(venv)}
+
+
+async def test_upgrade_keeps_uv_run_when_build_fails(tmp_path: Path, mocker: MockerFixture, capsys):
+    async def run(cmd, **_kwargs):
+        if cmd[:2] == ['uv', 'sync']:
+            raise ShellError(cmd=cmd, stdout='', stderr='no network', return_code=2)
+        return ShellResult(stdout='gh tt thetechcollective/gh-tt', stderr='', return_code=0)
+
+    mocker.patch('gh_tt.commands.shell.run', side_effect=run)
+    mocker.patch('gh_tt.self_commands.extension_dir', return_value=tmp_path)
+
+    await self_commands.upgrade(pin='stable')
+
+    assert not (tmp_path / self_commands.PREBUILT_ENV / self_commands.PREBUILT_MARKER).exists()
+    assert 'Startup time' not in capsys.readouterr().out
+
+
+def test_extension_dir_is_where_the_launcher_is(monkeypatch):
+    monkeypatch.setenv('GH_DATA_DIR', '/elsewhere')
+
+    assert (self_commands.extension_dir() / 'gh-tt').is_file()
+    assert (self_commands.extension_dir() / 'src' / 'gh_tt' / 'self_commands.py').is_file()
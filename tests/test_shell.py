@@ -0,0 +1,243 @@
+import asyncio
+import contextlib
+import itertools
+import sys
+from pathlib import Path
+
+import pytest
+
+from gh_tt.commands import shell
+from gh_tt.commands.shell import Priority, Scheduler
+
+
+async def test_scheduler_limits_processes_per_binary():
+    scheduler = Scheduler(limits={'gh': 2})
+    running = {'gh': 0, 'git': 0}
+    peak = {'gh': 0, 'git': 0}
+
+    async def job(binary: str):
+        async with scheduler.slot(binary):
+            running[binary] += 1
+            peak[binary] = max(peak[binary], running[binary])
+            await asyncio.sleep(0.01)
+            running[binary] -= 1
+
+    await asyncio.gather(*(job('gh') for _ in range(6)), *(job('git') for _ in range(6)))
+
+    assert peak == {'gh': 2, 'git': 6}
+    assert scheduler.stats['gh'].runs == 6
+    assert scheduler.stats['gh'].queued == 4
+    assert scheduler.stats['gh'].max_running == 2
+    assert scheduler.stats['git'].queued == 0
+
+
+async def test_scheduler_starts_interactive_commands_first():
+    scheduler = Scheduler(limits={'gh': 1})
+    started = []
+    release = asyncio.Event()
+
+    async def job(name: str, priority: Priority):
+        async with scheduler.slot('gh', priority):
+            started.append(name)
+            await release.wait()
+
+    first = asyncio.create_task(job('first', Priority.INTERACTIVE))
+    await asyncio.sleep(0)
+    queued = [
+        asyncio.create_task(job('poll', Priority.BACKGROUND)),
+        asyncio.create_task(job('view', Priority.INTERACTIVE)),
+    ]
+    await asyncio.sleep(0)
+    release.set()
+    await asyncio.gather(first, *queued)
+
+    assert started == ['first', 'view', 'poll']
+
+
+async def test_scheduler_cancelled_waiter_does_not_hold_a_slot():
+    scheduler = Scheduler(limits={'gh': 1})
+    release = asyncio.Event()
+
+    async def job():
+        async with scheduler.slot('gh'):
+            await release.wait()
+
+    holder = asyncio.create_task(job())
+    await asyncio.sleep(0)
+    waiter = asyncio.create_task(job())
+    await asyncio.sleep(0)
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+
+    release.set()
+    await holder
+    async with asyncio.timeout(1), scheduler.slot('gh'):
+        pass
+
+
+async def test_run_goes_through_the_scheduler(mocker):
+    scheduler = Scheduler()
+    mocker.patch.object(shell, 'scheduler', scheduler)
+
+    result = await shell.run(['git', '--version'])
+
+    assert result.stdout.startswith('git version')
+    assert scheduler.stats['git'].runs == 1
+
+
+def test_backoff_probes_fast_then_grows_to_the_cap():
+    backoff = shell.Backoff(fast_probes=2, fast_interval=0.1, initial=1, factor=2, cap=5)
+
+    assert list(itertools.islice(backoff.delays(), 7)) == [0.1, 0.1, 1, 2, 4, 5, 5]
+
+
+def test_backoff_default_is_a_fixed_interval():
+    assert list(itertools.islice(shell.Backoff(initial=3).delays(), 3)) == [3, 3, 3]
+
+
+def test_backoff_full_jitter_stays_below_the_delay(mocker):
+    uniform = mocker.patch('random.uniform', side_effect=lambda _low, high: high / 2)
+    backoff = shell.Backoff(fast_probes=1, initial=1, factor=2, cap=2, jitter=True)
+
+    assert list(itertools.islice(backoff.delays(), 4)) == [0.25, 0.5, 1, 1]
+    uniform.assert_called_with(0, 2)
+
+
+async def test_poll_until_reports_attempts():
+    outcomes = iter([False, False, True])
+
+    result = await shell.poll_until(
+        ['git', '--version'],
+        lambda _: next(outcomes),
+        backoff=shell.Backoff(initial=0),
+    )
+
+    assert result is not None
+    assert result.attempts == 3
+
+
+async def test_poll_until_times_out():
+    result = await shell.poll_until(
+        ['git', '--version'],
+        lambda _: False,
+        timeout_seconds=0.05,
+        backoff=shell.Backoff(initial=0.01),
+    )
+
+    assert result is None
+
+
+async def test_stream_lines_yields_the_output_line_by_line():
+    cmd = [sys.executable, '-c', 'print("a"); print(""); print("b")']
+
+    assert [line async for line in shell.stream_lines(cmd)] == ['a', '', 'b']
+
+
+async def test_stream_lines_stops_the_process_when_the_caller_stops_reading():
+    # Prints forever, so this only returns if the process is killed
+    cmd = [sys.executable, '-c', 'import itertools\nfor i in itertools.count(): print(i)']
+
+    async with contextlib.aclosing(shell.stream_lines(cmd)) as lines:
+        async for line in lines:
+            if line == '100':
+                break
+
+    assert shell.scheduler._lane(Path(sys.executable).name).running == 0
+
+
+async def test_stream_lines_raises_after_the_output_of_a_failing_command():
+    cmd = [sys.executable, '-c', 'import sys; print("partial"); sys.exit("boom")']
+    lines = []
+
+    async def read():
+        async for line in shell.stream_lines(cmd):
+            lines.append(line)  # noqa: PERF401
+
+    with pytest.raises(shell.ShellError) as e:
+        await read()
+
+    assert lines == ['partial']
+    assert e.value.stderr == 'boom'
+    assert e.value.return_code == 1
+
+
+async def test_stream_lines_without_die_on_error():
+    cmd = [sys.executable, '-c', 'import sys; print("partial"); sys.exit(3)']
+
+    assert [line async for line in shell.stream_lines(cmd, die_on_error=False)] == ['partial']
+
+
+async def test_identical_commands_in_flight_run_once(mocker):
+    execute = mocker.spy(shell, 'execute')
+    cmd = [sys.executable, '-c', 'import time; time.sleep(0.1); print("done")']
+
+    results = await asyncio.gather(shell.run(cmd), shell.run(cmd), shell.run(cmd))
+    assert [r.stdout for r in results] == ['done'] * 3
+    assert execute.call_count == 1
+
+    # Only commands in flight are shared
+    await shell.run(cmd)
+    assert execute.call_count == 2
+
+
+async def test_mutating_commands_opt_out_of_single_flight(mocker):
+    execute = mocker.spy(shell, 'execute')
+    cmd = [sys.executable, '-c', 'pass']
+
+    await asyncio.gather(shell.run(cmd, single_flight=False), shell.run(cmd, single_flight=False))
+
+    assert execute.call_count == 2
+
+
+async def test_single_flight_keeps_running_for_the_remaining_callers():
+    cmd = [sys.executable, '-c', 'import time; time.sleep(0.1); print("done")']
+    first = asyncio.create_task(shell.run(cmd))
+    second = asyncio.create_task(shell.run(cmd))
+    await asyncio.sleep(0.01)
+
+    first.cancel()
+
+    assert (await second).stdout == 'done'
+    assert first.cancelled()
+
+
+async def test_single_flight_cancels_the_command_without_callers():
+    started = asyncio.Event()
+    cancelled = asyncio.Event()
+
+    async def start():
+        started.set()
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.set()
+            raise
+
+    caller = asyncio.create_task(shell.coalesce('key', start))
+    await started.wait()
+    caller.cancel()
+
+    await asyncio.wait_for(cancelled.wait(), timeout=1)
+    await asyncio.sleep(0)
+    assert shell._flights == {}
+
+
+def test_shell_commands_share_the_key_of_their_words():
+    assert shell._command_key('git fetch --tags --all -f ', None) == shell._command_key(
+        ['git', 'fetch', '--tags', '--all', '-f'], None
+    )
+
+
+async def test_run_sets_environment_variables_on_top_of_its_own(monkeypatch):
+    monkeypatch.setenv('GH_TT_TEST_INHERITED', 'inherited')
+
+    result = await shell.run(
+        ['sh', '-c', 'echo "$GH_TT_TEST_INHERITED $GH_TT_TEST_SET"'],
+        env={'GH_TT_TEST_SET': 'set'},
+    )
+
+    assert result.stdout == 'inherited set'
+    assert shell._command_key(['git', 'diff'], None, {'A': '1'}) != shell._command_key(
+        ['git', 'diff'], None
+    )
@@ -0,0 +1,85 @@
+import asyncio
+import json
+from pathlib import Path
+
+import pytest
+
+from gh_tt import trace
+from gh_tt.commands import shell
+
+
+def _spans(path: Path) -> dict[str, dict]:
+    events = json.loads(path.read_text())['traceEvents']
+    return {event['name']: event for event in events if event['ph'] == 'X'}
+
+
+async def test_trace_records_commands_with_their_parent_step(tmp_path: Path):
+    path = tmp_path / 'trace.json'
+
+    with trace.recording(path, name='gh tt test'), trace.span('workon', 'step'):
+        await asyncio.gather(
+            shell.run(['git', '--version']),
+            shell.run(['git', 'rev-parse', '--verify', 'no-such-ref'], die_on_error=False),
+        )
+
+    spans = _spans(path)
+    assert spans['workon']['dur'] >= spans['git']['dur']
+    assert spans['git']['args']['parent'] == f'workon #{spans["workon"]["args"]["id"]}'
+    assert spans['git']['args']['exit_code'] == 0
+    assert spans['git']['args']['stdout_bytes'] > 0
+    assert spans['git rev-parse']['args']['exit_code'] != 0
+    # Overlapping commands are put on separate lanes
+    assert spans['git']['tid'] != spans['git rev-parse']['tid']
+
+
+async def test_trace_records_poll_attempts(tmp_path: Path):
+    path = tmp_path / 'trace.json'
+    attempts = iter([False, True])
+
+    with trace.recording(path, name='gh tt test'):
+        await shell.poll_until(['git', '--version'], lambda _: next(attempts), interval=0)
+
+    spans = _spans(path)
+    assert spans['poll_until git']['args']['attempts'] == 2
+    assert spans['attempt 1']['args']['satisfied'] is False
+    assert spans['attempt 2']['args']['parent'].startswith('poll_until git')
+
+
+def test_trace_is_written_when_the_command_exits(tmp_path: Path):
+    path = tmp_path / 'trace.json'
+
+    with (
+        pytest.raises(SystemExit),
+        trace.recording(path, name='gh tt test'),
+        trace.span('deliver', 'step'),
+    ):
+        raise SystemExit(1)
+
+    assert _spans(path)['deliver']['args']['exit_code'] == 1
+
+
+def test_trace_that_cannot_be_written_keeps_the_exit(tmp_path: Path, caplog):
+    path = tmp_path / 'missing' / 'trace.json'
+
+    with pytest.raises(SystemExit) as e, trace.recording(path, name='gh tt test'):
+        raise SystemExit(3)
+
+    assert e.value.code == 3
+    assert 'could not write the trace' in caplog.text
+
+
+def test_span_without_recording_is_a_no_op():
+    with trace.span('workon', 'step') as args:
+        args['exit_code'] = 0
+
+
+@pytest.mark.parametrize(
+    ('cmd', 'expected'),
+    [
+        (['gh', 'pr', 'view', '--json', 'url'], 'gh pr view'),
+        (['git', 'rev-parse', '--abbrev-ref', 'HEAD'], 'git rev-parse'),
+        (['/usr/bin/git', '--version'], 'git'),
+    ],
+)
+def test_command_name(cmd, expected):
+    assert trace.command_name(cmd) == expected
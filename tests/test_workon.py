@@ -4,11 +4,32 @@ from pathlib import Path
 import pytest
 from pydantic import HttpUrl
 
+from gh_tt import workon
 from gh_tt.commands import git, shell
 from gh_tt.commands.shell import ShellError
 from tests.env_builder import IntegrationEnv
 
 
+async def test_find_issue_branch_does_not_fetch_for_a_local_branch(repo, mocker):
+    await repo('branch', '7-local')
+    fetch = mocker.patch.object(git, 'fetch')
+
+    assert await workon._find_issue_branch(7, 0) == git.CheckBranchExistsResult('local', '7-local')
+    fetch.assert_not_called()
+
+
+async def test_find_issue_branch_fetches_the_branches_of_the_issue(repo, mocker):
+    async def fetch(**_):
+        await repo('update-ref', 'refs/remotes/origin/7-remote', 'HEAD')
+
+    spy = mocker.patch.object(git, 'fetch', side_effect=fetch)
+
+    assert await workon._find_issue_branch(7, 30) == git.CheckBranchExistsResult(
+        'remote', '7-remote'
+    )
+    spy.assert_called_once_with(branches=['7-*'], freshness_seconds=30)
+
+
 @pytest.mark.usefixtures('check_end_to_end_env')
 async def test_workon_basic_success():
     async with (
@@ -378,3 +399,65 @@ async def test_workon_carries_uncommitted_changes_to_new_branch():
         assert content == 'some change', (
             'Expected uncommitted change to be present on the new branch'
         )
+
+
+@pytest.mark.usefixtures('check_end_to_end_env')
+async def test_workon_worktree_leaves_the_checkout_alone():
+    async with (
+        IntegrationEnv().require_owner().create_repo().create_issue().create_local_clone().build()
+    ) as env:
+        assert env.local_repo is not None, f'Expected local repo Path, got {type(env.local_repo)}'
+        (env.local_repo / 'uncommitted.txt').write_text('uncommitted')
+
+        workon_result = await shell.run(
+            [
+                'gh',
+                'tt',
+                'workon',
+                '--pr-workflow',
+                '--worktree',
+                '-i',
+                str(env.issue_number),
+                '--no-assign',
+            ],
+            cwd=env.local_repo,
+        )
+        worktree = Path(workon_result.stdout)
+        main = env.local_repo.resolve()
+        assert worktree == main.parent / f'{main.name}-worktrees' / worktree.name
+
+        result = await shell.run(['git', 'rev-parse', '--abbrev-ref', 'HEAD'], cwd=env.local_repo)
+        assert result.stdout == 'main', 'Expected the checkout to stay on main'
+        assert (env.local_repo / 'uncommitted.txt').read_text() == 'uncommitted'
+
+        result = await shell.run(['git', 'rev-parse', '--abbrev-ref', 'HEAD'], cwd=worktree)
+        branch_name = result.stdout
+        assert branch_name.startswith(f'{env.issue_number}-')
+        assert worktree.name == branch_name
+
+        result = await shell.run(['git', 'log', '-1', '--format=%s'], cwd=worktree)
+        assert result.stdout == git.PR_START_COMMIT_HEADLINE
+
+        pr_data = await shell.poll_until(
+            ['gh', 'pr', 'view', branch_name, '-R', str(env.repo_url), '--json', 'isDraft'],
+            cwd=env.local_repo,
+            predicate=lambda r: bool(r.stdout),
+        )
+        assert pr_data is not None, 'Expected PR to be created'
+        assert json.loads(pr_data.stdout)['isDraft'], 'Expected PR to be a draft'
+
+        # Again, the worktree is reused
+        workon_result = await shell.run(
+            [
+                'gh',
+                'tt',
+                'workon',
+                '--pr-workflow',
+                '--worktree',
+                '-i',
+                str(env.issue_number),
+                '--no-assign',
+            ],
+            cwd=env.local_repo,
+        )
+        assert Path(workon_result.stdout) == worktree